@@ -0,0 +1,168 @@
+"""JSONB columns, lookup indexes and monthly partitioned llm_logs
+
+Revision ID: 7b3e9c4d1a2f
+Revises: 28dd6593e210
+Create Date: 2025-06-02 10:14:37.512904
+
+- sessions.analysis and llm_logs.payload become JSONB
+- GIN index on sessions.analysis -> 'main_diagnosis' for diagnosis / ICD-10
+  containment lookups, e.g.
+      analysis -> 'main_diagnosis' @> '{"icd10_code": "M54.5"}'
+- llm_logs is rebuilt as a table partitioned by month on created_at, with
+  indexes on (session_id, created_at) and (step). Partitions are created from
+  the month of the oldest existing row through three months ahead, plus a
+  default partition. llm_logs_ensure_partitions(months_ahead) creates future
+  months and is called on application startup; rows already in the default
+  partition for a month being created are moved into the new partition.
+
+The partition key has to be part of the primary key, so llm_logs' primary key
+becomes (log_id, created_at) and created_at becomes NOT NULL. log_id keeps its
+sequence, widened to bigint.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b3e9c4d1a2f'
+down_revision: Union[str, None] = '28dd6593e210'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+CREATE_PARTITION_FUNCTIONS = """
+CREATE OR REPLACE FUNCTION llm_logs_create_partition(month date) RETURNS void AS $$
+DECLARE
+    month_start date := date_trunc('month', month)::date;
+    month_end date := (month_start + interval '1 month')::date;
+    partition_name text := 'llm_logs_' || to_char(month_start, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN;
+    END IF;
+    -- Rows written before this month had a partition sit in llm_logs_default, and
+    -- a partition overlapping rows there cannot be created. Block inserts into the
+    -- default partition, build the partition standalone, move those rows into it,
+    -- then attach it.
+    LOCK TABLE llm_logs_default IN SHARE ROW EXCLUSIVE MODE;
+    EXECUTE format('CREATE TABLE %I (LIKE llm_logs INCLUDING DEFAULTS)', partition_name);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM llm_logs_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        month_start, month_end, partition_name
+    );
+    EXECUTE format(
+        'ALTER TABLE llm_logs ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, month_start, month_end
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION llm_logs_ensure_partitions(months_ahead integer DEFAULT 3) RETURNS void AS $$
+DECLARE
+    month date;
+BEGIN
+    -- Workers call this concurrently on startup
+    PERFORM pg_advisory_xact_lock(hashtext('llm_logs_ensure_partitions'));
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', now()),
+            date_trunc('month', now()) + make_interval(months => months_ahead),
+            interval '1 month'
+        )::date
+    LOOP
+        PERFORM llm_logs_create_partition(month);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    # sessions: JSONB plus a GIN index for diagnosis lookups
+    op.execute("ALTER TABLE sessions ALTER COLUMN analysis TYPE JSONB USING analysis::jsonb")
+    op.execute(
+        "CREATE INDEX ix_sessions_main_diagnosis ON sessions "
+        "USING gin ((analysis -> 'main_diagnosis') jsonb_path_ops)"
+    )
+
+    # llm_logs: move the old table aside, keeping its sequence for log_id
+    op.execute("ALTER TABLE llm_logs RENAME TO llm_logs_unpartitioned")
+    op.execute("ALTER TABLE llm_logs_unpartitioned ALTER COLUMN log_id DROP DEFAULT")
+    op.execute("ALTER SEQUENCE llm_logs_log_id_seq OWNED BY NONE")
+    op.execute("ALTER SEQUENCE llm_logs_log_id_seq AS bigint")
+
+    op.execute("""
+        CREATE TABLE llm_logs (
+            log_id bigint NOT NULL DEFAULT nextval('llm_logs_log_id_seq'),
+            session_id varchar NOT NULL REFERENCES sessions (session_id),
+            step varchar NOT NULL,
+            payload jsonb NOT NULL,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            PRIMARY KEY (log_id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER SEQUENCE llm_logs_log_id_seq OWNED BY llm_logs.log_id")
+    op.execute("CREATE TABLE llm_logs_default PARTITION OF llm_logs DEFAULT")
+    op.execute(CREATE_PARTITION_FUNCTIONS)
+
+    # One partition per month that already has rows, then the months ahead
+    op.execute("""
+        SELECT llm_logs_create_partition(month::date)
+        FROM generate_series(
+            (SELECT date_trunc('month', coalesce(min(created_at), now())) FROM llm_logs_unpartitioned),
+            date_trunc('month', now()),
+            interval '1 month'
+        ) AS month
+    """)
+    op.execute("SELECT llm_logs_ensure_partitions(3)")
+
+    op.execute("""
+        INSERT INTO llm_logs (log_id, session_id, step, payload, created_at)
+        SELECT log_id, session_id, step, payload::jsonb, coalesce(created_at, now())
+        FROM llm_logs_unpartitioned
+    """)
+    op.execute("DROP TABLE llm_logs_unpartitioned")
+
+    # Indexes on the parent are created on every partition, present and future
+    op.create_index('ix_llm_logs_session_id_created_at', 'llm_logs', ['session_id', 'created_at'])
+    op.create_index('ix_llm_logs_step', 'llm_logs', ['step'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute("ALTER TABLE llm_logs RENAME TO llm_logs_partitioned")
+    op.execute("ALTER TABLE llm_logs_partitioned ALTER COLUMN log_id DROP DEFAULT")
+    op.execute("ALTER SEQUENCE llm_logs_log_id_seq OWNED BY NONE")
+    op.execute("ALTER SEQUENCE llm_logs_log_id_seq AS integer")
+
+    op.create_table('llm_logs',
+    sa.Column('log_id', sa.Integer(), server_default=sa.text("nextval('llm_logs_log_id_seq')"), nullable=False),
+    sa.Column('session_id', sa.String(), nullable=False),
+    sa.Column('step', sa.String(), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['session_id'], ['sessions.session_id'], ),
+    sa.PrimaryKeyConstraint('log_id')
+    )
+    op.execute("ALTER SEQUENCE llm_logs_log_id_seq OWNED BY llm_logs.log_id")
+    op.execute("""
+        INSERT INTO llm_logs (log_id, session_id, step, payload, created_at)
+        SELECT log_id, session_id, step, payload::json, created_at
+        FROM llm_logs_partitioned
+    """)
+    op.execute("DROP TABLE llm_logs_partitioned CASCADE")
+    op.execute("DROP FUNCTION llm_logs_ensure_partitions(integer)")
+    op.execute("DROP FUNCTION llm_logs_create_partition(date)")
+
+    op.drop_index('ix_sessions_main_diagnosis', table_name='sessions')
+    op.execute("ALTER TABLE sessions ALTER COLUMN analysis TYPE JSON USING analysis::json")
@@ -2,24 +2,22 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, ValidationError, validator
 from typing import List
-from langchain.output_parsers import PydanticOutputParser
 import logging
 import traceback
-from langchain.globals import set_llm_cache
-from langchain.cache import InMemoryCache
-from ..prompts.final_analysis_prompt import FINAL_ANALYSIS_PROMPT
-import json
+from ..prompts.registry import FINAL_ANALYSIS
 import os
 import datetime
+from ..core.config import settings
 from ..core.llm import llm_service
+from ..core.jsonl_writer import append_jsonl
+from ..core.metrics import record_request_parse
+from ..models.intake import AnalysisResult
+from .session_store import session_store
 
-# Set up logging
-logging.basicConfig(level=logging.INFO,
-                    format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-# Set up the data directory relative to this file's location.
-DATA_DIR = os.path.join(os.path.dirname(__file__), '../../../data/raw')
+# Set up the data directory (DATA_DIR, or data/raw relative to this file's location)
+DATA_DIR = settings.DATA_DIR or os.path.join(os.path.dirname(__file__), '../../../data/raw')
 os.makedirs(DATA_DIR, exist_ok=True)
 FILE_PATH = os.path.join(DATA_DIR, "treatment_plans.jsonl")
 
@@ -33,6 +31,9 @@ class Exercise(BaseModel):
     duration: str = "1 week"
     precautions: str
 
+class FinalAnalysisRequest(BaseModel):
+    session_id: str
+
 class TreatmentPlan(BaseModel):
     treatment_focus: str  # pain, mobility, or strength
     treatment_recommendations: List[Exercise]
@@ -56,9 +57,8 @@ def store_treatment_plan(treatment_plan, session_id):
             "treatment_plan": treatment_plan.dict(),
             "source": "user_generated"
         }
-        with open(FILE_PATH, "a") as f:
-            f.write(json.dumps(record) + "\n")
-        logger.info(f"Successfully stored treatment plan for session {session_id}")
+        append_jsonl(FILE_PATH, record)
+        logger.info(f"Successfully queued treatment plan for session {session_id}")
     except Exception as e:
         logger.error(f"Error storing treatment plan: {str(e)}")
         logger.error(traceback.format_exc())
@@ -66,9 +66,6 @@ def store_treatment_plan(treatment_plan, session_id):
 # Initialize FastAPI router
 router = APIRouter()
 
-# Set up LLM cache
-set_llm_cache(InMemoryCache())
-
 # Health check endpoint
 @router.get("/health")
 async def health_check():
@@ -77,42 +74,44 @@ async def health_check():
     """
     return {"status": "ok", "service": "treatment-planning"}
 
-# Instantiate the Pydantic parser for TreatmentPlan
-result_parser = PydanticOutputParser(pydantic_object=TreatmentPlan)
-
 # Define the API endpoint for generating treatment plan
 @router.post("/treatment-plan", response_model=TreatmentPlan)
-async def generate_treatment_plan():
-    logger.info("Received request to generate treatment plan.")
+async def generate_treatment_plan(request: FinalAnalysisRequest):
+    record_request_parse()
+    logger.info(f"Received request to generate treatment plan for session {request.session_id}.")
     try:
-        # Get the intake analysis result from the atom
+        # Get this session's intake analysis (local LRU, then Redis, then Postgres)
         try:
-            from app.core.atoms import get_intake_analysis_result
-            intake_analysis = get_intake_analysis_result()
-            if not intake_analysis:
-                raise HTTPException(
-                    status_code=400,
-                    detail="No intake analysis available. Please complete the intake form first."
-                )
+            analysis = await session_store.get_analysis(request.session_id)
+        except Exception as e:
+            logger.error(f"Error getting intake analysis: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail="Error retrieving intake analysis"
+            )
+        if analysis is None:
+            raise HTTPException(
+                status_code=404,
+                detail="No intake analysis available. Please complete the intake form first."
+            )
 
+        try:
+            intake_analysis = AnalysisResult.model_validate(analysis)
             formatted_intake_analysis = f"""
 Previous Diagnosis: {intake_analysis.main_diagnosis.diagnosis}
 ICD-10 Code: {intake_analysis.main_diagnosis.icd10_code}
 Explanation: {intake_analysis.main_diagnosis.simple_explanation}
 
-Muscle Group: {intake_analysis.big_muscle_group.name}
-Description: {intake_analysis.big_muscle_group.description}
-
 Other Possible Diagnoses:
 {chr(10).join([f"- {d.diagnosis} ({d.icd10_code}): {d.simple_explanation}" for d in intake_analysis.other_probabilistic_diagnosis])}
 
 Clinical Reasoning: {intake_analysis.reasoning}
 """
         except Exception as e:
-            logger.error(f"Error getting intake analysis: {str(e)}")
+            logger.error(f"Error formatting intake analysis: {str(e)}")
             raise HTTPException(
                 status_code=500,
-                detail="Error retrieving intake analysis"
+                detail="Stored intake analysis is invalid"
             )
 
         # Format the input data for the LLM
@@ -123,10 +122,10 @@ Clinical Reasoning: {intake_analysis.reasoning}
         logger.info("Calling LLM service...")
         # Get the treatment plan from the LLM
         try:
-            treatment_plan = llm_service.generate_response(
-                prompt_template=FINAL_ANALYSIS_PROMPT,
+            treatment_plan = await llm_service.agenerate_response(
+                prompt=FINAL_ANALYSIS,
                 input_variables=formatted_input,
-                output_parser=result_parser
+                response_model=TreatmentPlan
             )
             
             # Validate the result
@@ -138,7 +137,7 @@ Clinical Reasoning: {intake_analysis.reasoning}
                 raise ValueError("Treatment plan must contain exactly 3 exercises")
             
             # Store the result
-            store_treatment_plan(treatment_plan, "session_id")
+            store_treatment_plan(treatment_plan, request.session_id)
 
             return treatment_plan
             
@@ -156,6 +155,8 @@ Clinical Reasoning: {intake_analysis.reasoning}
                 detail=f"Error generating treatment plan: {str(e)}"
             )
 
+    except HTTPException:
+        raise
     except ValidationError as e:
         logger.error(f"Validation error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,28 +1,37 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from ..models.intake import IntakeFormData, AnalysisResult
-from ..core.llm import llm_service
-from ..prompts.intake_analysis_prompt import INTAKE_ANALYSIS_PROMPT
-from langchain.output_parsers import PydanticOutputParser
+from ..core.config import settings
+from ..core.llm import llm_service, request_usage
+from ..prompts.registry import INTAKE_ANALYSIS, PromptBudgetExceeded
 import logging
-from langchain.globals import set_llm_cache
-from langchain.cache import InMemoryCache
 from .session_store import session_store
-from sqlalchemy.orm import Session
-from ..core.database import get_db
-from ..models.database import Session as SessionModel, LLMLog
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.database import get_db, AsyncSessionLocal
+from ..core.llm_log import log_llm_interaction
+from ..core.partial_json import PartialJSONObjectParser
+from ..core.jsonl_writer import append_jsonl
+from ..core.metrics import span, record_request_parse
+from ..core.logging import log_payload
+from ..core.triage import triage_engine, TriageResult
+from ..core.semantic_cache import SemanticCache, SentenceTransformerEmbedder
+from ..models.database import Session as SessionModel
 
+import asyncio
 import os
 import datetime
 import json
 import uuid
 
-# Set up the data directory relative to this file's location.
-# Adjust the relative path as needed to reach your project root.
-DATA_DIR = os.path.join(os.path.dirname(__file__), '../../../data/raw')
+# Set up the data directory (DATA_DIR, or data/raw relative to this file's location)
+DATA_DIR = settings.DATA_DIR or os.path.join(os.path.dirname(__file__), '../../../data/raw')
 os.makedirs(DATA_DIR, exist_ok=True)
 FILE_PATH = os.path.join(DATA_DIR, "user_responses.jsonl")
 FEEDBACK_FILE_PATH = os.path.join(DATA_DIR, "feedback.jsonl")
 TREATMENT_FILE_PATH = os.path.join(DATA_DIR, "treatment_plans.jsonl")
+SEMANTIC_CACHE_PATH = settings.SEMANTIC_CACHE_PATH or os.path.join(
+    DATA_DIR, "..", "cache", "intake_semantic_cache.npz"
+)
 
 def generate_session_id():
     """Generate a unique session ID for tracking a patient's journey"""
@@ -39,8 +48,7 @@ def store_analysis_result(intake_data, analysis_result, session_id):
         "analysis_result": analysis_result.json(),
         "source": "user_generated"
     }
-    with open(FILE_PATH, "a") as f:
-        f.write(json.dumps(record) + "\n")
+    append_jsonl(FILE_PATH, record)
     return session_id
 
 def store_feedback(feedback_data, session_id):
@@ -54,8 +62,7 @@ def store_feedback(feedback_data, session_id):
         "analysis_result": feedback_data["analysis_result"],
         "source": "user_feedback"
     }
-    with open(FEEDBACK_FILE_PATH, "a") as f:
-        f.write(json.dumps(record) + "\n")
+    append_jsonl(FEEDBACK_FILE_PATH, record)
 
 def store_treatment_plan(treatment_plan, session_id):
     """
@@ -67,80 +74,168 @@ def store_treatment_plan(treatment_plan, session_id):
         "treatment_plan": treatment_plan.json(),
         "source": "treatment_plan"
     }
-    with open(TREATMENT_FILE_PATH, "a") as f:
-        f.write(json.dumps(record) + "\n")
+    append_jsonl(TREATMENT_FILE_PATH, record)
 
-set_llm_cache(InMemoryCache())
-# Configure logging
-logging.basicConfig(level=logging.INFO,
-                    format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Instantiate the Pydantic parser for AnalysisResult
-analysis_result_parser = PydanticOutputParser(pydantic_object=AnalysisResult)
+# Reuses analyses across intakes that differ only in free text
+intake_semantic_cache = SemanticCache(
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+    ttl=settings.SEMANTIC_CACHE_TTL,
+    embedder=(
+        SentenceTransformerEmbedder(settings.SEMANTIC_CACHE_EMBEDDING_MODEL)
+        if settings.SEMANTIC_CACHE_ENABLED and settings.SEMANTIC_CACHE_EMBEDDING_MODEL else None
+    ),
+)
+
+
+def cacheable_analysis(response: AnalysisResult) -> dict:
+    """
+    The structured part of an analysis, for the semantic cache: the model's
+    narrative (reasoning, explanations) is written about this patient's own
+    free text, so it is left out and never shown to another patient.
+    """
+    analysis = response.dict(exclude={"session_id", "reasoning"})
+    analysis["main_diagnosis"].pop("reasoning", None)
+    analysis["main_diagnosis"].pop("simple_explanation", None)
+    for diagnosis in analysis["other_probabilistic_diagnosis"]:
+        diagnosis.pop("simple_explanation", None)
+    return analysis
+
+
+def analysis_from_cache(analysis: dict) -> AnalysisResult:
+    """An AnalysisResult from a semantic-cache entry, with a narrative written from its structured fields."""
+    analysis = json.loads(json.dumps(analysis))  # The entry is shared; never modify it
+    main = analysis["main_diagnosis"]
+    main["reasoning"] = (
+        f"Your answers about the location, nature, timing and triggers of your pain are most "
+        f"consistent with {main['diagnosis']} ({main['icd10_code']})."
+    )
+    main["simple_explanation"] = f"Your symptoms are most consistent with {main['diagnosis']}."
+    for diagnosis in analysis["other_probabilistic_diagnosis"]:
+        diagnosis["simple_explanation"] = f"{diagnosis['diagnosis']} is a less likely explanation of your symptoms."
+    analysis["reasoning"] = (
+        f"The pattern of your answers points to a {analysis['serious_vs_treatable']['diagnosis']} condition, "
+        f"most likely {main['diagnosis']}; the recommendations below are ordered by priority."
+    )
+    return AnalysisResult(**analysis)
+
+
+async def answer_without_llm(validated_data, triage: TriageResult):
+    """
+    An analysis that needs no LLM call, with where it came from: a templated
+    referral for clear-cut red flags, or a semantic-cache hit. (None, "llm")
+    if the LLM has to be called.
+    """
+    if triage_engine.should_short_circuit(triage):
+        logger.info(f"Triage short-circuit: {triage.flags}")
+        return triage_engine.template(triage), "triage"
+    if settings.SEMANTIC_CACHE_ENABLED:
+        # Embedding and index search block; keep them off the event loop
+        cached = await asyncio.to_thread(intake_semantic_cache.lookup, validated_data)
+        if cached is not None:
+            analysis, similarity = cached
+            logger.info(f"Semantic cache hit (similarity {similarity})")
+            return analysis_from_cache(analysis), "semantic_cache"
+    return None, "llm"
+
+
+async def persist_analysis(
+    db: AsyncSession, session_id, validated_data, response, triage: TriageResult = None, source: str = "llm"
+):
+    """
+    Store the analysis as a new session and log the LLM interaction, in one transaction.
+    """
+    analysis = response.dict()
+    db.add(SessionModel(session_id=session_id, analysis=analysis))
+
+    # Log the LLM interaction (no usage if it was answered without the LLM)
+    log_llm_interaction(db, session_id, "intake_analysis", {
+        "input": validated_data,
+        "output": analysis,
+        "usage": request_usage(),
+        "triage": triage.dict() if triage else None,
+        "source": source
+    })
+    try:
+        with span("db_commit"):
+            await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    # Warm the cache the treatment-plan step reads from
+    await session_store.cache_analysis(session_id, analysis)
+
+    if settings.SEMANTIC_CACHE_ENABLED and source == "llm":
+        await asyncio.to_thread(intake_semantic_cache.add, validated_data, cacheable_analysis(response))
+
+    # Only treatable cases go on to a treatment plan; triage referrals and
+    # serious findings never ask for one, so a prefetch would be wasted spend
+    if (
+        settings.TREATMENT_PLAN_PREFETCH
+        and source != "triage"
+        and response.serious_vs_treatable.diagnosis == "treatable"
+    ):
+        # Imported here: treatment_plan imports this module
+        from .treatment_plan import prefetch_treatment_plan
+        prefetch_treatment_plan(session_id, analysis)
+
+
+def sse_event(event: str, data) -> str:
+    """Format a server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 
 @router.post("/", response_model=AnalysisResult)
-async def analyze_intake_form(data: IntakeFormData, db: Session = Depends(get_db)):
+async def analyze_intake_form(data: IntakeFormData, db: AsyncSession = Depends(get_db)):
+    record_request_parse()
     logger.info("Received request to analyze intake form.")
     try:
-        # Log the raw input data
-        logger.info(f"Raw Input Data: {data.dict()}")
-        
-        # Validate the data
-        try:
-            validated_data = data.dict()
-            logger.info(f"Validated Data: {validated_data}")
-        except Exception as validation_error:
-            logger.error(f"Validation Error: {str(validation_error)}")
-            raise HTTPException(
-                status_code=422,
-                detail={"validation_error": str(validation_error)}
-            )
+        # The body was validated into IntakeFormData before the handler ran;
+        # serialize it once and share the dict from here on
+        validated_data = data.as_dict()
+        log_payload(logger, "Validated data", validated_data)
 
         # Generate a session_id for tracking
         session_id = generate_session_id()
         logger.info(f"Generated session ID: {session_id}")
 
-        # Add session_id to the input variables
+        # Record the session_id alongside the input (it is not part of the prompt,
+        # so identical intakes share a cached LLM response)
         validated_data["session_id"] = session_id
 
-        logger.info("Calling LLM service...")
+        # Clear-cut red flags and near-duplicate intakes are answered without the LLM call
+        triage = triage_engine.assess(validated_data)
         try:
-            response = llm_service.generate_response(
-                prompt_template=INTAKE_ANALYSIS_PROMPT,
-                input_variables=validated_data,
-                output_parser=analysis_result_parser,
-            )
-            logger.info(f"LLM Response: {response}")
+            response, source = await answer_without_llm(validated_data, triage)
+            if response is None:
+                logger.info("Calling LLM service...")
+                response = await llm_service.agenerate_response(
+                    prompt=INTAKE_ANALYSIS,
+                    input_variables=validated_data,
+                    response_model=AnalysisResult,
+                )
+            response.session_id = session_id
 
             # Store the result in the database
-            session = SessionModel(
-                session_id=session_id,
-                analysis=response.dict()
-            )
-            db.add(session)
-            
-            # Log the LLM interaction
-            llm_log = LLMLog(
-                session_id=session_id,
-                step="intake_analysis",
-                payload={
-                    "input": validated_data,
-                    "output": response.dict()
-                }
-            )
-            db.add(llm_log)
-            db.commit()
-            
+            await persist_analysis(db, session_id, validated_data, response, triage, source)
+
             # Convert response to dict and add session_id
             response_dict = response.dict()
             response_dict["session_id"] = session_id
-            logger.info(f"Final response with session ID: {response_dict}")
+            log_payload(logger, "Final response", response_dict)
             
             return response_dict
+        except PromptBudgetExceeded as budget_error:
+            logger.error(f"Prompt Budget Error: {str(budget_error)}")
+            raise HTTPException(
+                status_code=413,
+                detail={"prompt_budget_error": str(budget_error)}
+            )
         except Exception as llm_error:
             logger.error(f"LLM Error: {str(llm_error)}")
             raise HTTPException(
@@ -156,13 +251,67 @@ async def analyze_intake_form(data: IntakeFormData, db: Session = Depends(get_db
             detail={"error": str(e)}
         )
 
+@router.post("/stream")
+async def analyze_intake_form_stream(data: IntakeFormData):
+    """
+    Streaming variant of analyze_intake_form, sent as server-sent events:
+    - "token": each raw text chunk from the model, as {"delta": ...}
+    - "field": each top-level AnalysisResult field as soon as its value is
+      complete, as {"field": ..., "value": ...}; all at once, with no tokens,
+      when triage or the semantic cache answers without the model
+    - "result": the validated AnalysisResult with session_id, once persisted
+    - "error": {"error": ...} if generation, parsing or persistence fails
+    """
+    record_request_parse()
+    logger.info("Received request to stream intake form analysis.")
+    validated_data = data.as_dict()
+    session_id = generate_session_id()
+    logger.info(f"Generated session ID: {session_id}")
+    validated_data["session_id"] = session_id
+
+    async def event_stream():
+        parser = PartialJSONObjectParser()
+        triage = triage_engine.assess(validated_data)
+        try:
+            response, source = await answer_without_llm(validated_data, triage)
+            if response is not None:
+                for field, value in response.dict(exclude={"session_id"}).items():
+                    yield sse_event("field", {"field": field, "value": value})
+            else:
+                async for delta in llm_service.astream_response(
+                    prompt=INTAKE_ANALYSIS,
+                    input_variables=validated_data,
+                    response_model=AnalysisResult,
+                ):
+                    yield sse_event("token", {"delta": delta})
+                    for field, value in parser.feed(delta):
+                        yield sse_event("field", {"field": field, "value": value})
+
+                response = llm_service.parse_response(parser.text, AnalysisResult)
+            response.session_id = session_id
+
+            # The request-scoped session is closed once the response starts, so use our own
+            async with AsyncSessionLocal() as db:
+                await persist_analysis(db, session_id, validated_data, response, triage, source)
+
+            yield sse_event("result", response.dict())
+        except Exception as e:
+            logger.error(f"Streaming analysis error: {str(e)}")
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.post("/feedback")
 async def submit_feedback(feedback_data: dict):
     """
     Endpoint to handle feedback submission and store it along with the analysis result.
     """
     try:
-        logger.info(f"Received feedback data: {feedback_data}")
+        log_payload(logger, "Received feedback data", feedback_data)
         
         session_id = feedback_data.get("session_id")
         feedback = feedback_data.get("feedback")
@@ -205,3 +354,24 @@ async def submit_feedback(feedback_data: dict):
             status_code=500,
             detail={"error": f"Failed to save feedback: {str(e)}"}
         )
+
+@router.get("/llm_stats")
+async def llm_stats():
+    """
+    Per-backend latency, error rate and circuit state, plus hedge and failover counts, in this worker.
+    """
+    return llm_service.router.stats()
+
+@router.get("/triage_stats")
+async def triage_stats():
+    """
+    Red-flag triage hit rates in this worker, including the share of intakes answered without the LLM.
+    """
+    return triage_engine.stats()
+
+@router.get("/semantic_cache_stats")
+async def semantic_cache_stats():
+    """
+    Semantic cache size, hit ratio and lookup latency in this worker.
+    """
+    return intake_semantic_cache.stats()
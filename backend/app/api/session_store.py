@@ -1,36 +1,90 @@
 """
 Session store for managing user sessions and their associated data.
+
+Analyses are read through three tiers:
+1. A per-process LRU, with a short TTL so updates made by another worker
+   are picked up quickly.
+2. Redis, filled as soon as intake analysis completes, shared by every worker.
+3. Postgres, the source of truth, on a miss in both caches.
+
+Writes go to Postgres first; the cached copies are then invalidated and
+refreshed.
 """
-from typing import Dict, Any, Optional
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Any, Optional
 import logging
-from fastapi import Depends
+import time
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..core.database import get_db
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal
+from ..core.redis import get_cache, set_cache, delete_cache
 from ..models.database import Session as SessionModel
 from sqlalchemy import select
 
 logger = logging.getLogger(__name__)
 
+# Where a lookup was answered from
+SOURCES = ("local", "redis", "db", "miss")
+
 class SessionStore:
     """
     Class for managing user sessions and their associated data.
     """
-    def __init__(self):
+    def __init__(
+        self,
+        local_max_entries: int = 2048,
+        local_ttl: float = 60,
+        redis_ttl: int = 3600,
+        namespace: str = "session:analysis:",
+    ):
         """Initialize the session store."""
-        self._get_db = get_db
+        self._session_factory = AsyncSessionLocal
+        self.local_max_entries = local_max_entries
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.namespace = namespace
+        self._local: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+        # Lookup counters and latency per source, plus recent latencies for percentiles
+        self.lookups = {source: 0 for source in SOURCES}
+        self.lookup_seconds = {source: 0.0 for source in SOURCES}
+        self._recent_seconds: Deque[float] = deque(maxlen=1024)
+
+    def _get_local(self, session_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._local.get(session_id)
+        if entry is None:
+            return None
+        expires_at, analysis = entry
+        if expires_at < time.monotonic():
+            del self._local[session_id]
+            return None
+        self._local.move_to_end(session_id)
+        return analysis
+
+    def _set_local(self, session_id: str, analysis: Dict[str, Any]) -> None:
+        self._local[session_id] = (time.monotonic() + self.local_ttl, analysis)
+        self._local.move_to_end(session_id)
+        while len(self._local) > self.local_max_entries:
+            self._local.popitem(last=False)
+
+    def _record(self, source: str, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        self.lookups[source] += 1
+        self.lookup_seconds[source] += elapsed
+        self._recent_seconds.append(elapsed)
 
     async def fetch(self, session_id: str) -> Optional[SessionModel]:
         """
         Fetch session data from the database.
-        
+
         Args:
             session_id: The unique identifier for the session
-            
+
         Returns:
             The session data if found, None otherwise
         """
         try:
-            async with self._get_db() as db:
+            async with self._session_factory() as db:
                 result = await db.execute(
                     select(SessionModel).where(SessionModel.session_id == session_id)
                 )
@@ -39,10 +93,62 @@ class SessionStore:
             logger.error(f"Error fetching session {session_id}: {str(e)}")
             raise
 
-    async def store(self, session_id: str, data: Dict[str, Any], db: AsyncSession = Depends(get_db)) -> None:
+    async def get_analysis(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the stored analysis for a session, reading through the local
+        LRU, Redis and the database in turn.
+
+        Args:
+            session_id: The unique identifier for the session
+
+        Returns:
+            The analysis dict if the session exists, None otherwise
+        """
+        started = time.perf_counter()
+
+        analysis = self._get_local(session_id)
+        if analysis is not None:
+            self._record("local", started)
+            return analysis
+
+        analysis = await get_cache(self.namespace + session_id)
+        if isinstance(analysis, dict):
+            self._set_local(session_id, analysis)
+            self._record("redis", started)
+            return analysis
+
+        session = await self.fetch(session_id)
+        if session is None:
+            self._record("miss", started)
+            return None
+        analysis = session.analysis
+        await self.cache_analysis(session_id, analysis)
+        self._record("db", started)
+        return analysis
+
+    async def cache_analysis(self, session_id: str, analysis: Dict[str, Any]) -> None:
+        """
+        Cache an analysis that has been committed to the database.
+
+        Args:
+            session_id: The unique identifier for the session
+            analysis: The stored analysis
+        """
+        self._set_local(session_id, analysis)
+        await set_cache(self.namespace + session_id, analysis, expire=self.redis_ttl)
+
+    async def invalidate(self, session_id: str) -> None:
+        """
+        Drop a session's cached analysis from this process and from Redis.
+        Other workers' local copies expire within local_ttl.
+        """
+        self._local.pop(session_id, None)
+        await delete_cache(self.namespace + session_id)
+
+    async def store(self, session_id: str, data: Dict[str, Any], db: AsyncSession) -> None:
         """
         Store session data in the database.
-        
+
         Args:
             session_id: The unique identifier for the session
             data: The data to store
@@ -54,20 +160,43 @@ class SessionStore:
                 select(SessionModel).where(SessionModel.session_id == session_id)
             )
             session = result.scalar_one_or_none()
-            
+
             if session:
                 # Update existing session
-                session.data = data
+                session.analysis = data
             else:
                 # Create new session
-                session = SessionModel(session_id=session_id, data=data)
+                session = SessionModel(session_id=session_id, analysis=data)
                 db.add(session)
-            
+
             await db.commit()
+            await self.invalidate(session_id)
+            await self.cache_analysis(session_id, data)
             logger.info(f"Session {session_id} stored successfully")
         except Exception as e:
             logger.error(f"Error storing session {session_id}: {str(e)}")
             raise
 
+    def stats(self) -> Dict[str, Any]:
+        """Hit ratio and lookup latency (milliseconds) per source."""
+        total = sum(self.lookups.values())
+        hits = self.lookups["local"] + self.lookups["redis"]
+        recent = sorted(self._recent_seconds)
+        return {
+            "lookups": dict(self.lookups),
+            "hit_ratio": hits / total if total else 0.0,
+            "avg_ms": {
+                source: 1000 * self.lookup_seconds[source] / self.lookups[source]
+                for source in SOURCES if self.lookups[source]
+            },
+            "p50_ms": 1000 * recent[len(recent) // 2] if recent else 0.0,
+            "p95_ms": 1000 * recent[int(len(recent) * 0.95)] if recent else 0.0,
+            "local_entries": len(self._local),
+        }
+
 # Create a singleton instance
-session_store = SessionStore() 
\ No newline at end of file
+session_store = SessionStore(
+    local_max_entries=settings.SESSION_CACHE_LOCAL_MAX_ENTRIES,
+    local_ttl=settings.SESSION_CACHE_LOCAL_TTL,
+    redis_ttl=settings.SESSION_CACHE_TTL,
+)
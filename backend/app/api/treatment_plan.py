@@ -1,21 +1,20 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import List, Optional
-from ..core.llm import llm_service
+from ..core.config import settings
+from ..core.llm import llm_service, request_usage
+from ..core.prefetch import SpeculativePrefetcher
 from ..models.treatment_plan import TreatmentPlan
-from ..prompts.treatment_plan_prompt import TREATMENT_PLAN_PROMPT
+from ..prompts.registry import TREATMENT_PLAN
 import logging
 import json
 from .intake_analysis import store_treatment_plan
-from langchain.output_parsers import PydanticOutputParser
 from .session_store import session_store
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from ..core.database import get_db
-from ..models.database import Session as SessionModel, LLMLog
+from ..core.llm_log import log_llm_interaction
+from ..core.metrics import span, record_fallback, record_request_parse
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -23,46 +22,102 @@ router = APIRouter()
 class TreatmentPlanRequest(BaseModel):
     session_id: str
 
+# Plans generated speculatively after intake analysis, keyed by session_id
+treatment_plan_prefetcher = SpeculativePrefetcher(
+    "treatment_plan",
+    max_inflight=settings.TREATMENT_PLAN_PREFETCH_MAX_INFLIGHT,
+    token_budget=settings.TREATMENT_PLAN_PREFETCH_TOKEN_BUDGET,
+    budget_window=settings.TREATMENT_PLAN_PREFETCH_BUDGET_WINDOW,
+    max_tokens_per_call=TREATMENT_PLAN.max_input_tokens + TREATMENT_PLAN.output_tokens,
+    ttl=settings.TREATMENT_PLAN_PREFETCH_TTL,
+)
+
+def format_intake_analysis(analysis: dict) -> str:
+    """
+    Render a stored AnalysisResult dict as the {intake_analysis} prompt section.
+    """
+    main = analysis.get("main_diagnosis") or {}
+    other = analysis.get("other_probabilistic_diagnosis") or []
+    recommendations = analysis.get("treatment_recommendations") or []
+    return "\n".join([
+        f"Main Diagnosis: {main.get('diagnosis')} (ICD-10: {main.get('icd10_code')})",
+        f"Explanation: {main.get('simple_explanation')}",
+        f"Clinical Reasoning: {main.get('reasoning')}",
+        "Other Possible Diagnoses:",
+        *[f"- {d.get('diagnosis')} ({d.get('icd10_code')}): {d.get('simple_explanation')}" for d in other],
+        "Initial Recommendations:",
+        *[f"- {r.get('type')}: {r.get('description')}" for r in recommendations],
+        f"Overall Reasoning: {analysis.get('reasoning')}",
+    ])
+
+async def generate_plan(analysis: dict) -> TreatmentPlan:
+    """
+    Generate a treatment plan for a stored analysis. The session_id is not
+    part of the prompt, so identical analyses share a cached response.
+    """
+    return await llm_service.agenerate_response(
+        prompt=TREATMENT_PLAN,
+        input_variables={
+            "intake_analysis": format_intake_analysis(analysis),
+        },
+        response_model=TreatmentPlan
+    )
+
+def prefetch_treatment_plan(session_id: str, analysis: dict) -> bool:
+    """
+    Start generating a session's treatment plan in the background, within
+    the prefetch budget. Returns whether a prefetch is scheduled.
+    """
+    return treatment_plan_prefetcher.schedule(
+        session_id, lambda: generate_plan(analysis)
+    )
+
+@router.get("/treatment_plan/cache_stats")
+async def session_cache_stats():
+    """
+    Hit ratio and lookup latency of the session cache in this worker.
+    """
+    return session_store.stats()
+
+@router.get("/treatment_plan/prefetch_stats")
+async def prefetch_stats():
+    """
+    Speculative treatment-plan generation counters and token spend in this worker.
+    """
+    return treatment_plan_prefetcher.stats()
+
 @router.post("/treatment_plan", response_model=TreatmentPlan)
 async def generate_treatment_plan(request: TreatmentPlanRequest, db: AsyncSession = Depends(get_db)):
     """
     Generate a treatment plan based on the analysis result.
     """
+    record_request_parse()
     try:
         logger.info(f"Generating treatment plan for session {request.session_id}")
         
-        # Fetch the session data from the database
-        result = await db.execute(
-            select(SessionModel).where(SessionModel.session_id == request.session_id)
-        )
-        session_data = result.scalar_one_or_none()
-        if not session_data:
+        # Fetch the analysis through the session cache
+        analysis = await session_store.get_analysis(request.session_id)
+        if analysis is None:
             logger.error(f"No session found for ID: {request.session_id}")
             raise HTTPException(status_code=404, detail="No analysis found for that session")
         
-        analysis = session_data.analysis
-        
-        # Create output parser for TreatmentPlan
-        output_parser = PydanticOutputParser(pydantic_object=TreatmentPlan)
-        
-        # Generate treatment plan using LLM
-        response = llm_service.generate_response(
-            prompt_template=TREATMENT_PLAN_PROMPT,
-            input_variables={"session_id": request.session_id},
-            output_parser=output_parser
-        )
+        # Use the speculatively generated plan if there is one, else generate it now
+        prefetched = await treatment_plan_prefetcher.take(request.session_id)
+        if prefetched is not None:
+            response, usage = prefetched
+        else:
+            response = await generate_plan(analysis)
+            usage = request_usage()
         
         # Log the LLM interaction
-        llm_log = LLMLog(
-            session_id=request.session_id,
-            step="treatment_plan",
-            payload={
-                "input": {"session_id": request.session_id},
-                "output": response.dict()
-            }
-        )
-        db.add(llm_log)
-        await db.commit()
+        log_llm_interaction(db, request.session_id, "treatment_plan", {
+            "input": {"session_id": request.session_id},
+            "output": response.dict(),
+            "usage": usage,
+            "prefetched": prefetched is not None
+        })
+        with span("db_commit"):
+            await db.commit()
         
         # Store the treatment plan
         store_treatment_plan(response, request.session_id)
@@ -70,8 +125,11 @@ async def generate_treatment_plan(request: TreatmentPlanRequest, db: AsyncSessio
         
         return response
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating treatment plan: {str(e)}")
+        record_fallback("treatment_plan_default")
         # Fallback to default treatment plan
         treatment_plan = TreatmentPlan(
             treatment_focus="pain management and core stability",
@@ -100,16 +158,13 @@ async def generate_treatment_plan(request: TreatmentPlanRequest, db: AsyncSessio
         )
         
         # Log the fallback plan
-        llm_log = LLMLog(
-            session_id=request.session_id,
-            step="treatment_plan_fallback",
-            payload={
-                "error": str(e),
-                "fallback_plan": treatment_plan.dict()
-            }
-        )
-        db.add(llm_log)
-        await db.commit()
+        await db.rollback()
+        log_llm_interaction(db, request.session_id, "treatment_plan_fallback", {
+            "error": str(e),
+            "fallback_plan": treatment_plan.dict()
+        })
+        with span("db_commit"):
+            await db.commit()
         
         # Store the default treatment plan
         store_treatment_plan(treatment_plan, request.session_id)
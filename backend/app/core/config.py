@@ -14,12 +14,120 @@ class Settings(BaseSettings):
 
     # OpenAI / LLM settings
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    OPENAI_API_BASE: str = ""  # OpenAI-compatible endpoint, e.g. the load-test fake server; default is OpenAI's
     LLM_MODEL_NAME: str = "gpt-4"
     MAX_TOKENS: int = 1500
     TEMPERATURE: float = 0.7
+    LLM_MAX_CONCURRENCY: int = 32  # Max in-flight LLM calls per worker
+    LLM_TOTAL_CONCURRENCY: int = 0  # Max in-flight LLM calls across all workers; if set, split evenly and overrides LLM_MAX_CONCURRENCY
+    LLM_BACKENDS: str = ""  # Comma-separated models in preference order, e.g. "gpt-4,gpt-4o-mini"; "fake" for a local fake; defaults to LLM_MODEL_NAME
+    LLM_REQUEST_TIMEOUT: float = 30  # Seconds per attempt
+    LLM_MAX_RETRIES: int = 0  # Client-level retries; the router hedges and fails over instead
+    LLM_HEDGE_ENABLED: bool = True
+    LLM_HEDGE_PERCENTILE: float = 0.95  # Hedge once a call is slower than this latency percentile
+    LLM_HEDGE_MIN_DELAY: float = 2.0  # Seconds; lower clamp on the hedge deadline
+    LLM_HEDGE_DEFAULT_DELAY: float = 10.0  # Seconds; used until a backend has enough latency samples
+    LLM_MAX_HEDGES: int = 1  # Extra concurrent attempts per call
+    LLM_EWMA_ALPHA: float = 0.2
+    LLM_BREAKER_FAILURES: int = 5  # Consecutive failures that open a backend's circuit
+    LLM_BREAKER_COOLDOWN: float = 30  # Seconds before a half-open trial call
+    LLM_STRUCTURED_OUTPUT: bool = True  # Request tool-call (schema-constrained) output, text JSON as fallback
+    LLM_FAKE_LATENCY: float = 0.0  # Seconds per call of the "fake" backend, e.g. for load profiles
 
-    # Database settings (if needed)
-    # DATABASE_URL: str = "sqlite:///./test.db"
+    # Per-prompt token budgets; output budgets are clamped to MAX_TOKENS
+    INTAKE_ANALYSIS_MAX_INPUT_TOKENS: int = 3000
+    INTAKE_ANALYSIS_MAX_OUTPUT_TOKENS: int = 1500
+    FINAL_ANALYSIS_MAX_INPUT_TOKENS: int = 2500
+    FINAL_ANALYSIS_MAX_OUTPUT_TOKENS: int = 1200
+    TREATMENT_PLAN_MAX_INPUT_TOKENS: int = 2500
+    TREATMENT_PLAN_MAX_OUTPUT_TOKENS: int = 1200
+
+    # LLM response cache (local LRU + Redis)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_ENTRIES: int = 1024  # Per-process LRU size
+    LLM_CACHE_TTL: int = 86400  # Seconds
+    LLM_CACHE_NONDETERMINISTIC: bool = True  # Set False to skip caching when TEMPERATURE > 0
+
+    # Cross-worker single-flight for identical prompts
+    LLM_SINGLEFLIGHT_LOCK_TTL: int = 120  # Seconds; must exceed worst-case LLM call time
+    LLM_SINGLEFLIGHT_POLL_INTERVAL: float = 0.25  # Seconds between follower cache polls
+
+    # Speculative treatment-plan generation right after intake analysis (treatable cases only)
+    TREATMENT_PLAN_PREFETCH: bool = False
+    TREATMENT_PLAN_PREFETCH_MAX_INFLIGHT: int = 8  # Per worker
+    TREATMENT_PLAN_PREFETCH_TOKEN_BUDGET: int = 200000  # Speculative tokens per window, per worker
+    TREATMENT_PLAN_PREFETCH_BUDGET_WINDOW: int = 3600  # Seconds
+    TREATMENT_PLAN_PREFETCH_TTL: int = 900  # Seconds an unclaimed plan is kept
+
+    # Rule-based red-flag triage before the intake LLM call
+    TRIAGE_ENABLED: bool = True  # Answer clear-cut serious cases with a templated referral; False only scores them
+    TRIAGE_SERIOUS_THRESHOLD: float = 1.0  # Red-flag score at or above which a case is serious; a single rule this heavy makes it clear-cut
+    TRIAGE_RULES_PATH: str = ""  # JSON rule table replacing the built-in one
+
+    # Semantic cache of intake analyses (reuse for intakes that differ only in free text)
+    SEMANTIC_CACHE_ENABLED: bool = False
+    # Minimum free-text cosine similarity for reuse. Lower thresholds hit more
+    # often but start reusing other patients' diagnoses: in
+    # benchmarks/bench_semantic_cache.py, 0.9 returned a different main or
+    # serious-vs-treatable diagnosis in most runs, while 0.95 and up returned none
+    # (hit rate ~37% at 0.97 vs ~42% at 0.95). 0.97 keeps a margin.
+    SEMANTIC_CACHE_THRESHOLD: float = 0.97
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 10000  # Per worker; least recently used are evicted
+    SEMANTIC_CACHE_TTL: int = 604800  # Seconds
+    SEMANTIC_CACHE_PATH: str = ""  # .npz file loaded at startup and saved at shutdown; defaults to cache/ beside DATA_DIR (data/cache/)
+    SEMANTIC_CACHE_EMBEDDING_MODEL: str = ""  # sentence-transformers model; hashed n-grams if empty
+
+    # Session analysis cache used by the treatment-plan path (local LRU + Redis)
+    SESSION_CACHE_TTL: int = 3600  # Redis, seconds
+    SESSION_CACHE_LOCAL_MAX_ENTRIES: int = 2048  # Per-process LRU size
+    SESSION_CACHE_LOCAL_TTL: float = 60  # Seconds; bounds staleness after an update from another worker
+
+    # Redis connection pool settings
+    REDIS_MAX_CONNECTIONS: int = 50  # Per worker
+    REDIS_SOCKET_TIMEOUT: float = 2.0  # Seconds
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 2.0  # Seconds
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # Seconds
+
+    # Background JSONL audit writer (data/raw/*.jsonl)
+    DATA_DIR: str = ""  # Directory of the JSONL audit files; defaults to data/raw at the repository root
+    JSONL_BATCH_SIZE: int = 100  # Lines per write
+    JSONL_FLUSH_INTERVAL: float = 1.0  # Max seconds a line waits in the queue
+    JSONL_FSYNC: str = "batch"  # "never", "batch" or "interval"
+    JSONL_FSYNC_INTERVAL: float = 5.0  # Seconds between fsyncs when JSONL_FSYNC is "interval"
+
+    # Database settings (DATABASE_URL itself is read in core/database.py)
+    DB_ECHO: bool = False  # Log every SQL statement
+    DB_POOL_SIZE: int = 10  # Per worker
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10.0  # Seconds to wait for a pooled connection
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is replaced
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 10000  # Postgres statement_timeout; 0 disables
+
+    # LLMLog rows: written with the request's transaction, or buffered and bulk inserted
+    LLM_LOG_DEFERRED: bool = False
+    LLM_LOG_BATCH_SIZE: int = 100  # Rows per multi-row insert
+    LLM_LOG_FLUSH_INTERVAL: float = 1.0  # Max seconds a row waits in the buffer
+
+    # Logging
+    LOG_LEVEL: str = "INFO"  # DEBUG also logs every prompt, raw LLM response and intake payload
+    LOG_PAYLOAD_SAMPLE_RATE: float = 0.0  # Share of requests whose payloads are logged at INFO
+    LOG_REDACT_FIELDS: str = "primary_complaint,pain_comment,pain_movement,red_flag_details,feedback"  # Free-text patient fields
+
+    # Server (core/server.py, used as the gunicorn config)
+    HOST: str = "0.0.0.0"
+    PORT: int = 8000
+    WEB_CONCURRENCY: int = 0  # Worker processes; 0 derives them from the usable CPUs
+    SERVER_MAX_WORKERS: int = 8  # Upper bound on derived workers; each has its own DB/Redis pools and caches
+    SERVER_LOOP: str = "auto"  # "auto" (uvloop if installed), "uvloop" or "asyncio"
+    SERVER_HTTP: str = "auto"  # "auto" (httptools if installed), "httptools" or "h11"
+    SERVER_KEEPALIVE: int = 75  # Seconds; longer than the load balancer's idle timeout
+    SERVER_BACKLOG: int = 2048  # Pending connections per listening socket; capped by net.core.somaxconn
+    SERVER_LIMIT_CONCURRENCY: int = 0  # Connections per worker before answering 503; 0 is unlimited
+    SERVER_TIMEOUT: int = 60  # Seconds a worker's event loop may stall before it is restarted
+    SERVER_GRACEFUL_TIMEOUT: int = 0  # Seconds to finish in-flight requests on shutdown; 0 derives it from the LLM timeouts
+    SERVER_MAX_REQUESTS: int = 0  # Requests before a worker is recycled (with 10% jitter); 0 never
+    SERVER_PRELOAD: bool = True  # Import the app once in the master and fork workers from it
 
     # Other configurations
     ENVIRONMENT: str = "development"
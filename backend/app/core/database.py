@@ -1,42 +1,76 @@
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import MetaData
-from sqlalchemy.ext.declarative import declarative_base
+from typing import AsyncIterator, Optional
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
+from sqlalchemy import text
 from sqlalchemy.engine.url import make_url
+from .config import settings
 from ..models.database import Base
 
-# Get and normalize DATABASE_URL
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise RuntimeError("🛑 DATABASE_URL not set")
 
-# Normalize the URL to use postgresql+asyncpg://
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+asyncpg://", 1)
-elif not DATABASE_URL.startswith("postgresql+asyncpg://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+def database_url() -> str:
+    """DATABASE_URL from the environment, normalized to postgresql+asyncpg://."""
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        raise RuntimeError("🛑 DATABASE_URL not set")
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql+asyncpg://", 1)
+    elif not url.startswith("postgresql+asyncpg://"):
+        url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
 
-# Create async SQLAlchemy engine
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
 
-# Create async session factory
-AsyncSessionLocal = sessionmaker(
-    bind=engine, class_=AsyncSession, expire_on_commit=False
-)
+def engine_options(url: str) -> dict:
+    """Pool and timeout options for create_async_engine, from settings."""
+    options = {"echo": settings.DB_ECHO, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if make_url(url).get_backend_name() == "postgresql":
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+        if settings.DB_STATEMENT_TIMEOUT_MS:
+            options["connect_args"] = {
+                "server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+            }
+    return options
+
+
+# Created on first use (init_db at startup) rather than at import, so
+# importing the app needs neither DATABASE_URL nor the driver
+_engine: Optional[AsyncEngine] = None
+
+# Session factory; bound to the engine by get_engine()
+AsyncSessionLocal = async_sessionmaker(expire_on_commit=False)
+
+
+def get_engine() -> AsyncEngine:
+    """The process's async engine, created and bound to AsyncSessionLocal on first call."""
+    global _engine
+    if _engine is None:
+        url = database_url()
+        _engine = create_async_engine(url, **engine_options(url))
+        AsyncSessionLocal.configure(bind=_engine)
+    return _engine
 
 async def init_db():
     # Create tables
-    async with engine.begin() as conn:
+    async with get_engine().begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        if conn.dialect.name == "postgresql":
+            # Keep upcoming monthly llm_logs partitions in place (created by migration 7b3e9c4d1a2f)
+            exists = await conn.scalar(text("SELECT to_regproc('llm_logs_ensure_partitions') IS NOT NULL"))
+            if exists:
+                await conn.execute(text("SELECT llm_logs_ensure_partitions(3)"))
 
 async def close_db():
-    await engine.dispose()
+    global _engine
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
 
 # Dependency to get DB session
-async def get_db():
+async def get_db() -> AsyncIterator[AsyncSession]:
+    get_engine()
     async with AsyncSessionLocal() as session:
-        try:
-            yield session
-        finally:
-            await session.close() 
\ No newline at end of file
+        yield session
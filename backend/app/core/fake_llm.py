@@ -0,0 +1,150 @@
+"""
+Local stand-in for a chat model backend, for tests and load runs without an API key.
+
+FakeChatModel implements the parts of the LangChain chat model interface that
+LLMService and the router use (ainvoke, astream, bind, __call__) and returns
+canned, schema-valid responses: an AnalysisResult for the intake prompt and a
+TreatmentPlan for the treatment-plan prompts, as plain JSON text or as a
+forced tool call when bound with tools. Latency and failures can be injected
+to exercise hedging, failover and the circuit breaker.
+
+Select it with LLM_BACKENDS=fake (or e.g. "fake,gpt-4").
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+import asyncio
+import json
+import random
+import time
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+ANALYSIS_RESPONSE = {
+    "serious_vs_treatable": {"diagnosis": "treatable", "probability": 0.9},
+    "differentiation_probabilities": [
+        {"diagnosis": "muscle-related", "probability": 0.7},
+        {"diagnosis": "neurological", "probability": 0.2},
+        {"diagnosis": "other", "probability": 0.1},
+    ],
+    "main_diagnosis": {
+        "diagnosis": "Lumbar muscle strain",
+        "icd10_code": "S39.012A",
+        "reasoning": "Mechanical low back pain aggravated by sitting and bending, no red flags.",
+        "probability": 0.8,
+        "simple_explanation": "The muscles in your lower back are overworked and irritated.",
+    },
+    "other_probabilistic_diagnosis": [
+        {
+            "diagnosis": "Lumbar disc herniation",
+            "icd10_code": "M51.26",
+            "probability": 0.15,
+            "simple_explanation": "A disc between the vertebrae may be pressing on a nerve.",
+        },
+    ],
+    "treatment_recommendations": [
+        {
+            "type": "Exercise",
+            "description": "Gentle core activation and walking",
+            "priority": 1,
+            "frequency": "Daily",
+            "duration": "2 weeks",
+        },
+    ],
+    "reasoning": "Symptoms are consistent with a mechanical, treatable muscle strain.",
+}
+
+_EXERCISE = {
+    "type": "Exercise",
+    "sets": "3",
+    "reps": "10",
+    "frequency": "Daily",
+    "duration": "2 weeks",
+    "precautions": "Stop if pain increases beyond 3/10.",
+}
+
+TREATMENT_PLAN_RESPONSE = {
+    "treatment_focus": "pain",
+    "treatment_recommendations": [
+        dict(_EXERCISE, name="Pelvic Tilts", description="Gentle core activation lying on your back."),
+        dict(_EXERCISE, name="Cat-Cow Stretch", description="Slow spinal mobility on hands and knees."),
+        dict(_EXERCISE, name="Bridging", description="Glute and core strengthening from lying."),
+    ],
+    "reasoning": "Start by calming pain and restoring gentle movement before loading.",
+    "next_phase_focus": "mobility",
+}
+
+# Response by tool (response model) name, and markers that identify a text prompt
+RESPONSES: Dict[str, Dict[str, Any]] = {
+    "AnalysisResult": ANALYSIS_RESPONSE,
+    "TreatmentPlan": TREATMENT_PLAN_RESPONSE,
+}
+_TEXT_MARKERS = (("serious_vs_treatable", "AnalysisResult"),)
+
+
+class FakeLLMError(RuntimeError):
+    """Injected backend failure."""
+
+
+class FakeChatModel:
+    """
+    Canned-response chat model with configurable latency and error rate.
+    """
+    def __init__(
+        self,
+        latency: Union[float, Tuple[float, float]] = 0.0,
+        error_rate: float = 0.0,
+        chunk_size: int = 16,
+        seed: Optional[int] = None,
+        tool_name: Optional[str] = None,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.chunk_size = chunk_size
+        self.tool_name = tool_name
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    def bind(self, tools: List[dict] = (), **kwargs) -> "FakeChatModel":
+        """Return a copy that answers with a forced call to the first tool."""
+        bound = FakeChatModel(self.latency, self.error_rate, self.chunk_size, tool_name=tools[0]["function"]["name"])
+        bound._random = self._random
+        return bound
+
+    def _delay(self) -> float:
+        if isinstance(self.latency, tuple):
+            return self._random.uniform(*self.latency)
+        return self.latency
+
+    def _maybe_fail(self) -> None:
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise FakeLLMError("Injected fake backend failure")
+
+    def _content(self, messages) -> str:
+        text = "\n".join(str(message.content) for message in messages)
+        name = next((model for marker, model in _TEXT_MARKERS if marker in text), "TreatmentPlan")
+        return json.dumps(RESPONSES[name])
+
+    def _message(self, messages) -> AIMessage:
+        self.calls += 1
+        if self.tool_name is None:
+            return AIMessage(content=self._content(messages))
+        arguments = json.dumps(RESPONSES.get(self.tool_name, {}))
+        return AIMessage(content="", additional_kwargs={"tool_calls": [{
+            "id": f"call_{self.calls}",
+            "type": "function",
+            "function": {"name": self.tool_name, "arguments": arguments},
+        }]})
+
+    async def ainvoke(self, messages, **kwargs) -> AIMessage:
+        await asyncio.sleep(self._delay())
+        self._maybe_fail()
+        return self._message(messages)
+
+    def __call__(self, messages, **kwargs) -> AIMessage:
+        time.sleep(self._delay())
+        self._maybe_fail()
+        return self._message(messages)
+
+    async def astream(self, messages, **kwargs) -> AsyncIterator[AIMessageChunk]:
+        content = (await self.ainvoke(messages)).content
+        for start in range(0, len(content), self.chunk_size):
+            yield AIMessageChunk(content=content[start:start + self.chunk_size])
@@ -0,0 +1,187 @@
+"""
+Fast extraction and repair of the JSON object in an LLM response.
+
+LLM output often wraps the JSON we asked for in a ```json fence, a sentence
+of prose, or both, and occasionally has small syntax slips (trailing commas,
+unquoted keys, raw newlines inside strings, or a truncated tail). This module
+handles all of that without regex passes:
+
+1. find_json_object: one linear scan that returns the outermost balanced
+   {...} span, skipping anything before it and ignoring braces inside strings.
+   It only runs when the first-"{"-to-last-"}" span does not parse as is.
+2. loads: parse with orjson when installed, falling back to the stdlib.
+3. repair_json: only if parsing fails, one more linear pass that fixes the
+   common slips above, then parse again.
+"""
+from typing import Any, Tuple
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speedup
+    orjson = None
+
+_CLOSERS = {"{": "}", "[": "]"}
+_LITERALS = {"true", "false", "null"}
+_STRING_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+class JSONExtractionError(ValueError):
+    """Raised when no usable JSON object can be recovered from the text."""
+
+
+def find_json_object(text: str) -> Tuple[int, int]:
+    """
+    Locate the outermost JSON object in text.
+
+    Returns (start, end) such that text[start:end] is the object. If the
+    object is never closed (e.g. the response was truncated), end is
+    len(text). Raises JSONExtractionError if there is no "{" at all.
+    """
+    start = text.find("{")
+    if start < 0:
+        raise JSONExtractionError("No JSON object found in LLM response")
+
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == "{" or c == "[":
+            depth += 1
+        elif c == "}" or c == "]":
+            depth -= 1
+            if depth == 0:
+                return start, i + 1
+    return start, len(text)
+
+
+def loads(text: str) -> Any:
+    """Parse JSON with orjson if available, otherwise the stdlib."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def repair_json(text: str) -> str:
+    """
+    Fix common LLM JSON slips in a single pass:
+    - raw newlines / tabs inside strings are escaped
+    - bare identifiers (unquoted keys or one-word values) are quoted
+    - trailing commas before } or ] are dropped
+    - unterminated strings and unclosed brackets are closed at the end
+    """
+    out = []
+    stack = []
+    in_string = False
+    escape = False
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if in_string:
+            if escape:
+                escape = False
+                out.append(c)
+            elif c == "\\":
+                escape = True
+                out.append(c)
+            elif c == '"':
+                in_string = False
+                out.append(c)
+            else:
+                out.append(_STRING_ESCAPES.get(c, c))
+            i += 1
+            continue
+
+        if c == '"':
+            in_string = True
+            out.append(c)
+        elif c == "{" or c == "[":
+            stack.append(_CLOSERS[c])
+            out.append(c)
+        elif c == "}" or c == "]":
+            _drop_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(c)
+        elif (c == "e" or c == "E") and out and out[-1][-1:].isdigit():
+            # Exponent of a number such as 1e-5
+            out.append(c)
+        elif c.isalpha() or c == "_":
+            if _last_significant(out) == ":":
+                # Bare value: quote everything up to the next delimiter
+                j = i + 1
+                while j < n and text[j] not in ",}]\n":
+                    j += 1
+            else:
+                j = i + 1
+                while j < n and (text[j].isalnum() or text[j] in "_-"):
+                    j += 1
+            word = text[i:j].rstrip()
+            out.append(word if word in _LITERALS else json.dumps(word))
+            i = j
+            continue
+        else:
+            out.append(c)
+        i += 1
+
+    if escape:
+        out.pop()
+    if in_string:
+        out.append('"')
+    _drop_trailing_comma(out)
+    while stack:
+        out.append(stack.pop())
+    return "".join(out)
+
+
+def _last_significant(out: list) -> str:
+    """Last non-whitespace character written to the output buffer."""
+    j = len(out) - 1
+    while j >= 0 and out[j].isspace():
+        j -= 1
+    return out[j][-1] if j >= 0 else ""
+
+
+def _drop_trailing_comma(out: list) -> None:
+    """Remove a trailing comma (ignoring whitespace) from the output buffer."""
+    j = len(out) - 1
+    while j >= 0 and out[j].isspace():
+        j -= 1
+    if j >= 0 and out[j] == ",":
+        del out[j]
+
+
+def extract_json(text: str) -> Any:
+    """
+    Extract and parse the JSON object in an LLM response, repairing it if needed.
+    """
+    # Fast path: the span from the first "{" to the last "}" is usually the
+    # whole object, and the C parser checks that faster than we can scan it
+    start = text.find("{")
+    end = text.rfind("}") + 1
+    if 0 <= start < end:
+        try:
+            return loads(text[start:end])
+        except ValueError:
+            pass
+
+    start, end = find_json_object(text)
+    candidate = text[start:end]
+    try:
+        return loads(candidate)
+    except ValueError as first_error:
+        try:
+            return loads(repair_json(candidate))
+        except ValueError:
+            raise JSONExtractionError(f"Invalid JSON response from LLM: {first_error}")
@@ -0,0 +1,184 @@
+"""
+Background, batched appends to the JSONL audit files under data/raw.
+
+Request handlers call append_jsonl(path, record), which only serializes the
+record and puts the line on an asyncio queue. One writer task per file per
+process drains that queue, flushing a batch once it has JSONL_BATCH_SIZE
+lines or JSONL_FLUSH_INTERVAL seconds have passed since its first line.
+
+Each batch is written with a single os.write on an O_APPEND descriptor, off
+the event loop. O_APPEND makes the kernel seek to end-of-file and write in
+one step, so lines from several workers appending to the same file never
+interleave mid-line.
+
+JSONL_FSYNC controls durability:
+- "never": leave flushing to the OS (fastest)
+- "batch": fsync after every batch
+- "interval": fsync at most every JSONL_FSYNC_INTERVAL seconds
+
+close_jsonl_writers() drains every queue on shutdown.
+"""
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
+import logging
+import os
+import time
+
+from .config import settings
+from .metrics import span
+
+logger = logging.getLogger(__name__)
+
+_FSYNC_POLICIES = {"never", "batch", "interval"}
+
+
+class JSONLWriter:
+    """
+    Single background writer for one JSONL file.
+    """
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        fsync: str = "batch",
+        fsync_interval: float = 5.0,
+    ):
+        if fsync not in _FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}', expected one of {sorted(_FSYNC_POLICIES)}")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._fd: Optional[int] = None
+        self._last_fsync = time.monotonic()
+
+        # Counters
+        self.lines_written = 0
+        self.batches_written = 0
+        self.write_errors = 0
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Queue a record for writing. Never blocks on file I/O."""
+        line = json.dumps(record) + "\n"
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Called outside the event loop (scripts, tests): write directly
+            self._write_batch([line])
+            return
+
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+        self._queue.put_nowait(line)
+
+    async def _run(self) -> None:
+        """Drain the queue in batches until a None sentinel arrives."""
+        queue = self._queue
+        stopping = False
+        while not stopping:
+            line = await queue.get()
+            if line is None:
+                break
+            batch = [line]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    line = queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if line is None:
+                    stopping = True
+                    break
+                batch.append(line)
+            with span("jsonl_write"):
+                await asyncio.to_thread(self._write_batch, batch)
+
+    def _write_batch(self, lines: List[str]) -> None:
+        """Append a batch with one O_APPEND write, then fsync per policy."""
+        data = "".join(lines).encode("utf-8")
+        try:
+            if self._fd is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            view = memoryview(data)
+            while view:
+                written = os.write(self._fd, view)
+                view = view[written:]
+            self._maybe_fsync()
+            self.lines_written += len(lines)
+            self.batches_written += 1
+        except OSError as e:
+            self.write_errors += 1
+            logger.error(f"Error writing {len(lines)} records to {self.path}: {str(e)}")
+
+    def _maybe_fsync(self) -> None:
+        if self.fsync == "never":
+            return
+        now = time.monotonic()
+        if self.fsync == "batch" or now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._fd)
+            self._last_fsync = now
+
+    async def close(self) -> None:
+        """Write everything queued so far, then release the file descriptor."""
+        if self._task is not None and not self._task.done():
+            self._queue.put_nowait(None)
+            await self._task
+        self._task = None
+        self._queue = None
+        if self._fd is not None:
+            if self.fsync != "never":
+                os.fsync(self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+    def stats(self) -> Dict[str, int]:
+        """Write counters and current queue depth."""
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "lines_written": self.lines_written,
+            "batches_written": self.batches_written,
+            "write_errors": self.write_errors,
+        }
+
+
+# One writer per file per process
+_writers: Dict[str, JSONLWriter] = {}
+
+
+def get_writer(path: str) -> JSONLWriter:
+    """Return this process's writer for path, creating it on first use."""
+    path = os.path.abspath(path)
+    writer = _writers.get(path)
+    if writer is None:
+        writer = JSONLWriter(
+            path,
+            batch_size=settings.JSONL_BATCH_SIZE,
+            flush_interval=settings.JSONL_FLUSH_INTERVAL,
+            fsync=settings.JSONL_FSYNC,
+            fsync_interval=settings.JSONL_FSYNC_INTERVAL,
+        )
+        _writers[path] = writer
+    return writer
+
+
+def append_jsonl(path: str, record: Dict[str, Any]) -> None:
+    """Queue a record to be appended to the JSONL file at path."""
+    get_writer(path).append(record)
+
+
+async def close_jsonl_writers() -> None:
+    """Drain and close every writer. Call on application shutdown."""
+    for writer in list(_writers.values()):
+        try:
+            await writer.close()
+        except Exception as e:
+            logger.error(f"Error closing JSONL writer for {writer.path}: {str(e)}")
+    _writers.clear()
@@ -1,164 +1,550 @@
-from langchain_community.chat_models import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.schema import HumanMessage
 from backend.app.core.config import settings
-from langchain.output_parsers import PydanticOutputParser
+from backend.app.core.llm_cache import LLMResponseCache
+from backend.app.core.singleflight import SingleFlight
+from backend.app.core.metrics import span, record_fallback, record_llm_usage
+from backend.app.core.logging import log_payload, free_text_values
+from backend.app.core.json_extract import extract_json, JSONExtractionError
+from backend.app.core.redis import acquire_lock, release_lock, lock_held
+from backend.app.core.llm_router import Backend, LLMRouter, bad_request_error, response_usage, CANCELLED_ATTEMPT
+from backend.app.prompts.registry import CompiledPrompt, count_tokens
+from pydantic import BaseModel
+from contextvars import ContextVar
 import os
-import json
-import re
-import langchain, pydantic
+import asyncio
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional, Type
 import logging
 
 logger = logging.getLogger(__name__)
-logger.info(f"LangChain v{langchain.__version__}, Pydantic v{pydantic.__version__}")
 
 """
 IMPORTANT: JSON Formatting Requirements for Prompts
 
-When creating prompts that require JSON responses:
-1. Use double curly braces {{}} for JSON examples in the prompt string
-2. Keep JSON examples as single lines with no indentation
-3. Make it explicit that the response should be a single line of JSON
+Prompts are registered in prompts/registry.py and passed to the service as
+CompiledPrompt objects. Responses are requested as schema-constrained tool
+calls built from the target Pydantic model, so prompts only need to describe
+the task. Each prompt ends with a {format_instructions} placeholder; it is
+left empty for tool calls and filled with the prompt's *_FORMAT_INSTRUCTIONS
+when falling back to plain-text JSON (structured output disabled, rejected
+by the API, or invalid, and always for streaming).
+
+When writing format instructions / prompts that show JSON:
+1. Put JSON examples in the *_FORMAT_INSTRUCTIONS string, not the template,
+   since it is substituted as a value and needs no brace escaping
+2. Inside a template itself, use double curly braces {{}} for literal braces
+3. Make it explicit that the response should be a single JSON object
 4. Avoid complex template systems - use direct string formatting
+"""
 
-Example of correct JSON in prompt:
-{{"field": "value", "array": [{{"nested": "value"}}]}}
+class LLMResponseError(ValueError):
+    """Raised when the LLM output cannot be extracted or validated into the response model."""
 
-This ensures proper JSON parsing and avoids template formatting issues.
-"""
 
-class LLMService:
-    def __init__(self):
+# Token usage of the LLM calls made while handling the current request
+_request_usage: ContextVar[Optional[List[dict]]] = ContextVar("llm_request_usage", default=None)
+
+
+def request_usage() -> List[dict]:
+    """
+    Token usage records for the LLM calls made so far in the current request,
+    one dict per call: prompt name, prompt/completion tokens, whether the
+    response was shared (cache or coalesced call) and latency in ms.
+    """
+    return list(_request_usage.get() or [])
+
+
+def begin_request_usage() -> None:
+    """
+    Start an empty usage record for the current context. Background tasks
+    call this so their LLM calls are not attributed to the request that
+    spawned them (tasks inherit a copy of the spawning context).
+    """
+    _request_usage.set([])
+
+
+def build_backend(name: str) -> Backend:
+    """A router backend for a model name; "fake" is the local fake model."""
+    if name == "fake":
+        from backend.app.core.fake_llm import FakeChatModel
+        chat_model = FakeChatModel(latency=settings.LLM_FAKE_LATENCY)
+    else:
         # Get the API key from environment variables
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable is not set")
 
+        # Imported here: LangChain and openai take seconds to import
+        from langchain_community.chat_models import ChatOpenAI
+
         # Initialize the OpenAI chat model with explicit configuration
-        self.chat_model = ChatOpenAI(
-            model_name=settings.LLM_MODEL_NAME,
+        chat_model = ChatOpenAI(
+            model_name=name,
             openai_api_key=api_key,
+            openai_api_base=settings.OPENAI_API_BASE or None,
             max_tokens=settings.MAX_TOKENS,
             temperature=settings.TEMPERATURE,
-            request_timeout=30,  # Add timeout
-            max_retries=3,  # Add retries
+            request_timeout=settings.LLM_REQUEST_TIMEOUT,
+            max_retries=settings.LLM_MAX_RETRIES,
         )
-        
-        # Log the model configuration
-        logger.info(f"Initialized LLM service with model: {settings.LLM_MODEL_NAME}")
-        logger.info(f"Max tokens: {settings.MAX_TOKENS}")
-        logger.info(f"Temperature: {settings.TEMPERATURE}")
+    return Backend(
+        name,
+        chat_model,
+        timeout=settings.LLM_REQUEST_TIMEOUT,
+        ewma_alpha=settings.LLM_EWMA_ALPHA,
+        breaker_failures=settings.LLM_BREAKER_FAILURES,
+        breaker_cooldown=settings.LLM_BREAKER_COOLDOWN,
+    )
+
+
+def build_router() -> LLMRouter:
+    """The backend router described by settings.LLM_BACKENDS."""
+    import langchain_core, pydantic
+    logger.info(f"LangChain core v{langchain_core.__version__}, Pydantic v{pydantic.__version__}")
+    names = [name.strip() for name in settings.LLM_BACKENDS.split(",") if name.strip()]
+    return LLMRouter(
+        [build_backend(name) for name in names or [settings.LLM_MODEL_NAME]],
+        hedge=settings.LLM_HEDGE_ENABLED,
+        hedge_percentile=settings.LLM_HEDGE_PERCENTILE,
+        hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY,
+        hedge_default_delay=settings.LLM_HEDGE_DEFAULT_DELAY,
+        max_hedges=settings.LLM_MAX_HEDGES,
+    )
+
+
+class LLMService:
+    def __init__(self):
+        # Model backends with hedging, failover and circuit breakers; built
+        # on first use (see warm) so importing the app needs no API key
+        self._router: Optional[LLMRouter] = None
+
+        self._semaphore = None
+
+        # Two-tier (local LRU + Redis) cache of raw responses
+        self.cache = LLMResponseCache(
+            max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+            ttl=settings.LLM_CACHE_TTL,
+        )
+
+        # Coalesces concurrent identical prompts within this worker
+        self.singleflight = SingleFlight()
+
+        # Tool schemas per response model, and how often structured output fell back to text
+        self._tools: Dict[Type[BaseModel], dict] = {}
+        self.structured_fallbacks = 0
+
+        # Running token / latency totals per prompt name
+        self.usage_totals: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def router(self) -> LLMRouter:
+        if self._router is None:
+            self._router = build_router()
+
+            # Log the model configuration
+            logger.info(f"Initialized LLM service with backends: {self._router.name}")
+            logger.info(f"Max tokens: {settings.MAX_TOKENS}")
+            logger.info(f"Temperature: {settings.TEMPERATURE}")
+            logger.info(f"Max concurrent LLM calls: {settings.LLM_MAX_CONCURRENCY}")
+        return self._router
+
+    @router.setter
+    def router(self, router: LLMRouter) -> None:
+        self._router = router
+
+    def warm(self) -> None:
+        """
+        Build the LLM clients and load the tokenizer now, at startup, rather
+        than on the first request.
+        """
+        self.router
+        count_tokens("")
+
+    @property
+    def chat_model(self):
+        """The preferred backend's chat model (used directly by the sync path)."""
+        return self.router.primary.chat_model
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """
+        Per-worker limit on concurrent LLM calls. Created lazily so it binds
+        to the event loop the worker is actually running.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        return self._semaphore
 
     def generate_response(
         self,
-        prompt_template: str,
+        prompt: CompiledPrompt,
         input_variables: dict,
-        output_parser: PydanticOutputParser
+        response_model: Type[BaseModel]
     ):
         """
         Generate a response from the language model based on the provided prompt and variables,
-        and parse the output using the provided parser.
+        and validate it into response_model.
 
-        Note: When creating prompt templates that require JSON responses:
-        1. Use double curly braces {{}} for JSON examples
-        2. Keep JSON examples as single lines
-        3. Make it explicit that the response should be a single line of JSON
-        4. Use direct string formatting instead of complex template systems
+        This blocks the calling thread for the whole LLM round trip and always
+        uses plain-text JSON output; request handlers should use
+        agenerate_response instead.
         """
         try:
-            # Format the prompt template with input variables
-            formatted_prompt = prompt_template.format(**input_variables)
-            logger.info(f"Formatted prompt: {formatted_prompt}")
-            
-            # Create a single human message
-            message = HumanMessage(content=formatted_prompt)
-            
+            started = time.perf_counter()
+            with span("prompt_format"):
+                formatted_prompt = self._format_prompt(prompt, input_variables)
+                prompt_tokens = prompt.check_budget(formatted_prompt)
+            key = self._prompt_key(formatted_prompt, prompt.output_tokens)
+            cacheable = self._cacheable()
+            if cacheable:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    logger.info("LLM cache hit (local)")
+                    self._record_usage(prompt, prompt_tokens, cached, True, started)
+                    return self.parse_response(cached, response_model)
+
             # Pass the message to the LLM and get a response
-            response = self.chat_model([message])
-            
-            # Log the raw response for debugging
-            logger.info(f"Raw LLM response: {response.content}")
-            
-            # Clean up the response
-            content = response.content.strip()
-            logger.info(f"After strip: {content}")
-            
-            # Remove any markdown code block markers
-            if content.startswith('```json'):
-                content = content[7:]
-                logger.info("Removed ```json prefix")
-            elif content.startswith('```'):
-                content = content[3:]
-                logger.info("Removed ``` prefix")
-            if content.endswith('```'):
-                content = content[:-3]
-                logger.info("Removed ``` suffix")
-            
-            logger.info(f"After markdown cleanup: {content}")
-            
-            # Remove any explanatory text before or after the JSON
-            content = re.sub(r'^[^{]*', '', content)  # Remove everything before first {
-            content = re.sub(r'[^}]*$', '', content)  # Remove everything after last }
-            logger.info(f"After text cleanup: {content}")
-            
-            # Remove indentation and extra whitespace
-            content = re.sub(r'^\s+', '', content, flags=re.MULTILINE)  # Remove leading whitespace
-            content = re.sub(r'\s+', ' ', content)  # Replace multiple spaces with single space
-            content = content.strip()
-            logger.info(f"After whitespace cleanup: {content}")
-            
-            # Ensure it starts with { and ends with }
-            if not content.startswith('{'):
-                content = '{' + content
-                logger.info("Added missing {")
-            if not content.endswith('}'):
-                content = content + '}'
-                logger.info("Added missing }")
-            
-            # Log the cleaned content for debugging
-            logger.info(f"Final cleaned content: {content}")
-            
-            # Try to parse the response
-            try:
-                # First try to parse as JSON to validate the format
-                parsed_json = json.loads(content)
-                logger.info(f"Parsed JSON: {parsed_json}")
-                
-                # Then try to parse with the Pydantic parser
-                parsed_result = output_parser.parse(content)
-                logger.info(f"Successfully parsed result: {parsed_result}")
-                return parsed_result
-            except json.JSONDecodeError as json_error:
-                logger.error(f"JSON parsing error: {json_error}")
-                logger.error(f"Invalid JSON content: {content}")
-                # Try to fix common JSON formatting issues
+            with span("llm_call"):
+                response = self.chat_model(self._messages(formatted_prompt), max_tokens=prompt.output_tokens)
+
+            result = self.parse_response(response.content, response_model)
+            if cacheable:
+                self.cache.set(key, response.content)
+            self._record_usage(prompt, prompt_tokens, response.content, False, started, [response_usage(response)])
+            return result
+        except Exception as e:
+            self._log_error(e)
+            raise e
+
+    async def agenerate_response(
+        self,
+        prompt: CompiledPrompt,
+        input_variables: dict,
+        response_model: Type[BaseModel]
+    ):
+        """
+        Async counterpart of generate_response.
+
+        Uses the chat model's native async API so the event loop keeps serving
+        other requests while the LLM call is in flight. The number of
+        concurrent calls per worker is capped by settings.LLM_MAX_CONCURRENCY.
+
+        When settings.LLM_STRUCTURED_OUTPUT is on, the model is forced to call
+        a tool whose parameters are response_model's JSON schema, so no
+        format instructions are sent and the arguments validate directly. If
+        the API rejects that or the arguments do not validate, the request is
+        retried once as plain-text JSON with the prompt's format instructions.
+
+        Identical prompts are coalesced: concurrent callers in this worker
+        share one in-flight call, and across workers a Redis lock elects a
+        single leader while the others wait for its result in the cache.
+        """
+        try:
+            if settings.LLM_STRUCTURED_OUTPUT:
                 try:
-                    # Fix missing quotes around keys
-                    content = re.sub(r'([{,])\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*:', r'\1"\2":', content)
-                    logger.info(f"After fixing keys: {content}")
-                    # Fix missing quotes around string values
-                    content = re.sub(r':\s*([a-zA-Z][a-zA-Z0-9\s]*)([,}])', r': "\1"\2', content)
-                    logger.info(f"After fixing values: {content}")
-                    # Try parsing again
-                    parsed_json = json.loads(content)
-                    parsed_result = output_parser.parse(content)
-                    logger.info(f"Successfully parsed fixed result: {parsed_result}")
-                    return parsed_result
-                except Exception as fix_error:
-                    logger.error(f"Failed to fix JSON: {fix_error}")
-                    raise ValueError(f"Invalid JSON response from LLM: {str(json_error)}")
-            except Exception as parse_error:
-                logger.error(f"Error parsing response: {parse_error}")
-                logger.error(f"Raw response: {content}")
-                raise ValueError(f"Error parsing LLM response: {str(parse_error)}")
-                
+                    return await self._agenerate(prompt, input_variables, response_model, structured=True)
+                except (LLMResponseError, bad_request_error()) as structured_error:
+                    self.structured_fallbacks += 1
+                    record_fallback("structured_to_text")
+                    logger.warning(f"Structured output failed, falling back to JSON text: {structured_error}")
+            return await self._agenerate(prompt, input_variables, response_model, structured=False)
         except Exception as e:
-            # Log error and re-raise
-            logger.error(f"Error generating response: {e}")
-            logger.error(f"Error type: {type(e)}")
-            logger.error(f"Error args: {e.args}")
+            self._log_error(e)
             raise e
 
+    async def _agenerate(
+        self,
+        prompt: CompiledPrompt,
+        input_variables: dict,
+        response_model: Type[BaseModel],
+        structured: bool
+    ):
+        started = time.perf_counter()
+        with span("prompt_format"):
+            formatted_prompt = self._format_prompt(prompt, input_variables, structured)
+            prompt_tokens = prompt.check_budget(formatted_prompt)
+        key = self._prompt_key(formatted_prompt, prompt.output_tokens, response_model if structured else None)
+        cacheable = self._cacheable()
+        if cacheable:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                logger.info("LLM cache hit")
+                self._record_usage(prompt, prompt_tokens, cached, True, started)
+                return self.parse_response(cached, response_model)
+
+        # Every caller parses its own copy so results are never shared objects.
+        # Only the leader's closure runs, which tells us whether this request paid for the call.
+        paid = []
+        attempts = []
+
+        def fetch():
+            paid.append(True)
+            return self._fetch_raw(
+                key, formatted_prompt, prompt.output_tokens, response_model, cacheable, structured, attempts
+            )
+
+        with span("llm_call"):
+            raw_content = await self.singleflight.do(key, fetch)
+        self._record_usage(prompt, prompt_tokens, raw_content, not paid, started, attempts)
+        return self.parse_response(raw_content, response_model)
+
+    async def astream_response(
+        self,
+        prompt: CompiledPrompt,
+        input_variables: dict,
+        response_model: Type[BaseModel]
+    ) -> AsyncIterator[str]:
+        """
+        Stream the raw response text chunk by chunk as the model generates it.
+
+        Streaming always uses plain-text JSON output. The caller is
+        responsible for parsing the accumulated text once the stream ends. A
+        cached response is yielded as a single chunk, and a freshly streamed
+        one is cached if it validates into response_model.
+        """
+        started = time.perf_counter()
+        with span("prompt_format"):
+            formatted_prompt = self._format_prompt(prompt, input_variables)
+            prompt_tokens = prompt.check_budget(formatted_prompt)
+        key = self._prompt_key(formatted_prompt, prompt.output_tokens)
+        cacheable = self._cacheable()
+        if cacheable:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                logger.info("LLM cache hit")
+                self._record_usage(prompt, prompt_tokens, cached, True, started)
+                yield cached
+                return
+
+        chunks = []
+        # Includes the time the consumer takes per chunk, as the whole stream is the call
+        with span("llm_call"):
+            async with self.semaphore:
+                async for chunk in self.router.astream(
+                    self._messages(formatted_prompt), max_tokens=prompt.output_tokens
+                ):
+                    if chunk.content:
+                        chunks.append(chunk.content)
+                        yield chunk.content
+
+        raw_content = "".join(chunks)
+        self._record_usage(prompt, prompt_tokens, raw_content, False, started)
+        if cacheable:
+            try:
+                self.parse_response(raw_content, response_model)
+            except ValueError:
+                return
+            await self.cache.aset(key, raw_content)
+
+    async def _fetch_raw(
+        self,
+        key: str,
+        formatted_prompt: str,
+        max_tokens: int,
+        response_model: Type[BaseModel],
+        cacheable: bool,
+        structured: bool,
+        attempts: Optional[list] = None
+    ) -> str:
+        """
+        Produce the raw response text for a prompt, electing one leader across
+        workers when the result can be shared through the cache. The usage of
+        every completed LLM attempt is appended to attempts.
+        """
+        lock_key = f"llm:lock:{key}"
+        token = None
+        if cacheable:
+            token = str(uuid.uuid4())
+            if not await acquire_lock(lock_key, expire=settings.LLM_SINGLEFLIGHT_LOCK_TTL, token=token):
+                token = None
+                raw_content = await self._wait_for_leader(key, lock_key)
+                if raw_content is not None:
+                    return raw_content
+                logger.info("Leader finished without a cached result, calling LLM directly")
+
+        try:
+            # Pass the message to the LLM and await the response
+            messages = self._messages(formatted_prompt)
+            async with self.semaphore:
+                if structured:
+                    tool = self._tool(response_model)
+                    response = await self.router.ainvoke(
+                        messages, max_tokens,
+                        tools=[tool], tool_name=tool["function"]["name"], tool_key=response_model,
+                        usage=attempts,
+                    )
+                else:
+                    response = await self.router.ainvoke(messages, max_tokens, usage=attempts)
+            raw_content = self._tool_arguments(response) if structured else response.content
+
+            # Only cache responses that parse successfully
+            self.parse_response(raw_content, response_model)
+            if cacheable:
+                await self.cache.aset(key, raw_content)
+            return raw_content
+        finally:
+            if token is not None:
+                await release_lock(lock_key, token)
+
+    async def _wait_for_leader(self, key: str, lock_key: str):
+        """
+        Poll the shared cache while another worker holds the lock for this
+        prompt. Returns None if the lock goes away without a result.
+        """
+        logger.info("Another worker is generating this prompt, waiting for its result")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.LLM_SINGLEFLIGHT_LOCK_TTL
+        while loop.time() < deadline:
+            raw_content = await self.cache.get_remote(key)
+            if raw_content is not None:
+                self.cache.set_local(key, raw_content)
+                return raw_content
+            if not await lock_held(lock_key):
+                # One last look: the leader may have cached and released in between
+                raw_content = await self.cache.get_remote(key)
+                if raw_content is not None:
+                    self.cache.set_local(key, raw_content)
+                return raw_content
+            await asyncio.sleep(settings.LLM_SINGLEFLIGHT_POLL_INTERVAL)
+        return None
+
+    def _tool(self, response_model: Type[BaseModel]) -> dict:
+        """OpenAI tool definition whose parameters are response_model's schema."""
+        tool = self._tools.get(response_model)
+        if tool is None:
+            from langchain_core.utils.function_calling import convert_to_openai_tool
+            tool = convert_to_openai_tool(response_model)
+            self._tools[response_model] = tool
+        return tool
+
+    @staticmethod
+    def _messages(formatted_prompt: str) -> list:
+        """The prompt as a single human message."""
+        from langchain_core.messages import HumanMessage
+        return [HumanMessage(content=formatted_prompt)]
+
+    @staticmethod
+    def _tool_arguments(response) -> str:
+        """Raw JSON arguments of the forced tool call in a response."""
+        tool_calls = response.additional_kwargs.get("tool_calls") or []
+        if not tool_calls:
+            raise LLMResponseError("LLM response did not contain the requested tool call")
+        return tool_calls[0]["function"]["arguments"]
+
+    def _format_prompt(self, prompt: CompiledPrompt, input_variables: dict, structured: bool = False) -> str:
+        """Render the compiled prompt with input variables."""
+        formatted_prompt = prompt.render(input_variables, structured=structured)
+        log_payload(logger, "Formatted prompt", formatted_prompt, free_text_values(input_variables))
+        return formatted_prompt
+
+    def _cacheable(self) -> bool:
+        """
+        Whether responses may be cached. Non-zero temperatures are
+        non-deterministic, so they can be opted out with
+        LLM_CACHE_NONDETERMINISTIC=False.
+        """
+        if not settings.LLM_CACHE_ENABLED:
+            return False
+        return settings.TEMPERATURE <= 0 or settings.LLM_CACHE_NONDETERMINISTIC
+
+    def _prompt_key(self, formatted_prompt: str, max_tokens: int, tool_model: Type[BaseModel] = None) -> str:
+        """
+        Content hash of the model settings and prompt; used for caching and
+        coalescing. Tool-call responses are keyed separately from text ones.
+        """
+        if tool_model is not None:
+            formatted_prompt = f"[tool:{tool_model.__name__}]\n{formatted_prompt}"
+        return self.cache.make_key(
+            self.router.name,
+            settings.TEMPERATURE,
+            max_tokens,
+            formatted_prompt,
+        )
+
+    def _record_usage(
+        self,
+        prompt: CompiledPrompt,
+        prompt_tokens: int,
+        raw_content: str,
+        shared: bool,
+        started: float,
+        attempts: Optional[List[Optional[dict]]] = None
+    ) -> None:
+        """
+        Record token counts and latency for one call, both on the current
+        request and in the per-prompt running totals.
+
+        attempts holds the usage of every LLM attempt the call made (see
+        LLMRouter.ainvoke), hedges included, and their sum is what the call
+        cost. Provider-reported usage is used where there is one; otherwise
+        tokens are counted locally with the cached tokenizer, and a cancelled
+        attempt counts its prompt only. A call with no attempts (e.g.
+        answered by another worker) is counted locally too. Shared responses
+        (cache hits and coalesced calls) cost no tokens.
+        """
+        completion_tokens = count_tokens(raw_content)
+        if attempts and not shared:
+            local = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+            reported = [
+                {"prompt_tokens": prompt_tokens, "completion_tokens": 0} if attempt is CANCELLED_ATTEMPT
+                else attempt or local
+                for attempt in attempts
+            ]
+            prompt_tokens = sum(attempt["prompt_tokens"] for attempt in reported)
+            completion_tokens = sum(attempt["completion_tokens"] for attempt in reported)
+        usage = {
+            "prompt": prompt.name,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "attempts": len(attempts or ()),
+            "shared": shared,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        records = _request_usage.get()
+        if records is None:
+            records = []
+            _request_usage.set(records)
+        records.append(usage)
+
+        totals = self.usage_totals.setdefault(prompt.name, {
+            "calls": 0, "shared_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_ms": 0.0,
+        })
+        totals["calls"] += 1
+        totals["latency_ms"] += usage["latency_ms"]
+        if shared:
+            totals["shared_calls"] += 1
+        else:
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += usage["completion_tokens"]
+        record_llm_usage(prompt.name, prompt_tokens, usage["completion_tokens"], shared)
+        logger.info(f"LLM usage: {usage}")
+
+    def parse_response(self, raw_content: str, response_model: Type[BaseModel]):
+        """
+        Extract the JSON object from the raw LLM output and validate it into
+        response_model. See core/json_extract.py.
+        """
+        log_payload(logger, "Raw LLM response", raw_content)
+        try:
+            with span("json_extract"):
+                data = extract_json(raw_content)
+                if not isinstance(data, dict):
+                    raise JSONExtractionError("LLM response JSON is not an object")
+            with span("validate"):
+                return response_model.model_validate(data)
+        except JSONExtractionError as json_error:
+            logger.error(f"JSON parsing error: {json_error}")
+            raise LLMResponseError(str(json_error))
+        except ValueError as parse_error:
+            logger.error(f"Error parsing response: {parse_error}")
+            raise LLMResponseError(f"Error parsing LLM response: {str(parse_error)}")
+
+    def _log_error(self, e: Exception) -> None:
+        # Log error details before the caller re-raises
+        logger.error(f"Error generating response: {e}")
+        logger.error(f"Error type: {type(e)}")
+        logger.error(f"Error args: {e.args}")
+
 
 # Create an instance of LLMService to use across the app
 llm_service = LLMService()
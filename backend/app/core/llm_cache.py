@@ -0,0 +1,119 @@
+"""
+Content-addressed cache for raw LLM responses.
+
+Two tiers:
+1. A bounded in-process LRU, checked first and never leaving the worker.
+2. Redis (via core/redis.py), shared by every worker and surviving restarts.
+
+Keys are a SHA-256 of (model, temperature, max_tokens, formatted prompt), so
+two workers formatting the same prompt with the same model settings hit the
+same entry. Values are the raw response text; parsing happens on the way out
+so a cached entry works with whichever output parser the caller uses.
+"""
+from collections import OrderedDict
+from typing import Dict, Optional
+import hashlib
+import logging
+import time
+
+from .redis import get_cache, set_cache
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """
+    Bounded LRU in front of Redis for raw LLM responses.
+    """
+    def __init__(self, max_entries: int = 1024, ttl: int = 86400, namespace: str = "llm:response:"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.namespace = namespace
+        self._local: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+
+        # Hit / miss counters
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, temperature: float, max_tokens: int, prompt: str) -> str:
+        """Hash the model settings and the formatted prompt into a cache key."""
+        digest = hashlib.sha256()
+        digest.update(f"{model}\x00{temperature!r}\x00{max_tokens}\x00".encode("utf-8"))
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_local(self, key: str) -> Optional[str]:
+        """Look up the in-process tier only."""
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def set_local(self, key: str, value: str) -> None:
+        """Store in the in-process tier, evicting the least recently used entry."""
+        self._local[key] = (time.monotonic() + self.ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        """Synchronous lookup; only the local tier is consulted."""
+        value = self.get_local(key)
+        if value is not None:
+            self.local_hits += 1
+        else:
+            self.misses += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """Synchronous store; only the local tier is written."""
+        self.set_local(key, value)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Look up the local tier, then Redis. Redis hits are promoted locally."""
+        value = self.get_local(key)
+        if value is not None:
+            self.local_hits += 1
+            return value
+
+        value = await get_cache(self.namespace + key)
+        if isinstance(value, str):
+            self.redis_hits += 1
+            self.set_local(key, value)
+            return value
+
+        self.misses += 1
+        return None
+
+    async def get_remote(self, key: str) -> Optional[str]:
+        """Look up Redis without touching the hit/miss counters."""
+        value = await get_cache(self.namespace + key)
+        return value if isinstance(value, str) else None
+
+    async def aset(self, key: str, value: str) -> None:
+        """Store in both tiers."""
+        self.set_local(key, value)
+        await set_cache(self.namespace + key, value, expire=self.ttl)
+
+    def clear(self) -> None:
+        """Drop the local tier. Redis entries expire through their TTL."""
+        self._local.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit and miss counters for both tiers."""
+        hits = self.local_hits + self.redis_hits
+        lookups = hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "local_entries": len(self._local),
+        }
@@ -0,0 +1,134 @@
+"""
+Writing LLMLog rows.
+
+By default log_llm_interaction adds the row to the caller's session, so it
+commits in the same transaction as the Session row it belongs to. With
+LLM_LOG_DEFERRED the row is buffered instead and a background task writes
+buffered rows with one multi-row INSERT per batch, taking the log write off
+the request path. Deferred rows are held on the session and only handed to
+the buffer once it commits, so the Session row they reference exists first;
+a rollback discards them.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import time
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session as OrmSession
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+from .database import get_engine
+from ..models.database import LLMLog
+
+logger = logging.getLogger(__name__)
+
+
+class LLMLogBuffer:
+    """
+    Buffers LLMLog rows and flushes them with a single multi-row insert.
+    """
+    def __init__(self, batch_size: int = 100, flush_interval: float = 1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.rows_written = 0
+        self.inserts = 0
+        self.insert_errors = 0
+
+    def add(self, row: Dict[str, Any]) -> None:
+        """Queue a row; the background task inserts it."""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        self._queue.put_nowait(row)
+
+    async def _run(self) -> None:
+        """Insert queued rows in batches until a None sentinel arrives."""
+        queue = self._queue
+        stopping = False
+        while not stopping:
+            row = await queue.get()
+            if row is None:
+                break
+            batch = [row]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    row = queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._insert(batch)
+
+    async def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        try:
+            async with get_engine().begin() as conn:
+                await conn.execute(insert(LLMLog).values(rows))
+            self.rows_written += len(rows)
+            self.inserts += 1
+        except Exception as e:
+            self.insert_errors += 1
+            logger.error(f"Error inserting {len(rows)} LLM log rows: {str(e)}")
+
+    async def close(self) -> None:
+        """Insert everything buffered so far and stop the background task."""
+        if self._task is not None and not self._task.done():
+            self._queue.put_nowait(None)
+            await self._task
+        self._task = None
+        self._queue = None
+
+    def stats(self) -> Dict[str, int]:
+        """Insert counters and current buffer depth."""
+        return {
+            "buffered": self._queue.qsize() if self._queue is not None else 0,
+            "rows_written": self.rows_written,
+            "inserts": self.inserts,
+            "insert_errors": self.insert_errors,
+        }
+
+
+llm_log_buffer = LLMLogBuffer(
+    batch_size=settings.LLM_LOG_BATCH_SIZE,
+    flush_interval=settings.LLM_LOG_FLUSH_INTERVAL,
+)
+
+
+_DEFERRED_KEY = "deferred_llm_logs"
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _buffer_deferred_rows(session):
+    for row in session.info.pop(_DEFERRED_KEY, ()):
+        llm_log_buffer.add(row)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_deferred_rows(session):
+    session.info.pop(_DEFERRED_KEY, None)
+
+
+def log_llm_interaction(db: AsyncSession, session_id: str, step: str, payload: Dict[str, Any]) -> None:
+    """
+    Record an LLM interaction. The caller commits db as usual; in deferred
+    mode the row is buffered on commit instead of joining that transaction.
+    """
+    if settings.LLM_LOG_DEFERRED:
+        db.info.setdefault(_DEFERRED_KEY, []).append({
+            "session_id": session_id,
+            "step": step,
+            "payload": payload,
+            "created_at": datetime.now(timezone.utc),
+        })
+    else:
+        db.add(LLMLog(session_id=session_id, step=step, payload=payload))
@@ -0,0 +1,396 @@
+"""
+Routing LLM calls across several model backends.
+
+A router holds an ordered list of backends (e.g. GPT-4 first, a faster model
+second) and, for every call:
+
+1. Sends it to the first backend whose circuit breaker is not open.
+2. Hedges: if no response has arrived by that backend's hedge deadline (the
+   p95 of its recent latencies, clamped; a fixed default until it has enough
+   samples), sends a duplicate to the next backend (or the same one if it is
+   the only one). The first successful response wins and the rest are
+   cancelled.
+3. Fails over: when an attempt errors or times out, the next backend is
+   tried right away. Backends after the first are ordered by EWMA latency
+   weighted by EWMA error rate, so failover and hedges go to the healthiest.
+
+Each backend tracks EWMA latency and error rate. After breaker_failures
+consecutive failures its breaker opens and it gets no traffic for
+breaker_cooldown seconds; then one trial call is let through (half-open)
+and a success closes it again.
+
+Requests the API rejects as invalid (openai.BadRequestError) are not the
+backend's fault: they are raised straight away without failover or a
+breaker failure.
+"""
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple, Type
+import asyncio
+import logging
+import time
+
+from pydantic import BaseModel
+
+from .metrics import record_fallback, record_llm_call
+
+logger = logging.getLogger(__name__)
+
+
+def bad_request_error() -> Type[Exception]:
+    """openai.BadRequestError; openai is slow to import, so only on first use."""
+    import openai
+    return openai.BadRequestError
+
+
+def response_usage(response: Any) -> Optional[Dict[str, int]]:
+    """
+    The provider-reported token usage of a chat model response, as
+    {"prompt_tokens", "completion_tokens"}, or None if it reports none.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return {"prompt_tokens": usage.get("input_tokens", 0), "completion_tokens": usage.get("output_tokens", 0)}
+    token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage")
+    if token_usage:
+        return {
+            "prompt_tokens": token_usage.get("prompt_tokens", 0),
+            "completion_tokens": token_usage.get("completion_tokens", 0),
+        }
+    return None
+
+
+# Usage of an attempt cancelled in flight: its prompt was sent (and billed),
+# but the provider never reports what it cost
+CANCELLED_ATTEMPT = {"cancelled": True}
+
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class NoBackendAvailable(RuntimeError):
+    """Raised when every backend's circuit breaker is open."""
+
+
+class Backend:
+    """
+    One chat model plus its latency, error and circuit-breaker state.
+    """
+    def __init__(
+        self,
+        name: str,
+        chat_model: Any,
+        timeout: float = 30,
+        ewma_alpha: float = 0.2,
+        breaker_failures: int = 5,
+        breaker_cooldown: float = 30,
+        latency_samples: int = 200,
+    ):
+        self.name = name
+        self.chat_model = chat_model
+        self.timeout = timeout
+        self.ewma_alpha = ewma_alpha
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self._structured_models: Dict[Type[BaseModel], Any] = {}
+
+        self.ewma_latency: Optional[float] = None
+        self.ewma_error_rate = 0.0
+        self._latencies: Deque[float] = deque(maxlen=latency_samples)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+        # Counters
+        self.calls = 0
+        self.errors = 0
+        self.breaker_opens = 0
+
+    def model(self, tools: Optional[List[dict]] = None, tool_name: Optional[str] = None, key: Any = None):
+        """The chat model, or a copy bound to a forced tool call (cached per key)."""
+        if tools is None:
+            return self.chat_model
+        bound = self._structured_models.get(key)
+        if bound is None:
+            bound = self.chat_model.bind(
+                tools=tools,
+                tool_choice={"type": "function", "function": {"name": tool_name}},
+            )
+            self._structured_models[key] = bound
+        return bound
+
+    def available(self) -> bool:
+        """Whether the breaker lets a call through right now."""
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.breaker_cooldown:
+            self.state = HALF_OPEN
+            self._trial_in_flight = False
+        if self.state == HALF_OPEN:
+            return not self._trial_in_flight
+        return self.state == CLOSED
+
+    def begin(self) -> None:
+        self.calls += 1
+        if self.state == HALF_OPEN:
+            self._trial_in_flight = True
+
+    def record_success(self, latency: float) -> None:
+        self._latencies.append(latency)
+        self.ewma_latency = latency if self.ewma_latency is None else (
+            self.ewma_alpha * latency + (1 - self.ewma_alpha) * self.ewma_latency
+        )
+        self.ewma_error_rate *= 1 - self.ewma_alpha
+        self.consecutive_failures = 0
+        if self.state != CLOSED:
+            logger.info(f"LLM backend {self.name}: circuit closed")
+        self.state = CLOSED
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.errors += 1
+        self.ewma_error_rate = self.ewma_alpha + (1 - self.ewma_alpha) * self.ewma_error_rate
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.breaker_failures:
+            if self.state != OPEN:
+                self.breaker_opens += 1
+                logger.warning(f"LLM backend {self.name}: circuit opened after {self.consecutive_failures} failures")
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """An attempt was cancelled (lost a hedge race) before it finished."""
+        self._trial_in_flight = False
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    def score(self) -> float:
+        """Lower is better: expected latency inflated by the error rate."""
+        latency = self.ewma_latency if self.ewma_latency is not None else self.timeout / 2
+        return latency * (1 + 4 * self.ewma_error_rate)
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.latency_percentile(0.95)
+        return {
+            "state": self.state,
+            "calls": self.calls,
+            "errors": self.errors,
+            "breaker_opens": self.breaker_opens,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            "ewma_error_rate": round(self.ewma_error_rate, 4),
+            "p95_latency_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class LLMRouter:
+    """
+    Hedged, latency-aware failover across an ordered list of backends.
+    """
+    def __init__(
+        self,
+        backends: List[Backend],
+        hedge: bool = True,
+        hedge_percentile: float = 0.95,
+        hedge_min_delay: float = 2.0,
+        hedge_default_delay: float = 10.0,
+        hedge_min_samples: int = 20,
+        max_hedges: int = 1,
+    ):
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend")
+        self.backends = backends
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.max_hedges = max_hedges
+
+        # Counters
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    @property
+    def name(self) -> str:
+        """Identifies the backend set, e.g. for cache keys."""
+        return ",".join(backend.name for backend in self.backends)
+
+    @property
+    def primary(self) -> Backend:
+        return self.backends[0]
+
+    def _candidates(self) -> List[Backend]:
+        """Available backends: the first by preference, the rest by health."""
+        available = [backend for backend in self.backends if backend.available()]
+        if not available:
+            raise NoBackendAvailable("All LLM backends have open circuit breakers")
+        return available[:1] + sorted(available[1:], key=lambda backend: backend.score())
+
+    def _hedge_delay(self, backend: Backend) -> float:
+        if len(backend._latencies) < self.hedge_min_samples:
+            return self.hedge_default_delay
+        p = backend.latency_percentile(self.hedge_percentile)
+        return min(max(p, self.hedge_min_delay), backend.timeout)
+
+    async def _attempt(
+        self, backend: Backend, model: Any, messages: list, max_tokens: int, usage: Optional[list] = None
+    ):
+        backend.begin()
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(model.ainvoke(messages, max_tokens=max_tokens), backend.timeout)
+        except asyncio.CancelledError:
+            backend.release()
+            record_llm_call(backend.name, "cancelled", time.perf_counter() - started)
+            raise
+        except bad_request_error():
+            backend.release()
+            record_llm_call(backend.name, "bad_request", time.perf_counter() - started)
+            raise
+        except asyncio.TimeoutError:
+            backend.record_failure()
+            record_llm_call(backend.name, "timeout", time.perf_counter() - started)
+            raise
+        except Exception:
+            backend.record_failure()
+            record_llm_call(backend.name, "error", time.perf_counter() - started)
+            raise
+        elapsed = time.perf_counter() - started
+        backend.record_success(elapsed)
+        record_llm_call(backend.name, "ok", elapsed)
+        if usage is not None:
+            usage.append(response_usage(response))
+        return response
+
+    async def ainvoke(
+        self,
+        messages: list,
+        max_tokens: int,
+        tools: Optional[List[dict]] = None,
+        tool_name: Optional[str] = None,
+        tool_key: Any = None,
+        usage: Optional[list] = None,
+    ):
+        """
+        Invoke the messages on the best available backend, hedging and
+        failing over as described in the module docstring.
+
+        If usage is a list, the response_usage of every attempt that
+        completes is appended to it, and CANCELLED_ATTEMPT for every attempt
+        cancelled after losing a hedge race: each one is paid for, not only
+        the response returned.
+        """
+        candidates = self._candidates()
+        primary = candidates[0]
+        # With a single backend, the hedge or failover goes to it again
+        queue = list(candidates[1:]) or [primary]
+        # task -> (backend, whether the attempt is a hedge)
+        pending: Dict[asyncio.Task, Tuple[Backend, bool]] = {}
+
+        def launch(backend: Backend, hedge: bool = False) -> None:
+            model = backend.model(tools, tool_name, tool_key)
+            task = asyncio.ensure_future(self._attempt(backend, model, messages, max_tokens, usage))
+            pending[task] = (backend, hedge)
+
+        launch(primary)
+        hedges = 0
+        deadline = time.monotonic() + self._hedge_delay(primary)
+        last_error: Optional[BaseException] = None
+        try:
+            while pending:
+                timeout = None
+                if self.hedge and hedges < self.max_hedges:
+                    timeout = max(0.0, deadline - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Hedge deadline passed with no answer: duplicate the request
+                    target = queue.pop(0) if queue else primary
+                    if not target.available():
+                        hedges = self.max_hedges
+                        continue
+                    hedges += 1
+                    self.hedges_sent += 1
+                    record_fallback("hedge")
+                    logger.info(f"Hedging LLM call to {target.name}")
+                    launch(target, hedge=True)
+                    # The next hedge waits out this attempt's own delay
+                    deadline = time.monotonic() + self._hedge_delay(target)
+                    continue
+
+                for task in done:
+                    backend, hedged = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if hedged:
+                            self.hedge_wins += 1
+                        return task.result()
+                    if isinstance(error, bad_request_error()):
+                        raise error
+                    last_error = error
+                    logger.warning(f"LLM backend {backend.name} failed: {error!r}")
+
+                # Fail over right away if nothing else is still running
+                while not pending and queue:
+                    backend = queue.pop(0)
+                    if backend.available():
+                        self.failovers += 1
+                        record_fallback("failover")
+                        logger.info(f"Failing over LLM call to {backend.name}")
+                        launch(backend)
+                        deadline = time.monotonic() + self._hedge_delay(backend)
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+                if usage is not None:
+                    usage.append(CANCELLED_ATTEMPT)
+
+    async def astream(self, messages: list, max_tokens: int) -> AsyncIterator[Any]:
+        """
+        Stream from the best available backend. Fails over to the next one
+        only if the stream breaks before its first chunk; no hedging.
+        """
+        last_error: Optional[BaseException] = None
+        for backend in self._candidates():
+            backend.begin()
+            started = time.perf_counter()
+            streamed = False
+            try:
+                async for chunk in backend.chat_model.astream(messages, max_tokens=max_tokens):
+                    streamed = True
+                    yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                backend.release()
+                record_llm_call(backend.name, "cancelled", time.perf_counter() - started)
+                raise
+            except Exception as e:
+                backend.record_failure()
+                record_llm_call(backend.name, "error", time.perf_counter() - started)
+                if streamed:
+                    raise
+                last_error = e
+                self.failovers += 1
+                record_fallback("failover")
+                logger.warning(f"LLM backend {backend.name} stream failed: {e!r}")
+                continue
+            elapsed = time.perf_counter() - started
+            backend.record_success(elapsed)
+            record_llm_call(backend.name, "ok", elapsed)
+            return
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hedges_sent": self.hedges_sent,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "backends": {backend.name: backend.stats() for backend in self.backends},
+        }
@@ -1,41 +1,125 @@
-import sys
+"""
+Logging: one JSON pipeline for structlog and stdlib loggers, written off the request path.
+
+- Every record, from structlog.get_logger() or logging.getLogger(), goes
+  through the root logger's single handler. That handler only puts the
+  record on a queue; a listener thread renders it to JSON (structlog's
+  ProcessorFormatter) and writes it to stdout, so request handlers never
+  block on log I/O.
+- Payloads (prompts, raw LLM responses, intake and feedback data) are
+  logged with log_payload: at DEBUG when LOG_LEVEL is DEBUG, otherwise only
+  for a sampled share of requests (LOG_PAYLOAD_SAMPLE_RATE, default none).
+- Free-text patient fields (LOG_REDACT_FIELDS) are redacted from logged
+  payloads, including where their values appear inside a rendered prompt.
+"""
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Optional
+
 import structlog
-from pythonjsonlogger import jsonlogger
-from typing import Any, Dict
+
+from .config import settings
+
+REDACTED_FIELDS = frozenset(name.strip() for name in settings.LOG_REDACT_FIELDS.split(",") if name.strip())
+
+# Whether the current request's payloads are logged; decided on its first payload
+_payload_sampled: ContextVar[Optional[bool]] = ContextVar("log_payload_sampled", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records unformatted; the listener thread formats them. Only
+    exception info is rendered here, while its frames are still alive.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _add_exc_text(logger, method_name, event_dict):
+    """Carry a stdlib record's pre-rendered traceback into the JSON output."""
+    record = event_dict.get("_record")
+    if record is not None and record.exc_text and "exception" not in event_dict:
+        event_dict["exception"] = record.exc_text
+    return event_dict
+
+
+def _start_listener(handler: _QueueHandler, stream_handler: logging.Handler) -> None:
+    global _listener
+    handler.queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(handler.queue, stream_handler)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Write out everything still queued and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
 def setup_logging():
     """Configure structured logging for the application."""
-    # Configure structlog
+    level = logging.getLevelName(settings.LOG_LEVEL.upper())
+    shared_processors = [
+        structlog.contextvars.merge_contextvars,
+        structlog.stdlib.add_log_level,
+        structlog.stdlib.add_logger_name,
+        structlog.processors.TimeStamper(fmt="iso"),
+    ]
+
+    # structlog loggers hand their event dicts to stdlib logging
     structlog.configure(
         processors=[
-            structlog.contextvars.merge_contextvars,
-            structlog.processors.add_log_level,
-            structlog.processors.TimeStamper(fmt="iso"),
+            structlog.stdlib.filter_by_level,
+            *shared_processors,
             structlog.processors.StackInfoRenderer(),
             structlog.processors.format_exc_info,
-            structlog.processors.JSONRenderer()
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
         ],
-        wrapper_class=structlog.make_filtering_bound_logger(logging.INFO),
+        wrapper_class=structlog.stdlib.BoundLogger,
         context_class=dict,
-        logger_factory=structlog.PrintLoggerFactory(),
+        logger_factory=structlog.stdlib.LoggerFactory(),
         cache_logger_on_first_use=True,
     )
 
-    # Configure root logger to use JSON formatter
+    # One JSON renderer for both structlog and plain stdlib records
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(structlog.stdlib.ProcessorFormatter(
+        foreign_pre_chain=[*shared_processors, _add_exc_text],
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            structlog.processors.JSONRenderer(),
+        ],
+    ))
+
+    # LOG_LEVEL applies to the app's own loggers; libraries (SQLAlchemy,
+    # aiosqlite, httpx) would log full statements and bodies at DEBUG
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
+    root_logger.setLevel(max(level, logging.INFO))
+    logging.getLogger(__name__.rsplit(".core.", 1)[0]).setLevel(level)
 
     # Remove existing handlers
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
 
-    # Add JSON handler for stdout
-    json_handler = logging.StreamHandler(sys.stdout)
-    json_handler.setFormatter(jsonlogger.JsonFormatter(
-        '%(timestamp)s %(level)s %(name)s %(message)s'
-    ))
-    root_logger.addHandler(json_handler)
+    queue_handler = _QueueHandler(queue.SimpleQueue())
+    root_logger.addHandler(queue_handler)
+    _start_listener(queue_handler, stream_handler)
+    atexit.register(stop_logging)
+    # A forked worker does not inherit the listener thread; give it its own
+    os.register_at_fork(after_in_child=lambda: _start_listener(queue_handler, stream_handler))
 
     # Create logger instance
     logger = structlog.get_logger()
@@ -56,4 +140,56 @@ def log_error(event: str, error: Exception, **kwargs: Any) -> None:
         "error_message": str(error),
         **kwargs
     }
-    logger.error(event, **error_data) 
\ No newline at end of file
+    logger.error(event, **error_data)
+
+
+def payload_log_level(log: logging.Logger) -> Optional[int]:
+    """
+    The level to log payloads at in the current request: DEBUG when the
+    logger is at DEBUG, INFO if the request is sampled, otherwise None.
+    """
+    if log.isEnabledFor(logging.DEBUG):
+        return logging.DEBUG
+    sampled = _payload_sampled.get()
+    if sampled is None:
+        sampled = random.random() < settings.LOG_PAYLOAD_SAMPLE_RATE
+        _payload_sampled.set(sampled)
+    return logging.INFO if sampled and log.isEnabledFor(logging.INFO) else None
+
+
+def redact(value: Any, free_text: Iterable[str] = ()) -> Any:
+    """
+    A copy of value with REDACTED_FIELDS replaced in (nested) dicts, and
+    each of the free_text strings replaced inside plain strings.
+    """
+    if isinstance(value, dict):
+        return {
+            key: _redacted(item) if key in REDACTED_FIELDS and item else redact(item, free_text)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item, free_text) for item in value]
+    if isinstance(value, str):
+        for text in free_text:
+            if text:
+                value = value.replace(text, _redacted(text))
+    return value
+
+
+def free_text_values(data: Dict[str, Any]) -> list:
+    """The values of REDACTED_FIELDS in data, e.g. to redact them from a prompt built from it."""
+    return [data[name] for name in REDACTED_FIELDS if isinstance(data.get(name), str) and data[name]]
+
+
+def _redacted(value: Any) -> str:
+    return f"[REDACTED {len(str(value))} chars]"
+
+
+def log_payload(log: logging.Logger, message: str, payload: Any, free_text: Iterable[str] = ()) -> None:
+    """
+    Log a payload, redacted, if this request's payloads are logged at all
+    (see payload_log_level). Nothing is rendered or copied otherwise.
+    """
+    level = payload_log_level(log)
+    if level is not None:
+        log.log(level, "%s: %s", message, redact(payload, free_text))
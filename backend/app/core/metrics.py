@@ -0,0 +1,231 @@
+"""
+Prometheus metrics: request latency, per-phase spans, LLM calls, tokens and caches.
+
+- MetricsMiddleware times every HTTP request (until its body is fully sent,
+  so streaming responses count their whole stream) by endpoint route,
+  method and status.
+- span(phase) times one phase of handling a request (prompt formatting,
+  the LLM call, JSON parsing, validation, DB commit, Redis, JSONL write)
+  into a histogram labelled with the endpoint it ran under.
+- LLM calls are timed per backend (model) and outcome, including
+  fallbacks; tokens are counted per prompt.
+- Cache hit ratios and the other counters the services already keep are
+  read from their stats() at scrape time by StatsCollector, so nothing is
+  counted twice.
+
+Everything is exposed at GET /metrics in the Prometheus text format. With
+several workers, set PROMETHEUS_MULTIPROC_DIR so every worker's samples are
+aggregated (see prometheus_client's multiprocess mode).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from starlette.routing import Match
+
+# Seconds; LLM calls run from under a second to the request timeout
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests", ["endpoint", "method", "status"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency, until the body is sent",
+    ["endpoint", "method", "status"], buckets=LATENCY_BUCKETS,
+)
+PHASE_SECONDS = Histogram(
+    "request_phase_duration_seconds", "Time spent in one phase of handling a request",
+    ["endpoint", "phase", "outcome"], buckets=LATENCY_BUCKETS,
+)
+LLM_CALL_SECONDS = Histogram(
+    "llm_call_duration_seconds", "Latency of one LLM backend attempt",
+    ["model", "outcome"], buckets=LATENCY_BUCKETS,
+)
+LLM_FALLBACKS = Counter(
+    "llm_fallbacks_total", "Degraded LLM paths taken", ["endpoint", "kind"],
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "LLM tokens paid for (cache hits and coalesced calls excluded)", ["prompt", "kind"],
+)
+LLM_RESPONSES = Counter(
+    "llm_responses_total", "LLM responses by whether they were shared (cache hit or coalesced)", ["prompt", "shared"],
+)
+
+# The current request's ASGI scope and resolved endpoint label
+_request: ContextVar[Optional[Dict[str, Any]]] = ContextVar("metrics_request", default=None)
+
+
+def _route_label(scope: Dict[str, Any]) -> str:
+    """The matched route's path template; bounded cardinality, unlike raw paths."""
+    app = scope.get("app")
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+def current_endpoint() -> str:
+    """Endpoint label for work done in the current request; "background" outside one."""
+    request = _request.get()
+    if request is None:
+        return "background"
+    if request.get("endpoint") is None:
+        request["endpoint"] = _route_label(request["scope"])
+    return request["endpoint"]
+
+
+def request_elapsed() -> Optional[float]:
+    """Seconds since the current request arrived, or None outside a request."""
+    request = _request.get()
+    return None if request is None else time.perf_counter() - request["started"]
+
+
+@contextmanager
+def span(phase: str) -> Iterator[None]:
+    """Time a phase of the current request; outcome is "error" if it raises."""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        PHASE_SECONDS.labels(current_endpoint(), phase, outcome).observe(time.perf_counter() - started)
+
+
+def observe_phase(phase: str, seconds: float, outcome: str = "ok") -> None:
+    """Record a phase timed elsewhere."""
+    PHASE_SECONDS.labels(current_endpoint(), phase, outcome).observe(seconds)
+
+
+def record_request_parse() -> None:
+    """
+    Call first thing in a handler: records the time since the request
+    arrived (body read, JSON decoding, model validation, dependencies).
+    """
+    elapsed = request_elapsed()
+    if elapsed is not None:
+        observe_phase("request_parse", elapsed)
+
+
+def record_fallback(kind: str) -> None:
+    LLM_FALLBACKS.labels(current_endpoint(), kind).inc()
+
+
+def record_llm_call(model: str, outcome: str, seconds: float) -> None:
+    LLM_CALL_SECONDS.labels(model, outcome).observe(seconds)
+
+
+def record_llm_usage(prompt: str, prompt_tokens: int, completion_tokens: int, shared: bool) -> None:
+    LLM_RESPONSES.labels(prompt, str(shared).lower()).inc()
+    if not shared:
+        LLM_TOKENS.labels(prompt, "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(prompt, "completion").inc(completion_tokens)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request by route template, method and status.
+    """
+    def __init__(self, app, skip_paths=("/metrics",)):
+        self.app = app
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        request = {"scope": scope, "started": time.perf_counter(), "endpoint": None}
+        token = _request.set(request)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - request["started"]
+            labels = (current_endpoint(), scope["method"], str(status))
+            HTTP_REQUESTS.labels(*labels).inc()
+            HTTP_REQUEST_SECONDS.labels(*labels).observe(elapsed)
+            _request.reset(token)
+
+
+class StatsCollector:
+    """
+    Exposes the services' own stats() counters and ratios at scrape time.
+
+    Each source is a (prefix, callable returning a stats dict) pair; numeric
+    values become gauges named <prefix>_<key>, and nested dicts become
+    gauges labelled by the inner key. These are per worker, also in
+    multiprocess mode.
+    """
+    def __init__(self):
+        self.sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def register(self, prefix: str, stats: Callable[[], Dict[str, Any]]) -> None:
+        self.sources[prefix] = stats
+
+    def collect(self):
+        for prefix, stats in self.sources.items():
+            try:
+                values = stats()
+            except Exception:
+                continue
+            yield from self._families(prefix, values)
+
+    def _families(self, prefix: str, values: Dict[str, Any]):
+        for key, value in values.items():
+            name = f"{prefix}_{key}"
+            if _is_number(value):
+                family = GaugeMetricFamily(name, f"{prefix} {key}")
+                family.add_metric([], value)
+                yield family
+            elif isinstance(value, dict):
+                numeric = {k: v for k, v in value.items() if _is_number(v)}
+                if numeric:
+                    family = GaugeMetricFamily(name, f"{prefix} {key}", labels=["key"])
+                    for inner_key, inner_value in numeric.items():
+                        family.add_metric([str(inner_key)], inner_value)
+                    yield family
+                # e.g. per-backend stats, {backend: {stat: value}}: one gauge per stat
+                nested = {k: v for k, v in value.items() if isinstance(v, dict)}
+                stats = sorted({stat for v in nested.values() for stat, x in v.items() if _is_number(x)})
+                for stat in stats:
+                    family = GaugeMetricFamily(f"{name}_{stat}", f"{prefix} {key} {stat}", labels=["key"])
+                    for inner_key, inner_values in nested.items():
+                        if _is_number(inner_values.get(stat)):
+                            family.add_metric([str(inner_key)], inner_values[stat])
+                    yield family
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def render_latest():
+    """(body, content type) for the /metrics endpoint."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(stats_collector)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,93 @@
+"""
+Incremental parser for a JSON object arriving in chunks (e.g. streamed LLM tokens).
+
+Feed it text as it arrives; it reports each top-level field as soon as that
+field's value is complete, without waiting for the closing brace. Leading
+prose or a ```json fence before the first "{" is skipped.
+
+Example:
+    parser = PartialJSONObjectParser()
+    parser.feed('{"serious_vs_treatable": {"diagnosis": "trea')   # -> []
+    parser.feed('table", "probability": 0.9}, "main')            # -> [("serious_vs_treatable", {...})]
+"""
+from typing import Any, List, Optional, Tuple
+import json
+
+
+class PartialJSONObjectParser:
+    """
+    Single-pass scanner that emits completed top-level (key, value) pairs.
+    """
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key_start: Optional[int] = None
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self.done = False
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return self._text
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume a chunk and return the top-level fields it completed."""
+        self._text += chunk
+        text = self._text
+        completed: List[Tuple[str, Any]] = []
+
+        i = self._pos
+        end = len(text)
+        while i < end and not self.done:
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._key = json.loads(text[self._key_start:i + 1])
+                        self._key_start = None
+            elif not self._started:
+                if c == "{":
+                    self._started = True
+                    self._depth = 1
+            elif c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None:
+                    self._key_start = i
+            elif c == ":":
+                if self._depth == 1 and self._key is not None and self._value_start is None:
+                    self._value_start = i + 1
+            elif c == "{" or c == "[":
+                self._depth += 1
+            elif c == "}" or c == "]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(i, completed)
+                    self.done = True
+            elif c == "," and self._depth == 1:
+                self._emit(i, completed)
+            i += 1
+
+        self._pos = i
+        return completed
+
+    def _emit(self, end: int, completed: List[Tuple[str, Any]]) -> None:
+        """Decode the value that ends at text[end] and reset for the next key."""
+        if self._key is not None and self._value_start is not None:
+            raw = self._text[self._value_start:end].strip()
+            try:
+                completed.append((self._key, json.loads(raw)))
+            except ValueError:
+                # Malformed value; the final full parse will repair or reject it
+                pass
+        self._key = None
+        self._value_start = None
@@ -0,0 +1,205 @@
+"""
+Speculative prefetch of LLM work the client is likely to ask for next.
+
+After intake analysis, the client almost always requests a treatment plan.
+Instead of waiting for that second round trip, the plan can be generated in
+a background task as soon as the analysis is persisted, stored under the
+session_id, and handed to the later request: immediately if it is done, by
+awaiting the task if it is still running.
+
+Extra spend is bounded two ways:
+- max_inflight caps concurrent speculative calls per process
+- token_budget caps speculative tokens per budget_window seconds; each
+  running call reserves its worst case (max_tokens_per_call) until it
+  finishes. Then its reported usage is charged, whether it succeeded,
+  failed or was cancelled, plus max_tokens_per_call if it did not succeed,
+  since an unfinished call's usage is unknown.
+
+A task keeps counting against both limits while it runs, also after a
+request has claimed it and is waiting for it.
+
+Unclaimed results are dropped after ttl seconds. Any entry can be cancelled,
+and close() cancels everything on shutdown.
+
+Across workers, a request that lands on a worker without the prefetch still
+benefits: the speculative call goes through LLMService's response cache and
+single-flight, so an identical prompt joins it or reads its cached response.
+"""
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+import time
+
+from .llm import begin_request_usage, request_usage
+
+logger = logging.getLogger(__name__)
+
+
+class SpeculativePrefetcher:
+    """
+    Keyed background tasks for speculative work, with a concurrency and token budget.
+    """
+    def __init__(
+        self,
+        name: str,
+        max_inflight: int = 8,
+        token_budget: int = 200000,
+        budget_window: float = 3600,
+        max_tokens_per_call: int = 4000,
+        ttl: float = 900,
+    ):
+        self.name = name
+        self.max_inflight = max_inflight
+        self.token_budget = token_budget
+        self.budget_window = budget_window
+        self.max_tokens_per_call = max_tokens_per_call
+        self.ttl = ttl
+        # key -> (created_at, task); the task returns (value, usage records)
+        self._entries: Dict[str, Tuple[float, asyncio.Task]] = {}
+        # Tasks still running, claimed or not
+        self._running: Set[asyncio.Task] = set()
+        self._spent: Deque[Tuple[float, int]] = deque()
+
+        # Counters
+        self.scheduled = 0
+        self.claimed = 0
+        self.expired = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.skipped_inflight = 0
+        self.skipped_budget = 0
+
+    def _inflight(self) -> int:
+        return len(self._running)
+
+    def tokens_spent(self) -> int:
+        """Speculative tokens spent within the current budget window."""
+        cutoff = time.monotonic() - self.budget_window
+        while self._spent and self._spent[0][0] < cutoff:
+            self._spent.popleft()
+        return sum(tokens for _, tokens in self._spent)
+
+    def _sweep(self) -> None:
+        """Drop results nobody claimed within the TTL."""
+        cutoff = time.monotonic() - self.ttl
+        for key, (created_at, task) in list(self._entries.items()):
+            if created_at < cutoff:
+                del self._entries[key]
+                self.expired += 1
+                if not task.done():
+                    task.cancel()
+
+    def schedule(self, key: str, fn: Callable[[], Awaitable[Any]]) -> bool:
+        """
+        Start fn() in the background for key, unless one is already scheduled
+        or the in-flight or token budget would be exceeded. Returns whether
+        a task is (now) scheduled for key.
+        """
+        self._sweep()
+        if key in self._entries:
+            return True
+
+        inflight = self._inflight()
+        if inflight >= self.max_inflight:
+            self.skipped_inflight += 1
+            return False
+        reserved = (inflight + 1) * self.max_tokens_per_call
+        if self.tokens_spent() + reserved > self.token_budget:
+            self.skipped_budget += 1
+            logger.info(f"Skipping {self.name} prefetch for {key}: token budget reached")
+            return False
+
+        task = asyncio.ensure_future(self._run(fn))
+        task.add_done_callback(self._finish)
+        self._running.add(task)
+        self._entries[key] = (time.monotonic(), task)
+        self.scheduled += 1
+        return True
+
+    async def _run(self, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, List[dict]]:
+        begin_request_usage()
+        succeeded = False
+        try:
+            value = await fn()
+            succeeded = True
+            return value, request_usage()
+        finally:
+            # Failed and cancelled calls were billed too
+            tokens = sum(
+                record["prompt_tokens"] + record["completion_tokens"]
+                for record in request_usage() if not record.get("shared")
+            )
+            if not succeeded:
+                tokens += self.max_tokens_per_call
+            self._spent.append((time.monotonic(), tokens))
+
+    def _finish(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.failed += 1
+            logger.warning(f"{self.name} prefetch failed: {str(task.exception())}")
+
+    async def take(self, key: str) -> Optional[Tuple[Any, List[dict]]]:
+        """
+        Claim the prefetched (value, usage) for key, waiting for it if it is
+        still running. Returns None if nothing was prefetched or it failed;
+        the caller then does the work itself.
+        """
+        self._sweep()
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        _, task = entry
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled():
+                return None
+            # The caller itself was cancelled; the entry goes back for a retry
+            self._entries[key] = entry
+            raise
+        except Exception:
+            return None
+        self.claimed += 1
+        return result
+
+    def cancel(self, key: str) -> bool:
+        """Cancel and drop the prefetch for key. Returns whether there was one."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        _, task = entry
+        if not task.done():
+            task.cancel()
+            self.cancelled += 1
+        return True
+
+    async def close(self) -> None:
+        """Cancel every outstanding prefetch."""
+        tasks = list(self._running)
+        # Claimed tasks are no longer in _entries, but still running
+        claimed = set(tasks) - {task for _, task in self._entries.values()}
+        for key in list(self._entries):
+            self.cancel(key)
+        for task in claimed:
+            task.cancel()
+            self.cancelled += 1
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "scheduled": self.scheduled,
+            "claimed": self.claimed,
+            "expired": self.expired,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "skipped_inflight": self.skipped_inflight,
+            "skipped_budget": self.skipped_budget,
+            "in_flight": self._inflight(),
+            "stored": len(self._entries),
+            "tokens_spent": self.tokens_spent(),
+        }
@@ -1,8 +1,9 @@
 import os
 import json
-from redis import Redis
-from typing import Optional, Any
+from typing import Optional, Any, Dict, List
 import structlog
+from .config import settings
+from .metrics import span
 
 logger = structlog.get_logger()
 
@@ -10,16 +11,36 @@ logger = structlog.get_logger()
 REDIS_URL = os.getenv("REDIS_URL")
 if not REDIS_URL:
     logger.warning("REDIS_URL not set, Redis functionality will be disabled")
-    redis_client = None
-else:
-    redis_client = Redis.from_url(REDIS_URL, decode_responses=True)
+
+# Created on first use (warmed at startup), so importing the app does not load redis
+redis_pool = None
+redis_client = None
+
+def get_redis():
+    """The process's Redis client, or None when REDIS_URL is not set."""
+    global redis_pool, redis_client
+    if redis_client is None and REDIS_URL:
+        from redis.asyncio import ConnectionPool, Redis
+        # Connections are opened lazily on first use, inside the running event loop
+        redis_pool = ConnectionPool.from_url(
+            REDIS_URL,
+            decode_responses=True,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        )
+        redis_client = Redis(connection_pool=redis_pool)
+    return redis_client
 
 async def get_cache(key: str) -> Optional[Any]:
     """Get a value from Redis cache."""
-    if not redis_client:
+    client = get_redis()
+    if not client:
         return None
     try:
-        value = redis_client.get(key)
+        with span("redis_get"):
+            value = await client.get(key)
         if value:
             return json.loads(value)
         return None
@@ -29,43 +50,115 @@ async def get_cache(key: str) -> Optional[Any]:
 
 async def set_cache(key: str, value: Any, expire: int = 3600) -> bool:
     """Set a value in Redis cache with expiration."""
-    if not redis_client:
+    client = get_redis()
+    if not client:
         return False
     try:
-        redis_client.setex(key, expire, json.dumps(value))
+        with span("redis_set"):
+            await client.setex(key, expire, json.dumps(value))
         return True
     except Exception as e:
         logger.error("redis_cache_error", error=str(e), key=key)
         return False
 
+async def mget_cache(keys: List[str]) -> List[Optional[Any]]:
+    """Get several values from Redis cache in one round trip."""
+    client = get_redis()
+    if not client or not keys:
+        return [None] * len(keys)
+    try:
+        with span("redis_mget"):
+            values = await client.mget(keys)
+        return [json.loads(value) if value else None for value in values]
+    except Exception as e:
+        logger.error("redis_cache_error", error=str(e), keys=len(keys))
+        return [None] * len(keys)
+
+async def mset_cache(items: Dict[str, Any], expire: int = 3600) -> bool:
+    """Set several values in Redis cache with expiration, pipelined into one round trip."""
+    client = get_redis()
+    if not client:
+        return False
+    if not items:
+        return True
+    try:
+        with span("redis_mset"):
+            async with client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.setex(key, expire, json.dumps(value))
+                await pipe.execute()
+        return True
+    except Exception as e:
+        logger.error("redis_cache_error", error=str(e), keys=len(items))
+        return False
+
 async def delete_cache(key: str) -> bool:
     """Delete a value from Redis cache."""
-    if not redis_client:
+    client = get_redis()
+    if not client:
         return False
     try:
-        redis_client.delete(key)
+        with span("redis_delete"):
+            await client.delete(key)
         return True
     except Exception as e:
         logger.error("redis_cache_error", error=str(e), key=key)
         return False
 
-async def acquire_lock(key: str, expire: int = 30) -> bool:
+# Deletes the lock only if it still holds the caller's token
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+async def acquire_lock(key: str, expire: int = 30, token: str = "1") -> bool:
     """Acquire a distributed lock."""
-    if not redis_client:
+    client = get_redis()
+    if not client:
         return True  # If Redis is not available, assume lock is acquired
     try:
-        return redis_client.set(key, "1", ex=expire, nx=True)
+        return bool(await client.set(key, token, ex=expire, nx=True))
     except Exception as e:
         logger.error("redis_lock_error", error=str(e), key=key)
         return False
 
-async def release_lock(key: str) -> bool:
-    """Release a distributed lock."""
-    if not redis_client:
+async def release_lock(key: str, token: Optional[str] = None) -> bool:
+    """
+    Release a distributed lock. When a token is given, the lock is only
+    released if it is still owned by that token (it may have expired and
+    been taken by someone else).
+    """
+    client = get_redis()
+    if not client:
         return True
     try:
-        redis_client.delete(key)
+        if token is None:
+            await client.delete(key)
+        else:
+            await client.eval(_RELEASE_LOCK_SCRIPT, 1, key, token)
         return True
     except Exception as e:
         logger.error("redis_lock_error", error=str(e), key=key)
-        return False 
\ No newline at end of file
+        return False
+
+async def lock_held(key: str) -> bool:
+    """Check whether a distributed lock is currently held by anyone."""
+    client = get_redis()
+    if not client:
+        return False
+    try:
+        return bool(await client.exists(key))
+    except Exception as e:
+        logger.error("redis_lock_error", error=str(e), key=key)
+        return False
+
+async def close_redis() -> None:
+    """Close the Redis client and disconnect every pooled connection."""
+    global redis_pool, redis_client
+    if not redis_client:
+        return
+    await redis_client.aclose()
+    await redis_pool.disconnect()
+    redis_pool = redis_client = None
@@ -0,0 +1,375 @@
+"""
+Semantic cache of validated intake analyses.
+
+The exact-match response cache only hits when the whole rendered prompt is
+identical, so two intakes that match on every structured answer but word
+the free text differently (primary_complaint, pain_movement, pain_comment)
+always miss. This cache matches those.
+
+Each intake becomes one unit vector:
+- the structured answers, canonicalized (enum values, sorted lowercased
+  lists) and feature-hashed into a one-hot block
+- the free text, embedded by hashed word and character n-grams (or a
+  sentence-transformers model, if SEMANTIC_CACHE_EMBEDDING_MODEL is set)
+
+The vectors live in a FAISS inner-product index (a NumPy scan if faiss is
+not installed). A lookup takes the k nearest entries, keeps only those whose
+structured answers are identical (compared by signature) and returns the
+best one whose free-text cosine similarity reaches the threshold.
+
+Entries expire after ttl seconds, the least recently used are evicted above
+max_entries, and save()/load() persist the index to disk. Lookups and adds
+are blocking (embedding, index search) and thread-safe, so async callers run
+them in a thread; the index is built on first use, so a sentence-transformers
+model is not loaded until there is something to embed.
+"""
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from enum import Enum
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # pragma: no cover - falls back to a NumPy scan
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+# Intake fields holding free text; every other field is a structured answer
+TEXT_FIELDS = ("primary_complaint", "pain_movement", "pain_comment")
+# Never part of the match
+IGNORED_FIELDS = frozenset({"session_id"})
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _bucket(token: str, dim: int) -> int:
+    """Stable feature-hash bucket (Python's hash() is salted per process)."""
+    return zlib.crc32(token.encode("utf-8")) % dim
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sorted(str(_canonical(item)).strip().lower() for item in value)
+    if isinstance(value, str):
+        return value.strip().lower()
+    return value
+
+
+class HashingEmbedder:
+    """
+    Dependency-free text embedding: hashed word unigrams and bigrams plus
+    character trigrams, L2-normalized. Robust to rewording and typos,
+    blind to synonyms.
+    """
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            words = _WORD.findall(text.lower())
+            tokens = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            for word in words:
+                padded = f" {word} "
+                tokens.extend(padded[j:j + 3] for j in range(len(padded) - 2))
+            for token in tokens:
+                out[i, _bucket(token, self.dim)] += 1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEmbedder:
+    """Embedding with a sentence-transformers model, loaded on first use."""
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    @property
+    def dim(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        return np.asarray(
+            self.model.encode(list(texts), normalize_embeddings=True), dtype=np.float32
+        )
+
+
+class VectorIndex:
+    """
+    Inner-product index with integer ids and removal: FAISS when available,
+    otherwise a brute-force NumPy scan.
+    """
+    def __init__(self, dim: int):
+        self.dim = dim
+        if faiss is not None:
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        else:
+            # Rows [0, _size) are live; capacity doubles as needed
+            self._index = None
+            self._size = 0
+            self._ids = np.zeros(1024, dtype=np.int64)
+            self._vectors = np.zeros((1024, dim), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self._index.ntotal if self._index is not None else self._size
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self._index is not None:
+            self._index.add_with_ids(vectors, ids)
+        else:
+            end = self._size + len(ids)
+            if end > len(self._ids):
+                capacity = max(end, 2 * len(self._ids))
+                self._ids = np.resize(self._ids, capacity)
+                self._vectors = np.resize(self._vectors, (capacity, self.dim))
+            self._ids[self._size:end] = ids
+            self._vectors[self._size:end] = vectors
+            self._size = end
+
+    def remove(self, ids: Sequence[int]) -> None:
+        ids = np.asarray(ids, dtype=np.int64)
+        if self._index is not None:
+            self._index.remove_ids(ids)
+        else:
+            keep = np.flatnonzero(~np.isin(self._ids[:self._size], ids))
+            self._ids[:len(keep)] = self._ids[keep]
+            self._vectors[:len(keep)] = self._vectors[keep]
+            self._size = len(keep)
+
+    def search(self, vector: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        """Up to k (score, id) pairs, best first."""
+        if len(self) == 0:
+            return []
+        k = min(k, len(self))
+        if self._index is not None:
+            scores, ids = self._index.search(vector.reshape(1, -1).astype(np.float32), k)
+            return [(float(s), int(i)) for s, i in zip(scores[0], ids[0]) if i != -1]
+        scores = self._vectors[:self._size] @ vector
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[j]), int(self._ids[j])) for j in top]
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache of analyses keyed by intake similarity.
+    """
+    def __init__(
+        self,
+        threshold: float = 0.97,
+        max_entries: int = 10000,
+        ttl: float = 7 * 86400,
+        structured_dim: int = 256,
+        structured_weight: float = 0.5,
+        k: int = 8,
+        embedder: Optional[Callable[[Sequence[str]], np.ndarray]] = None,
+        text_fields: Sequence[str] = TEXT_FIELDS,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.structured_dim = structured_dim
+        self.structured_weight = structured_weight
+        self.k = k
+        self.embedder = embedder or HashingEmbedder()
+        self.text_fields = tuple(text_fields)
+        # Built on first use: the embedder's size may mean loading its model
+        self._index: Optional[VectorIndex] = None
+        self._lock = threading.Lock()
+
+        # id -> entry; an entry is {"signature", "value", "created_at", "last_used"} (wall-clock times)
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._next_id = 0
+        self._vectors: Dict[int, np.ndarray] = {}
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.near_misses = 0  # Same structured answers, free text below threshold
+        self.evictions = 0
+        self.lookup_seconds = 0.0
+
+    @property
+    def dim(self) -> int:
+        return self.structured_dim + self.embedder.dim
+
+    @property
+    def index(self) -> VectorIndex:
+        if self._index is None:
+            self._index = VectorIndex(self.dim)
+        return self._index
+
+    def _structured(self, intake: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            field: _canonical(value)
+            for field, value in sorted(intake.items())
+            if field not in self.text_fields and field not in IGNORED_FIELDS
+        }
+
+    def signature(self, intake: Dict[str, Any]) -> str:
+        """Hash of the canonicalized structured answers."""
+        canonical = json.dumps(self._structured(intake), sort_keys=True, default=str)
+        return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+    def text(self, intake: Dict[str, Any]) -> str:
+        return "\n".join(str(intake.get(field) or "") for field in self.text_fields)
+
+    def vector(self, intake: Dict[str, Any]) -> np.ndarray:
+        """Unit vector: weighted structured one-hot block plus free-text embedding."""
+        structured = np.zeros(self.structured_dim, dtype=np.float32)
+        for field, value in self._structured(intake).items():
+            values = value if isinstance(value, list) else [value]
+            for item in values:
+                structured[_bucket(f"{field}={item}", self.structured_dim)] = 1.0
+        norm = np.linalg.norm(structured)
+        if norm:
+            structured /= norm
+        text = self.embedder([self.text(intake)])[0]
+        return np.concatenate([
+            np.sqrt(self.structured_weight) * structured,
+            np.sqrt(1 - self.structured_weight) * text,
+        ]).astype(np.float32)
+
+    def _text_similarity(self, score: float) -> float:
+        """Free-text cosine from a combined score whose structured blocks are identical."""
+        return (score - self.structured_weight) / (1 - self.structured_weight)
+
+    def lookup(self, intake: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        The cached value for the most similar intake with identical structured
+        answers, and its free-text similarity; None below the threshold.
+        """
+        started = time.perf_counter()
+        try:
+            # Nothing to match yet: skip the embedding
+            vector = self.vector(intake) if self._entries else None
+            signature = self.signature(intake)
+            with self._lock:
+                now = time.time()
+                same_structure = False
+                for score, entry_id in self.index.search(vector, self.k) if vector is not None else ():
+                    entry = self._entries.get(entry_id)
+                    if entry is None or entry["signature"] != signature:
+                        continue
+                    if now - entry["created_at"] > self.ttl:
+                        self._remove([entry_id])
+                        continue
+                    same_structure = True
+                    similarity = self._text_similarity(score)
+                    if similarity >= self.threshold:
+                        entry["last_used"] = now
+                        self.hits += 1
+                        return entry["value"], round(similarity, 4)
+                if same_structure:
+                    self.near_misses += 1
+                self.misses += 1
+                return None
+        finally:
+            self.lookup_seconds += time.perf_counter() - started
+
+    def add(self, intake: Dict[str, Any], value: Dict[str, Any]) -> None:
+        """Cache a validated value for this intake, evicting the least recently used if full."""
+        vector = self.vector(intake)
+        signature = self.signature(intake)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            now = time.time()
+            self._entries[entry_id] = {
+                "signature": signature,
+                "value": value,
+                "created_at": now,
+                "last_used": now,
+            }
+            self._vectors[entry_id] = vector
+            self.index.add(np.array([entry_id]), vector.reshape(1, -1))
+            if len(self._entries) > self.max_entries:
+                # Evict a tenth at a time so removal (a full index rewrite) stays rare
+                excess = len(self._entries) - self.max_entries + max(1, self.max_entries // 10)
+                oldest = sorted(self._entries, key=lambda i: self._entries[i]["last_used"])[:excess]
+                self._remove(oldest)
+                self.evictions += len(oldest)
+
+    def _remove(self, ids: Sequence[int]) -> None:
+        self.index.remove(ids)
+        for entry_id in ids:
+            self._entries.pop(entry_id, None)
+            self._vectors.pop(entry_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def save(self, path: str) -> None:
+        """Write entries and vectors to path (.npz), atomically."""
+        if self._index is None:
+            # Never used in this process; leave the file as it is
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._lock:
+            ids = sorted(self._entries)
+            vectors = np.array([self._vectors[i] for i in ids], dtype=np.float32).reshape(-1, self.dim)
+            entries = json.dumps([self._entries[i] for i in ids])
+        tmp_path = f"{path}.tmp.{os.getpid()}.npz"
+        np.savez(tmp_path, ids=np.array(ids, dtype=np.int64), vectors=vectors, entries=np.array(entries))
+        os.replace(tmp_path, path)
+        logger.info(f"Saved {len(ids)} semantic cache entries to {path}")
+
+    def load(self, path: str) -> int:
+        """Load entries saved by save(), skipping expired ones. Returns how many were loaded."""
+        if not os.path.exists(path):
+            return 0
+        with np.load(path) as data:
+            vectors = data["vectors"]
+            entries = json.loads(str(data["entries"]))
+        cutoff = time.time() - self.ttl
+        keep = [j for j, entry in enumerate(entries) if entry["created_at"] >= cutoff][-self.max_entries:]
+        if not keep:
+            return 0
+        if vectors.shape[1:] != (self.dim,):
+            logger.warning(f"Ignoring semantic cache at {path}: vector size {vectors.shape[1:]} != {self.dim}")
+            return 0
+        with self._lock:
+            ids = np.arange(self._next_id, self._next_id + len(keep), dtype=np.int64)
+            for entry_id, j in zip(ids, keep):
+                self._entries[int(entry_id)] = entries[j]
+                self._vectors[int(entry_id)] = vectors[j]
+            self.index.add(ids, vectors[keep])
+            self._next_id += len(keep)
+        logger.info(f"Loaded {len(keep)} semantic cache entries from {path}")
+        return len(keep)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "backend": "faiss" if faiss is not None else "numpy",
+            "hits": self.hits,
+            "misses": self.misses,
+            "near_misses": self.near_misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "avg_lookup_ms": 1000 * self.lookup_seconds / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,178 @@
+"""
+Server configuration: gunicorn with uvicorn workers, sized for an I/O-bound LLM proxy.
+
+A request spends almost all of its time awaiting the LLM, so one async worker
+per usable CPU already keeps the CPUs busy; more workers only add memory and
+another set of DB/Redis pools and caches each. Everything here is derived
+from Settings and the host:
+
+- workers: WEB_CONCURRENCY, or the usable CPUs (affinity and cgroup quota
+  aware), at least 2 and at most SERVER_MAX_WORKERS
+- per-worker LLM concurrency: LLM_TOTAL_CONCURRENCY split across the workers
+  if set, otherwise LLM_MAX_CONCURRENCY
+- keep-alive, listen backlog, worker recycling, and a graceful timeout long
+  enough for an in-flight LLM call and the shutdown flushes
+- uvloop and httptools when installed (SERVER_LOOP, SERVER_HTTP)
+
+With more than one worker, Prometheus multiprocess mode is switched on so
+/metrics aggregates every worker.
+
+Usage (from the repository root):
+    gunicorn -c python:backend.app.core.server backend.app.main:app
+    python -m backend.app.core.server  # one uvicorn process, same settings
+"""
+import math
+import os
+import tempfile
+from typing import Any, Dict, Optional
+
+from .config import settings
+
+try:
+    from uvicorn.workers import UvicornWorker
+except ImportError:  # gunicorn is not installed
+    UvicornWorker = None
+
+# Seconds kept back from the graceful timeout for the app's shutdown hooks
+# (JSONL and LLMLog flushes, semantic cache save)
+SHUTDOWN_HOOKS_SECONDS = 5
+
+
+def _cgroup_cpu_quota() -> Optional[float]:
+    """The container's CPU quota in CPUs (cgroup v2 or v1), or None if unlimited."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus() -> int:
+    """CPUs this process may actually use."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def worker_count() -> int:
+    if settings.WEB_CONCURRENCY > 0:
+        return settings.WEB_CONCURRENCY
+    # Two at least, so a recycled or stalled worker never takes the service down
+    return max(2, min(available_cpus(), settings.SERVER_MAX_WORKERS))
+
+
+def llm_concurrency(workers: int) -> int:
+    """Max in-flight LLM calls for each of workers processes."""
+    if settings.LLM_TOTAL_CONCURRENCY > 0:
+        return max(1, settings.LLM_TOTAL_CONCURRENCY // workers)
+    return settings.LLM_MAX_CONCURRENCY
+
+
+def listen_backlog() -> int:
+    """SERVER_BACKLOG, capped by what the kernel allows (it truncates silently)."""
+    try:
+        with open("/proc/sys/net/core/somaxconn") as f:
+            return min(settings.SERVER_BACKLOG, int(f.read()))
+    except (OSError, ValueError):
+        return settings.SERVER_BACKLOG
+
+
+def graceful_timeout_seconds() -> int:
+    """
+    SERVER_GRACEFUL_TIMEOUT, or long enough for an in-flight request to get
+    through one LLM attempt and one failover or text-output retry.
+    """
+    if settings.SERVER_GRACEFUL_TIMEOUT > 0:
+        return settings.SERVER_GRACEFUL_TIMEOUT
+    return math.ceil(2 * settings.LLM_REQUEST_TIMEOUT) + SHUTDOWN_HOOKS_SECONDS
+
+
+def uvicorn_options() -> Dict[str, Any]:
+    """Options for uvicorn.Config shared by gunicorn workers and the standalone server."""
+    return {
+        "loop": settings.SERVER_LOOP,
+        "http": settings.SERVER_HTTP,
+        "limit_concurrency": settings.SERVER_LIMIT_CONCURRENCY or None,
+        # Stop waiting for requests in time for the shutdown hooks to run
+        "timeout_graceful_shutdown": max(1, graceful_timeout_seconds() - SHUTDOWN_HOOKS_SECONDS),
+    }
+
+
+if UvicornWorker is not None:
+    class Worker(UvicornWorker):
+        """UvicornWorker with this module's event loop, HTTP parser and limits."""
+        CONFIG_KWARGS = uvicorn_options()
+
+
+# gunicorn settings (read from this module by `gunicorn -c python:...`)
+bind = f"{settings.HOST}:{settings.PORT}"
+workers = worker_count()
+worker_class = f"{__name__}.Worker"
+keepalive = settings.SERVER_KEEPALIVE
+backlog = listen_backlog()
+timeout = settings.SERVER_TIMEOUT
+graceful_timeout = graceful_timeout_seconds()
+max_requests = settings.SERVER_MAX_REQUESTS
+max_requests_jitter = settings.SERVER_MAX_REQUESTS // 10
+preload_app = settings.SERVER_PRELOAD
+# Heartbeat files on tmpfs; a disk-backed /tmp can stall workers in containers
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# Under gunicorn with several workers; must be set before prometheus_client
+# is imported (by the preloaded app)
+if __name__ != "__main__" and workers > 1 and "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+
+
+def on_starting(server):
+    server.log.info(
+        "Server plan: %d workers (%d usable CPUs), %d LLM calls per worker, loop=%s http=%s, "
+        "keepalive=%ds backlog=%d graceful_timeout=%ds",
+        server.cfg.workers, available_cpus(), llm_concurrency(server.cfg.workers),
+        settings.SERVER_LOOP, settings.SERVER_HTTP, server.cfg.keepalive, server.cfg.backlog,
+        server.cfg.graceful_timeout,
+    )
+
+
+def post_fork(server, worker):
+    # Uses the actual worker count, which a command-line -w may have changed
+    settings.LLM_MAX_CONCURRENCY = llm_concurrency(server.cfg.workers)
+
+
+def child_exit(server, worker):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def main():
+    """Run a single uvicorn process with the same settings (no gunicorn needed)."""
+    import uvicorn
+
+    settings.LLM_MAX_CONCURRENCY = llm_concurrency(1)
+    uvicorn.run(
+        "backend.app.main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        timeout_keep_alive=keepalive,
+        backlog=backlog,
+        **uvicorn_options(),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Single-flight deduplication for concurrent identical work.
+
+Callers that ask for the same key while a call is already in flight await
+that call's result instead of starting their own. The shared call runs as
+its own task, so a caller that gets cancelled (e.g. the client disconnected)
+does not cancel the work for everyone else waiting on it.
+"""
+from typing import Any, Awaitable, Callable, Dict
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one in-flight task.
+    """
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Task] = {}
+
+        # Counters
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() for key, or join the call already in flight for that key.
+        """
+        task = self._flights.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.followers += 1
+            logger.info("Joining in-flight call for identical prompt")
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        # Mark the exception as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        """Number of distinct keys currently in flight."""
+        return len(self._flights)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "in_flight": len(self._flights),
+        }
@@ -0,0 +1,258 @@
+"""
+Rule-based red-flag triage that runs before the intake LLM call.
+
+The rules are a table: each row matches one intake field against a set of
+values and carries a weight, a differentiation category and the diagnosis
+it points to. The table is compiled once into a feature vocabulary and a
+feature-to-rule matrix, so scoring a batch of intakes is two matrix
+products (scoring one intake is a batch of one):
+
+    hits   = (features @ rule_matrix) > 0      # which rules fired
+    scores = hits @ weights                    # red-flag score per intake
+
+An intake whose score reaches the threshold is flagged serious. Only a
+clear-cut case, where a single rule weighing at least the threshold fired
+(bowel or bladder changes in the default table), is answered with a
+templated AnalysisResult (urgent referral) instead of the full analysis
+call. Weaker flags that only add up to the threshold together are recorded
+but still go to the LLM, as does everything else.
+
+The default table covers the intake's red-flag questions; a JSON file with
+the same columns (TRIAGE_RULES_PATH) replaces it.
+"""
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Sequence, Tuple
+import json
+import logging
+import time
+
+import numpy as np
+from pydantic import BaseModel
+
+from .config import settings
+from ..models.intake import AnalysisResult
+
+logger = logging.getLogger(__name__)
+
+# Matches any answer to a field except an explicit negative
+ANY = "*"
+NEGATIVE_VALUES = frozenset({"", "no", "none", "n/a"})
+
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {
+        "name": "bowel_bladder_change",
+        "field": "detail_pain_serious",
+        "values": ["yes_bowel", "yes_bladder", "both"],
+        "weight": 1.0,
+        "category": "neurological",
+        "diagnosis": "Suspected cauda equina syndrome",
+        "icd10_code": "G83.4",
+        "simple_explanation": "New bowel or bladder changes with back pain can mean nerves at the base of the spine are compressed.",
+    },
+    {
+        "name": "fever_or_infection",
+        "field": "detail_pain_fever",
+        "values": ["yes"],
+        "weight": 0.6,
+        "category": "inflammatory",
+        "diagnosis": "Suspected spinal infection",
+        "icd10_code": "M46.20",
+        "simple_explanation": "Spinal pain together with a fever or recent infection can be a sign of infection near the spine.",
+    },
+    {
+        "name": "serious_symptom",
+        "field": "serious_symptom",
+        "values": [ANY],
+        "weight": 0.6,
+        "category": "other",
+        "diagnosis": "Red-flag symptoms requiring medical assessment",
+        "icd10_code": "R68.89",
+        "simple_explanation": "Some of the symptoms you reported need to be checked by a doctor before starting treatment.",
+    },
+    {
+        "name": "leg_pain",
+        "field": "detail_pain_lowerbody",
+        "values": ["yes"],
+        "weight": 0.4,
+        "category": "neurological",
+        "diagnosis": "Lumbar radiculopathy",
+        "icd10_code": "M54.16",
+        "simple_explanation": "Pain spreading into the hip or leg can come from an irritated nerve in the lower back.",
+    },
+]
+
+# Filler categories so differentiation_probabilities always has three entries
+_CATEGORIES = ("neurological", "inflammatory", "other")
+
+
+class TriageResult(BaseModel):
+    """Outcome of scoring one intake."""
+    score: float
+    flags: List[str]
+    serious: bool
+    # A single fired rule reaches the threshold on its own
+    clear_cut: bool = False
+
+
+class TriageEngine:
+    """
+    Compiled rule table plus hit-rate counters.
+    """
+    def __init__(self, rules: Sequence[Dict[str, Any]], threshold: float = 1.0, enabled: bool = True):
+        if not rules:
+            raise ValueError("TriageEngine needs at least one rule")
+        self.rules = [dict(rule) for rule in rules]
+        self.threshold = threshold
+        self.enabled = enabled
+
+        # (field, value) -> feature column; rule_matrix[feature, rule] = 1 if the rule matches it
+        self.vocabulary: Dict[Tuple[str, str], int] = {}
+        for rule in self.rules:
+            for value in rule["values"]:
+                self.vocabulary.setdefault((rule["field"], value), len(self.vocabulary))
+        self.rule_matrix = np.zeros((len(self.vocabulary), len(self.rules)), dtype=np.float32)
+        for j, rule in enumerate(self.rules):
+            for value in rule["values"]:
+                self.rule_matrix[self.vocabulary[(rule["field"], value)], j] = 1.0
+        self.weights = np.array([rule["weight"] for rule in self.rules], dtype=np.float64)
+        self.fields = sorted({rule["field"] for rule in self.rules})
+
+        # Counters
+        self.assessed = 0
+        self.flagged = 0
+        self.short_circuited = 0
+        self.rule_hits = {rule["name"]: 0 for rule in self.rules}
+        self._recent_seconds: Deque[float] = deque(maxlen=1024)
+
+    @classmethod
+    def from_settings(cls) -> "TriageEngine":
+        rules = DEFAULT_RULES
+        if settings.TRIAGE_RULES_PATH:
+            with open(settings.TRIAGE_RULES_PATH) as f:
+                rules = json.load(f)
+        return cls(rules, threshold=settings.TRIAGE_SERIOUS_THRESHOLD, enabled=settings.TRIAGE_ENABLED)
+
+    def _answers(self, intake: Dict[str, Any], field: str) -> Iterable[str]:
+        value = intake.get(field)
+        if value is None:
+            return ()
+        values = value if isinstance(value, (list, tuple, set, frozenset)) else (value,)
+        # Enum members compare by value
+        return [str(getattr(v, "value", v)).strip().lower() for v in values]
+
+    def features(self, intakes: Sequence[Dict[str, Any]]) -> np.ndarray:
+        """One-hot (n_intakes, n_features) matrix of the answers the rules look at."""
+        x = np.zeros((len(intakes), len(self.vocabulary)), dtype=np.float32)
+        for i, intake in enumerate(intakes):
+            for field in self.fields:
+                any_column = self.vocabulary.get((field, ANY))
+                for answer in self._answers(intake, field):
+                    column = self.vocabulary.get((field, answer))
+                    if column is not None:
+                        x[i, column] = 1.0
+                    if any_column is not None and answer not in NEGATIVE_VALUES:
+                        x[i, any_column] = 1.0
+        return x
+
+    def score_many(self, intakes: Sequence[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """(scores, hits) for a batch: scores is (n,), hits is a boolean (n, n_rules) matrix."""
+        hits = (self.features(intakes) @ self.rule_matrix) > 0
+        return hits @ self.weights, hits
+
+    def assess(self, intake: Dict[str, Any]) -> TriageResult:
+        """Score one intake and record it in the counters."""
+        started = time.perf_counter()
+        scores, hits = self.score_many([intake])
+        flags = [self.rules[j]["name"] for j in np.flatnonzero(hits[0])]
+        score = round(float(scores[0]), 4)
+        clear_cut = bool((hits[0] & (self.weights >= self.threshold)).any())
+        result = TriageResult(score=score, flags=flags, serious=score >= self.threshold, clear_cut=clear_cut)
+        self._recent_seconds.append(time.perf_counter() - started)
+
+        self.assessed += 1
+        if flags:
+            self.flagged += 1
+        for flag in flags:
+            self.rule_hits[flag] += 1
+        return result
+
+    def should_short_circuit(self, result: TriageResult) -> bool:
+        """Whether to answer with the templated result instead of calling the LLM."""
+        if self.enabled and result.clear_cut:
+            self.short_circuited += 1
+            return True
+        return False
+
+    def template(self, result: TriageResult) -> AnalysisResult:
+        """Templated urgent-referral AnalysisResult for a clear-cut triage result."""
+        fired = sorted(
+            (rule for rule in self.rules if rule["name"] in result.flags),
+            key=lambda rule: rule["weight"], reverse=True,
+        )
+        total = sum(rule["weight"] for rule in fired)
+
+        # Differentiation: fired weight per category, topped up to three categories
+        weight_by_category: Dict[str, float] = {}
+        for rule in fired:
+            weight_by_category[rule["category"]] = weight_by_category.get(rule["category"], 0.0) + rule["weight"]
+        ranked = sorted(weight_by_category.items(), key=lambda item: item[1], reverse=True)[:3]
+        filler = [c for c in _CATEGORIES if c not in weight_by_category][:3 - len(ranked)]
+        ranked_total = sum(weight for _, weight in ranked)
+        if filler:
+            shares = [0.9 * weight / ranked_total for _, weight in ranked] + [0.1 / len(filler)] * len(filler)
+        else:
+            shares = [weight / ranked_total for _, weight in ranked]
+        probabilities = [round(share, 2) for share in shares]
+        probabilities[0] = round(1 - sum(probabilities[1:]), 2)
+        names = [category for category, _ in ranked] + filler
+
+        main, others = fired[0], fired[1:]
+        return AnalysisResult(
+            serious_vs_treatable={"diagnosis": "serious", "probability": round(min(0.99, 0.5 + 0.4 * result.score / self.threshold), 2)},
+            differentiation_probabilities=[
+                {"diagnosis": name, "probability": probability} for name, probability in zip(names, probabilities)
+            ],
+            main_diagnosis={
+                "diagnosis": main["diagnosis"],
+                "icd10_code": main["icd10_code"],
+                "reasoning": f"Red-flag screening positive: {', '.join(result.flags)} (score {result.score}).",
+                "probability": round(main["weight"] / total, 2),
+                "simple_explanation": main["simple_explanation"],
+            },
+            other_probabilistic_diagnosis=[
+                {
+                    "diagnosis": rule["diagnosis"],
+                    "icd10_code": rule["icd10_code"],
+                    "probability": round(rule["weight"] / total, 2),
+                    "simple_explanation": rule["simple_explanation"],
+                }
+                for rule in others
+            ],
+            treatment_recommendations=[{
+                "type": "Medical Referral",
+                "description": "Seek an urgent medical assessment before starting any exercise or physical therapy program.",
+                "priority": 1,
+                "frequency": "Once",
+                "duration": "As soon as possible",
+            }],
+            reasoning=(
+                "The intake reports red-flag findings that need to be ruled out by a physician "
+                "before a treatable musculoskeletal cause can be assumed."
+            ),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        recent = sorted(self._recent_seconds)
+        return {
+            "enabled": self.enabled,
+            "assessed": self.assessed,
+            "flagged": self.flagged,
+            "short_circuited": self.short_circuited,
+            "llm_calls_avoided_ratio": self.short_circuited / self.assessed if self.assessed else 0.0,
+            "rule_hits": dict(self.rule_hits),
+            "p50_us": 1e6 * recent[len(recent) // 2] if recent else 0.0,
+            "p95_us": 1e6 * recent[int(len(recent) * 0.95)] if recent else 0.0,
+        }
+
+
+triage_engine = TriageEngine.from_settings()
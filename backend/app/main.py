@@ -1,14 +1,17 @@
-import os
-from fastapi import FastAPI
+import asyncio
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from .core.database import init_db, close_db
-from .core.logging import logger, log_event
-from .core.redis import redis_client
+from .core.llm_log import llm_log_buffer
+from .core.logging import logger, log_event, log_error
+from .core.redis import get_redis, close_redis
+from .core.jsonl_writer import close_jsonl_writers
+from .core.config import settings
+from .core.llm import llm_service
+from .core.metrics import MetricsMiddleware, render_latest, stats_collector
 from .api import intake_analysis, final_analysis, treatment_plan
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise RuntimeError("🛑 DATABASE_URL not set")
+from .api.session_store import session_store
 
 app = FastAPI()
 
@@ -21,6 +24,17 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"]
 )
+app.add_middleware(MetricsMiddleware)
+
+# Counters the services keep themselves, exported as gauges at scrape time
+stats_collector.register("llm_cache", lambda: llm_service.cache.stats())
+stats_collector.register("llm_router", lambda: llm_service.router.stats())
+stats_collector.register("llm_singleflight", llm_service.singleflight.stats)
+stats_collector.register("llm_log_buffer", llm_log_buffer.stats)
+stats_collector.register("session_store", session_store.stats)
+stats_collector.register("intake_semantic_cache", intake_analysis.intake_semantic_cache.stats)
+stats_collector.register("triage", intake_analysis.triage_engine.stats)
+stats_collector.register("treatment_plan_prefetch", treatment_plan.treatment_plan_prefetcher.stats)
 
 app.include_router(intake_analysis.router,
                    prefix="/api/intake_analysis", tags=["Intake Analysis"])
@@ -33,18 +47,35 @@ app.include_router(treatment_plan.router,
 def read_root():
     return {"message": "Welcome to Remap PT"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
 @app.on_event("startup")
 async def startup():
     log_event("app_startup", message="Starting application")
+    # The DB engine, Redis pool and LLM clients are created on first use;
+    # warm them here so the first request does not pay for it
     await init_db()
-    if redis_client:
+    try:
+        llm_service.warm()
+    except Exception as e:
+        log_error("llm_warm_failed", e)
+    if settings.SEMANTIC_CACHE_ENABLED:
+        await asyncio.to_thread(intake_analysis.intake_semantic_cache.load, intake_analysis.SEMANTIC_CACHE_PATH)
+    if get_redis():
         log_event("redis_connected", message="Redis connection established")
     log_event("app_startup_complete", message="Application startup complete")
 
 @app.on_event("shutdown")
 async def shutdown():
     log_event("app_shutdown", message="Shutting down application")
+    await treatment_plan.treatment_plan_prefetcher.close()
+    if settings.SEMANTIC_CACHE_ENABLED:
+        await asyncio.to_thread(intake_analysis.intake_semantic_cache.save, intake_analysis.SEMANTIC_CACHE_PATH)
+    await close_jsonl_writers()
+    await llm_log_buffer.close()
     await close_db()
-    if redis_client:
-        redis_client.close()
+    await close_redis()
     log_event("app_shutdown_complete", message="Application shutdown complete")
@@ -1,22 +1,31 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 import uuid
 
 Base = declarative_base()
 
+# JSONB on Postgres (see migration 7b3e9c4d1a2f), plain JSON elsewhere
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
 class Session(Base):
     __tablename__ = "sessions"
 
     session_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    analysis = Column(JSON, nullable=False)
+    analysis = Column(JSONType, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class LLMLog(Base):
+    # On Postgres this table is partitioned by month on created_at, with a
+    # (log_id, created_at) primary key; log_id alone is unique via its sequence
     __tablename__ = "llm_logs"
+    __table_args__ = (
+        Index("ix_llm_logs_session_id_created_at", "session_id", "created_at"),
+    )
 
     log_id = Column(Integer, primary_key=True)
     session_id = Column(String, ForeignKey("sessions.session_id"), nullable=False)
-    step = Column(String, nullable=False)  # e.g., 'intake_analysis', 'treatment_plan'
-    payload = Column(JSON, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now()) 
\ No newline at end of file
+    step = Column(String, nullable=False, index=True)  # e.g., 'intake_analysis', 'treatment_plan'
+    payload = Column(JSONType, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now()) 
\ No newline at end of file
@@ -29,18 +29,31 @@ Key Components:
 Validation Rules:
 - pain_severity: Integer between 0-10
 - All enum fields: Must match predefined values
-- Conditional fields:
+- pain_location: a set of PainLocation values
+- Conditional fields (checked together by one model validator):
   * detail_pain_activity, detail_pain_timing, detail_pain_accident: Required if "other" not in pain_location
   * detail_pain_position, detail_pain_lowerbody, detail_pain_fever: Required if "lower_back" or "neck" in pain_location
   * detail_pain_serious: Required if "lower_back" in pain_location and no other locations
 - Probabilities: Must sum to 1.0 (with small floating point tolerance)
 """
 
-from pydantic import BaseModel, Field, validator
-from typing import List, Dict, Optional
+from pydantic import BaseModel, Field, validator, model_validator, field_serializer
+from typing import Any, List, Dict, FrozenSet, Optional
 from enum import Enum
 
 
+class PainLocation(str, Enum):
+    NECK = "neck"
+    SHOULDER = "shoulder"
+    UPPER_BACK = "upper_back"
+    LOWER_BACK = "lower_back"
+    HIP = "hip"
+    KNEE = "knee"
+    ANKLE = "ankle"
+    FOOT = "foot"
+    OTHER = "other"
+
+
 class PainTime(str, Enum):
     MORNING = "morning"
     AFTERNOON = "afternoon"
@@ -106,6 +119,16 @@ class BowelBladderChange(str, Enum):
     BOTH = "both"
 
 
+# Conditional questions (15-21), grouped by the pain locations that require them
+_NOT_OTHER_QUESTIONS = ("detail_pain_activity", "detail_pain_timing", "detail_pain_accident")
+_SPINE_QUESTIONS = ("detail_pain_position", "detail_pain_lowerbody", "detail_pain_fever")
+_LOWER_BACK_ONLY_QUESTIONS = ("detail_pain_serious",)
+_SPINE_LOCATIONS = frozenset({PainLocation.LOWER_BACK, PainLocation.NECK})
+_LOWER_BACK_ONLY = frozenset({PainLocation.LOWER_BACK})
+# Serialization order of pain_location (declaration order); iterating the Enum class itself is slow
+_PAIN_LOCATION_ORDER = tuple(PainLocation)
+
+
 class IntakeFormData(BaseModel):
     """
     Data schema for the combined patient intake form with conditional questions.
@@ -114,7 +137,7 @@ class IntakeFormData(BaseModel):
     """
     # Basic Questions (1-14) - Always Required
     primary_complaint: str
-    pain_location: List[str]  # Multiple selections allowed
+    pain_location: FrozenSet[PainLocation]  # Multiple selections allowed
     pain_nature: List[str]    # Multiple selections allowed
     pain_severity: int = Field(ge=0, le=10)
     pain_frequency: PainFrequency
@@ -141,31 +164,38 @@ class IntakeFormData(BaseModel):
     # Additional Question (21) - Required if pain location is Lower back Only
     detail_pain_serious: Optional[BowelBladderChange] = None
 
-    @validator('detail_pain_activity', 'detail_pain_timing', 'detail_pain_accident')
-    def validate_activity_timing_accident(cls, v, values):
-        """Validate that questions 15-17 are provided if pain location is not 'other'"""
-        if 'pain_location' in values and 'other' not in values['pain_location']:
-            if v is None:
-                raise ValueError("This field is required when pain location is not 'other'")
-        return v
-
-    @validator('detail_pain_position', 'detail_pain_lowerbody', 'detail_pain_fever')
-    def validate_position_lowerbody_fever(cls, v, values):
-        """Validate that questions 18-20 are provided if pain location is lower back or neck"""
-        if 'pain_location' in values and any(loc in ['lower_back', 'neck'] for loc in values['pain_location']):
-            if v is None:
-                raise ValueError("This field is required when pain location is lower back or neck")
-        return v
-
-    @validator('detail_pain_serious')
-    def validate_serious(cls, v, values):
-        """Validate that question 21 is provided if pain location is only lower back"""
-        if 'pain_location' in values:
-            pain_locations = values['pain_location']
-            if len(pain_locations) == 1 and pain_locations[0] == 'lower_back':
-                if v is None:
-                    raise ValueError("This field is required when pain location is only lower back")
-        return v
+    @model_validator(mode="after")
+    def validate_conditional_questions(self):
+        """Validate that questions 15-21 are provided as the pain location requires"""
+        locations = self.pain_location
+        errors = []
+        for required, fields, reason in (
+            (PainLocation.OTHER not in locations, _NOT_OTHER_QUESTIONS, "pain location is not 'other'"),
+            (not locations.isdisjoint(_SPINE_LOCATIONS), _SPINE_QUESTIONS, "pain location is lower back or neck"),
+            (locations == _LOWER_BACK_ONLY, _LOWER_BACK_ONLY_QUESTIONS, "pain location is only lower back"),
+        ):
+            if required:
+                missing = [name for name in fields if getattr(self, name) is None]
+                if missing:
+                    errors.append(f"{', '.join(missing)} required when {reason}")
+        if errors:
+            raise ValueError("; ".join(errors))
+        return self
+
+    @field_serializer("pain_location")
+    def serialize_pain_location(self, locations: FrozenSet[PainLocation]) -> List[str]:
+        """A list of values in PainLocation order, so the prompt and cache keys are stable"""
+        return [location.value for location in _PAIN_LOCATION_ORDER if location in locations]
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        The fields as a shallow dict, for prompts, logs and caches: the same
+        values as model_dump(), but lists are shared with the model rather
+        than copied, which makes it several times cheaper.
+        """
+        values = dict(self.__dict__)
+        values["pain_location"] = self.serialize_pain_location(self.pain_location)
+        return values
 
 
 class BaseDiagnosis(BaseModel):
@@ -212,7 +242,8 @@ class AnalysisResult(BaseModel):
     other_probabilistic_diagnosis: List[ProbabilisticDiagnosis]
     treatment_recommendations: List[TreatmentRecommendation]
     reasoning: str
-    session_id: str
+    # Stamped by the server after generation so identical intakes share a prompt
+    session_id: Optional[str] = None
 
     @validator('differentiation_probabilities')
     def validate_probabilities_sum(cls, v):
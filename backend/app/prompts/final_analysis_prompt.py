@@ -1,10 +1,37 @@
 FINAL_ANALYSIS_PROMPT = """
 You are a physical therapy expert reviewing a patient's intake analysis to provide a focused treatment plan. 
-Based on the following intake analysis, provide a structured response in JSON format.
+Based on the following intake analysis, provide a structured treatment plan.
 
 Previous Intake Analysis:
 {intake_analysis}
 
+INSTRUCTIONS:
+1. All fields are required
+2. Choose ONE primary focus area (pain, mobility, or strength) based on the patient's current condition and needs
+3. Provide EXACTLY 3 exercises that:
+   - Are appropriate for the patient's current condition
+   - Can be performed safely at home
+   - Are progressive in nature (start easier, get more challenging)
+   - Target the specific muscle group or area identified in the diagnosis
+4. For each exercise, include:
+   - A clear, descriptive name
+   - Detailed instructions for proper form
+   - Specific number of sets and reps
+   - Frequency (how many times per day)
+   - Any necessary precautions or modifications
+5. The reasoning should explain:
+   - Why this specific focus area was chosen
+   - How each exercise addresses the main diagnosis
+   - What improvements to expect after one week
+6. The next_phase_focus should explain which of the remaining aspects (pain/mobility/strength) should be addressed in the next phase and why
+
+Remember: This is a one-week treatment plan with exactly 3 exercises. The patient will return for re-evaluation after completing this phase, at which point we can address the other aspects of their condition. Choose exercises that are appropriate for the patient's current level and that will provide a good foundation for future progress.
+{format_instructions}
+"""
+
+# Only sent when the model is not asked for schema-constrained (tool call) output.
+# Substituted as a value, so the JSON braces below are not escaped.
+FINAL_ANALYSIS_FORMAT_INSTRUCTIONS = """
 IMPORTANT: Your response must be a valid JSON object with the following structure:
 {
     "treatment_focus": "pain/mobility/strength",
@@ -24,30 +51,10 @@ IMPORTANT: Your response must be a valid JSON object with the following structur
     "next_phase_focus": "Brief explanation of which aspect (pain/mobility/strength) should be addressed in the next phase"
 }
 
-CRITICAL INSTRUCTIONS:
+FORMATTING:
 1. Your response must be a valid JSON object that can be parsed by a JSON parser
 2. Do not include any markdown formatting (no ```json or ```)
-3. All fields are required and must match the format exactly
-4. Choose ONE primary focus area (pain, mobility, or strength) based on the patient's current condition and needs
-5. Provide EXACTLY 3 exercises that:
-   - Are appropriate for the patient's current condition
-   - Can be performed safely at home
-   - Are progressive in nature (start easier, get more challenging)
-   - Target the specific muscle group or area identified in the diagnosis
-6. For each exercise, include:
-   - A clear, descriptive name
-   - Detailed instructions for proper form
-   - Specific number of sets and reps
-   - Frequency (how many times per day)
-   - Any necessary precautions or modifications
-7. The reasoning should explain:
-   - Why this specific focus area was chosen
-   - How each exercise addresses the main diagnosis
-   - What improvements to expect after one week
-8. The next_phase_focus should explain which of the remaining aspects (pain/mobility/strength) should be addressed in the next phase and why
-9. Do not include any explanatory text before or after the JSON object
-10. All strings must be properly escaped
-11. The response must start with { and end with }
-
-Remember: This is a one-week treatment plan with exactly 3 exercises. The patient will return for re-evaluation after completing this phase, at which point we can address the other aspects of their condition. Choose exercises that are appropriate for the patient's current level and that will provide a good foundation for future progress.
-""" 
\ No newline at end of file
+3. Do not include any explanatory text before or after the JSON object
+4. All strings must be properly escaped
+5. The response must start with { and end with }
+"""
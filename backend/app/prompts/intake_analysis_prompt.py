@@ -38,8 +38,6 @@ You are a medical assistant helping a physical therapist analyze patient data. B
 
 7. "reasoning": A string providing overall clinical reasoning including why these treatments were chosen.
 
-8. "session_id": A string containing the session ID provided in the input variables.
-
 Patient Data:
 Basic Information (Questions 1-14):
 1. Primary Complaint: {primary_complaint}
@@ -66,9 +64,7 @@ Additional Information (Questions 15-21):
 20. Recent Fever/Infection: {detail_pain_fever}
 21. Bowel/Bladder Changes: {detail_pain_serious}
 
-Session ID: {session_id}
-
-Respond with a valid JSON object adhering strictly to this schema. Ensure that:
+Ensure that:
 - The "differentiation_probabilities" field includes "muscle-related" only if "serious_vs_treatable" is "treatable" and is sorted by probability in descending order.
 - The "big_muscle_group" field contains a **specific** muscle group rather than a general term like "shoulder muscles" or "leg muscles."
 - The "other_probabilistic_diagnosis" field is sorted by probability in descending order.
@@ -79,5 +75,9 @@ Respond with a valid JSON object adhering strictly to this schema. Ensure that:
 - Treatment recommendations should be specific, actionable, and appropriate for the diagnosis.
 - Treatment priorities should reflect the urgency and importance of each intervention.
 - The reasoning should explain the connection between the diagnosis and the chosen treatments.
-- Include the session_id in the response exactly as provided.
+
+{format_instructions}
 """
+
+# Only sent when the model is not asked for schema-constrained (tool call) output
+INTAKE_ANALYSIS_FORMAT_INSTRUCTIONS = """Respond with a single valid JSON object adhering strictly to the schema above, with no markdown formatting and no text before or after it."""
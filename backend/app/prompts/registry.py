@@ -0,0 +1,180 @@
+"""
+Prompt registry: every LLM prompt, compiled once at import time.
+
+Compiling splits a template into lines of (literal, field) segments so
+rendering is a single join rather than a str.format over the whole template.
+It also lets optional fields drop out: a line whose only placeholder is an
+optional field that is None (e.g. intake questions 15-21 that do not apply
+to the patient's pain location) is omitted instead of sending "None" to the
+model.
+
+Each prompt carries its own token budget: the rendered input is counted with
+a cached tiktoken encoding and rejected if it exceeds max_input_tokens, and
+max_output_tokens clamps settings.MAX_TOKENS for that endpoint.
+"""
+from enum import Enum
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+import logging
+
+from ..core.config import settings
+from .final_analysis_prompt import FINAL_ANALYSIS_PROMPT, FINAL_ANALYSIS_FORMAT_INSTRUCTIONS
+from .intake_analysis_prompt import INTAKE_ANALYSIS_PROMPT, INTAKE_ANALYSIS_FORMAT_INSTRUCTIONS
+from .treatment_plan_prompt import TREATMENT_PLAN_PROMPT, TREATMENT_PLAN_FORMAT_INSTRUCTIONS
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - falls back to a character estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Intake questions that may legitimately be left unanswered
+INTAKE_OPTIONAL_FIELDS = frozenset({
+    "pain_comment",
+    "detail_pain_activity",
+    "detail_pain_timing",
+    "detail_pain_accident",
+    "detail_pain_position",
+    "detail_pain_lowerbody",
+    "detail_pain_fever",
+    "detail_pain_serious",
+})
+
+
+class PromptBudgetExceeded(ValueError):
+    """Raised when a rendered prompt is over its input token budget."""
+
+
+@lru_cache(maxsize=8)
+def _encoding(model_name: str):
+    """Load the model's encoding once; None if tiktoken is missing or cannot load it."""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The encoding file is downloaded on first use; estimate rather than fail requests
+        logger.warning(f"Could not load tiktoken encoding for {model_name}: {str(e)}")
+        return None
+
+
+def count_tokens(text: str, model_name: Optional[str] = None) -> int:
+    """Count tokens the way the configured model will."""
+    encoding = _encoding(model_name or settings.LLM_MODEL_NAME)
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text))
+
+
+def render_value(value: Any) -> str:
+    """Render a prompt variable compactly: enum values, comma-joined lists."""
+    if value is None:
+        return "not provided"
+    if isinstance(value, Enum):
+        return str(value.value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return ", ".join(render_value(item) for item in value) or "none"
+    return str(value)
+
+
+# A compiled line: its (literal, field-or-None) segments and the optional
+# field that, when None, removes the whole line
+_Line = Tuple[List[Tuple[str, Optional[str]]], Optional[str]]
+
+
+class CompiledPrompt:
+    """
+    A prompt template parsed once, with its format instructions and token budgets.
+    """
+    def __init__(
+        self,
+        name: str,
+        template: str,
+        format_instructions: str = "",
+        optional_fields: FrozenSet[str] = frozenset(),
+        max_input_tokens: int = 4000,
+        max_output_tokens: int = 1500,
+    ):
+        self.name = name
+        self.template = template
+        self.format_instructions = format_instructions
+        self.optional_fields = optional_fields
+        self.max_input_tokens = max_input_tokens
+        self.max_output_tokens = max_output_tokens
+        self._lines = self._compile(template)
+        self.fields = frozenset(
+            field for segments, _ in self._lines for _, field in segments if field is not None
+        )
+
+    def _compile(self, template: str) -> List[_Line]:
+        lines = []
+        for line in template.split("\n"):
+            segments = [(literal, field) for literal, field, _, _ in Formatter().parse(line)]
+            fields = [field for _, field in segments if field is not None]
+            droppable = fields[0] if len(fields) == 1 and fields[0] in self.optional_fields else None
+            lines.append((segments, droppable))
+        return lines
+
+    @property
+    def output_tokens(self) -> int:
+        """Completion token limit for this prompt: the global limit, clamped."""
+        return min(settings.MAX_TOKENS, self.max_output_tokens)
+
+    def render(self, variables: Dict[str, Any], structured: bool = False) -> str:
+        """
+        Render the prompt. Format instructions are included unless the
+        response is requested as a structured tool call.
+        """
+        values = dict(variables)
+        values["format_instructions"] = "" if structured else self.format_instructions
+        out = []
+        for segments, droppable in self._lines:
+            if droppable is not None and values.get(droppable) is None:
+                continue
+            out.append("".join(
+                literal if field is None else literal + render_value(values[field])
+                for literal, field in segments
+            ))
+        return "\n".join(out)
+
+    def check_budget(self, rendered: str) -> int:
+        """Count the rendered prompt's tokens, raising if it is over budget."""
+        tokens = count_tokens(rendered)
+        if tokens > self.max_input_tokens:
+            raise PromptBudgetExceeded(
+                f"Prompt '{self.name}' is {tokens} tokens, over its budget of {self.max_input_tokens}"
+            )
+        return tokens
+
+
+INTAKE_ANALYSIS = CompiledPrompt(
+    "intake_analysis",
+    INTAKE_ANALYSIS_PROMPT,
+    INTAKE_ANALYSIS_FORMAT_INSTRUCTIONS,
+    optional_fields=INTAKE_OPTIONAL_FIELDS,
+    max_input_tokens=settings.INTAKE_ANALYSIS_MAX_INPUT_TOKENS,
+    max_output_tokens=settings.INTAKE_ANALYSIS_MAX_OUTPUT_TOKENS,
+)
+
+FINAL_ANALYSIS = CompiledPrompt(
+    "final_analysis",
+    FINAL_ANALYSIS_PROMPT,
+    FINAL_ANALYSIS_FORMAT_INSTRUCTIONS,
+    max_input_tokens=settings.FINAL_ANALYSIS_MAX_INPUT_TOKENS,
+    max_output_tokens=settings.FINAL_ANALYSIS_MAX_OUTPUT_TOKENS,
+)
+
+TREATMENT_PLAN = CompiledPrompt(
+    "treatment_plan",
+    TREATMENT_PLAN_PROMPT,
+    TREATMENT_PLAN_FORMAT_INSTRUCTIONS,
+    max_input_tokens=settings.TREATMENT_PLAN_MAX_INPUT_TOKENS,
+    max_output_tokens=settings.TREATMENT_PLAN_MAX_OUTPUT_TOKENS,
+)
+
+PROMPTS = {prompt.name: prompt for prompt in (INTAKE_ANALYSIS, FINAL_ANALYSIS, TREATMENT_PLAN)}
@@ -1,11 +1,9 @@
 """
 Treatment Plan Prompt
 
-IMPORTANT: This prompt uses double curly braces {{}} for JSON examples to ensure proper string formatting.
-The LLM service expects a single line of JSON with no indentation.
-
-Example format:
-{{"field": "value", "array": [{{"nested": "value"}}]}}
+The JSON formatting instructions live in TREATMENT_PLAN_FORMAT_INSTRUCTIONS and are
+substituted into {format_instructions} only when the LLM service falls back to
+plain-text JSON output. They are inserted as a value, so their braces are not escaped.
 
 See LLM service documentation for more details about JSON formatting requirements.
 """
@@ -17,7 +15,7 @@ Patient Information:
 
 The treatment plan should include:
 1. Treatment focus (e.g., pain management, strength building, flexibility)
-2. Specific treatment recommendations with:
+2. Exactly 3 specific treatment recommendations with:
    - Exercise name
    - Description
    - Sets and reps
@@ -27,13 +25,14 @@ The treatment plan should include:
 3. Reasoning for the treatment approach
 4. Focus for the next phase of treatment
 
-Your response must be a single line of valid JSON with no formatting or indentation. Example:
-{{"treatment_focus":"pain management and mobility","treatment_recommendations":[{{"name":"Neck Retraction Exercise","description":"Gentle exercise to improve neck posture and reduce strain","sets":"3","reps":"10","frequency":"Twice daily","duration":"2 weeks","precautions":"Stop if pain increases. Keep movements slow and controlled."}}],"reasoning":"This treatment plan focuses on reducing pain and improving neck mobility through gentle exercises.","next_phase_focus":"strength building"}}
+{format_instructions}"""
+
+# Only sent when the model is not asked for schema-constrained (tool call) output
+TREATMENT_PLAN_FORMAT_INSTRUCTIONS = """Your response must be a single line of valid JSON with no formatting or indentation. Example:
+{"treatment_focus":"pain management and mobility","treatment_recommendations":[{"name":"Neck Retraction Exercise","description":"Gentle exercise to improve neck posture and reduce strain","sets":"3","reps":"10","frequency":"Twice daily","duration":"2 weeks","precautions":"Stop if pain increases. Keep movements slow and controlled."}],"reasoning":"This treatment plan focuses on reducing pain and improving neck mobility through gentle exercises.","next_phase_focus":"strength building"}
 
 Required fields:
 - treatment_focus (string)
 - treatment_recommendations (array of exactly 3 objects with: name, description, sets, reps, frequency, duration, precautions)
 - reasoning (string)
-- next_phase_focus (string)
-
-Session ID: {session_id}""" 
\ No newline at end of file
+- next_phase_focus (string)"""
\ No newline at end of file
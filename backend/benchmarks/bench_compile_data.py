@@ -0,0 +1,130 @@
+"""
+Benchmark: scripts/compile_data.py over a synthetic multi-GB corpus.
+
+Builds a corpus shaped like data/raw/*.jsonl: the recorded intakes,
+treatment plans and feedback, replayed under fresh session ids, with
+follow-up records for a share of the sessions and a few exact duplicate
+lines. It is compiled once from scratch. Then --append-share more data is
+appended and compiled incrementally. Reported for each run: wall time,
+throughput, peak RSS and output size.
+
+Compile runs in a child process per run, so peak RSS is that run's own.
+
+Usage (from the repository root):
+    python backend/benchmarks/bench_compile_data.py [--gb 2] [--workdir /tmp/compile_bench] [--keep]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+DATA_RAW_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "raw")
+COMPILE_SCRIPT = os.path.join(os.path.dirname(__file__), "..", "scripts", "compile_data.py")
+
+FOLLOW_UPS = {
+    "treatment_plans.jsonl": 0.5,
+    "feedback.jsonl": 0.2,
+    "final_analysis_responses.jsonl": 0.3,
+}
+DUPLICATE_SHARE = 0.01
+
+
+def templates():
+    """Recorded raw records per file, used as the shapes to replay."""
+    out = {}
+    for name in ["user_responses.jsonl", *FOLLOW_UPS]:
+        with open(os.path.join(DATA_RAW_DIR, name)) as f:
+            out[name] = [json.loads(line) for line in f if line.strip()]
+    return out
+
+
+def generate(raw_dir, target_bytes, shapes, seed):
+    """Append sessions to raw_dir until about target_bytes have been written."""
+    rng = random.Random(seed)
+    files = {name: open(os.path.join(raw_dir, name), "a") for name in shapes}
+    written = 0
+    sessions = 0
+    try:
+        while written < target_bytes:
+            session_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            sessions += 1
+            for name, share in [("user_responses.jsonl", 1.0), *FOLLOW_UPS.items()]:
+                if rng.random() >= share:
+                    continue
+                record = dict(rng.choice(shapes[name]), session_id=session_id)
+                line = json.dumps(record) + "\n"
+                repeats = 2 if rng.random() < DUPLICATE_SHARE else 1
+                files[name].write(line * repeats)
+                written += len(line) * repeats
+    finally:
+        for f in files.values():
+            f.close()
+    return written, sessions
+
+
+def run_compile(raw_dir, processed_dir, full):
+    """Compile in a child process; returns (seconds, peak RSS MB, its output line)."""
+    command = [sys.executable, COMPILE_SCRIPT, "--raw-dir", raw_dir, "--processed-dir", processed_dir]
+    if full:
+        command.append("--full")
+    started = time.perf_counter()
+    result = subprocess.run(command, check=True, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return elapsed, peak_kb / 1024, result.stdout.strip()
+
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--gb", type=float, default=2.0, help="size of the initial corpus")
+    parser.add_argument("--append-share", type=float, default=0.05, help="appended data, as a share of --gb")
+    parser.add_argument("--workdir", default="/tmp/compile_bench")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="keep the generated corpus and output")
+    args = parser.parse_args()
+
+    raw_dir = os.path.join(args.workdir, "raw")
+    processed_dir = os.path.join(args.workdir, "processed")
+    shutil.rmtree(args.workdir, ignore_errors=True)
+    os.makedirs(raw_dir)
+    shapes = templates()
+
+    try:
+        started = time.perf_counter()
+        written, sessions = generate(raw_dir, int(args.gb * 1024 ** 3), shapes, args.seed)
+        print(f"Generated {written / 1024 ** 2:.0f} MB, {sessions} sessions in {time.perf_counter() - started:.0f}s")
+
+        elapsed, peak_mb, output = run_compile(raw_dir, processed_dir, full=True)
+        print(f"full:        {elapsed:7.1f}s  {written / 1024 ** 2 / elapsed:6.1f} MB/s  peak RSS {peak_mb:6.0f} MB")
+        print(f"             {output}")
+
+        appended, _ = generate(raw_dir, int(args.gb * args.append_share * 1024 ** 3), shapes, args.seed + 1)
+        elapsed, peak_mb, output = run_compile(raw_dir, processed_dir, full=False)
+        print(f"incremental: {elapsed:7.1f}s  {appended / 1024 ** 2 / elapsed:6.1f} MB/s  peak RSS {peak_mb:6.0f} MB "
+              f"({appended / 1024 ** 2:.0f} MB appended)")
+        print(f"             {output}")
+
+        shards = os.path.join(processed_dir, "shards")
+        print(f"Output: {directory_size(shards) / 1024 ** 2:.0f} MB of shards, "
+              f"{directory_size(processed_dir) / 1024 ** 2:.0f} MB including compile state")
+    finally:
+        if not args.keep:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark: IntakeFormData validation throughput on one core.
+
+Generates --count synthetic intakes covering every pain location combination
+the conditional questions (15-21) depend on, a --invalid-share of them
+missing a required conditional answer. Each is validated the way a request
+is handled, in a single thread:
+
+- dict: model_validate on the decoded body, then as_dict (what FastAPI
+  and analyze_intake_form do)
+- json: model_validate_json on the raw body, then as_dict
+- dump: as dict, but serialized with model_dump instead, for comparison
+
+Reports intakes per second per path against --target.
+
+Usage (from the repository root):
+    python backend/benchmarks/bench_intake_validation.py [--count 100000] [--target 100000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from pydantic import ValidationError  # noqa: E402
+
+from backend.app.models.intake import (  # noqa: E402
+    ActivityLevel, BowelBladderChange, IntakeFormData, PainDuration, PainFrequency, PainLocation,
+    PainOnset, PainProgression, PainTime, PainTimeAMPM, PositionChangePain, YesNo,
+)
+
+NATURES = ("dull", "sharp", "burning", "aching", "throbbing", "tingling")
+SYMPTOMS = ("none", "fever", "weight_loss", "numbness", "night_pain")
+TRIGGERS = ("sitting", "standing", "lifting", "walking", "bending")
+RELIEVERS = ("rest", "heat", "ice", "stretching", "medication")
+CONDITIONAL = {
+    "detail_pain_activity": ActivityLevel,
+    "detail_pain_timing": PainTimeAMPM,
+    "detail_pain_accident": YesNo,
+    "detail_pain_position": PositionChangePain,
+    "detail_pain_lowerbody": YesNo,
+    "detail_pain_fever": YesNo,
+    "detail_pain_serious": BowelBladderChange,
+}
+
+
+def values(enum):
+    return [member.value for member in enum]
+
+
+def sample(rng, options, most=3):
+    return rng.sample(list(options), rng.randint(1, min(most, len(options))))
+
+
+def synthetic_intake(rng, invalid):
+    locations = sample(rng, values(PainLocation), most=3)
+    # Lower back alone is the case with the most conditional questions
+    if rng.random() < 0.3:
+        locations = ["lower_back"]
+    intake = {
+        "primary_complaint": rng.choice(["back hurts", "neck is stiff", "knee gives way"]) + f" #{rng.randrange(1000)}",
+        "pain_location": locations,
+        "pain_nature": sample(rng, NATURES),
+        "pain_severity": rng.randint(0, 10),
+        "pain_frequency": rng.choice(values(PainFrequency)),
+        "pain_timing": sample(rng, values(PainTime)),
+        "pain_duration": rng.choice(values(PainDuration)),
+        "pain_onset": rng.choice(values(PainOnset)),
+        "pain_progression": rng.choice(values(PainProgression)),
+        "serious_symptom": sample(rng, SYMPTOMS, most=2),
+        "pain_movement": rng.choice(["bending forward", "turning the head", "climbing stairs"]),
+        "pain_trigger": sample(rng, TRIGGERS),
+        "pain_reliever": sample(rng, RELIEVERS),
+        "pain_comment": rng.choice([None, "worse in the morning"]),
+    }
+    # Answer every conditional question; the model only checks the required ones
+    for name, enum in CONDITIONAL.items():
+        intake[name] = rng.choice(values(enum))
+    if invalid:
+        required = ["detail_pain_activity"] if "other" not in locations else []
+        if "lower_back" in locations or "neck" in locations:
+            required.append("detail_pain_fever")
+        if locations == ["lower_back"]:
+            required.append("detail_pain_serious")
+        if required:
+            intake[rng.choice(required)] = None
+    return intake
+
+
+def run(label, validate, serialize, inputs, target):
+    valid = invalid = 0
+    started = time.perf_counter()
+    for item in inputs:
+        try:
+            serialize(validate(item))
+            valid += 1
+        except ValidationError:
+            invalid += 1
+    elapsed = time.perf_counter() - started
+    rate = len(inputs) / elapsed
+    verdict = "ok" if rate >= target else "BELOW TARGET"
+    print(f"{label:>5}: {rate:10,.0f} intakes/s  {elapsed * 1e6 / len(inputs):6.1f} us each  "
+          f"({valid} valid, {invalid} rejected)  {verdict}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--invalid-share", type=float, default=0.05)
+    parser.add_argument("--target", type=float, default=100_000, help="intakes per second per core")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    intakes = [synthetic_intake(rng, rng.random() < args.invalid_share) for _ in range(args.count)]
+    bodies = [json.dumps(intake).encode() for intake in intakes]
+
+    # Warm up pydantic's validators before timing
+    for intake in intakes[:1000]:
+        try:
+            IntakeFormData.model_validate(intake)
+        except ValidationError:
+            pass
+
+    print(f"{args.count} intakes, target {args.target:,.0f}/s per core")
+    run("dict", IntakeFormData.model_validate, IntakeFormData.as_dict, intakes, args.target)
+    run("json", IntakeFormData.model_validate_json, IntakeFormData.as_dict, bodies, args.target)
+    run("dump", IntakeFormData.model_validate, IntakeFormData.model_dump, intakes, args.target)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Micro-benchmark: JSON extraction from LLM responses.
+
+Compares the legacy regex cleanup chain that used to live in
+LLMService.generate_response with core/json_extract.py, over the real
+responses recorded in data/raw/*.jsonl. Each response is replayed in the
+shapes the model actually produces: bare, pretty-printed, and wrapped in a
+```json fence with surrounding prose.
+
+Usage (from the repository root):
+    python backend/benchmarks/bench_json_extract.py [--repeat 2000]
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from backend.app.core.json_extract import extract_json  # noqa: E402
+
+DATA_RAW_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "raw")
+RESPONSE_FIELDS = ("analysis_result", "treatment_plan")
+
+
+def load_responses():
+    """Collect every recorded LLM response object from the raw JSONL files."""
+    responses = []
+    for path in sorted(glob.glob(os.path.join(DATA_RAW_DIR, "*.jsonl"))):
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                for field in RESPONSE_FIELDS:
+                    value = record.get(field)
+                    if isinstance(value, str):
+                        value = json.loads(value)
+                    if isinstance(value, dict):
+                        responses.append(value)
+    return responses
+
+
+def shapes(response):
+    """Render a response the ways the LLM returns it."""
+    compact = json.dumps(response)
+    pretty = json.dumps(response, indent=2)
+    return [
+        compact,
+        pretty,
+        f"Here is the analysis:\n```json\n{pretty}\n```\nLet me know if you need anything else.",
+    ]
+
+
+def legacy_extract(content):
+    """The regex chain formerly in LLMService.generate_response (logging removed)."""
+    content = content.strip()
+    if content.startswith('```json'):
+        content = content[7:]
+    elif content.startswith('```'):
+        content = content[3:]
+    if content.endswith('```'):
+        content = content[:-3]
+    content = re.sub(r'^[^{]*', '', content)
+    content = re.sub(r'[^}]*$', '', content)
+    content = re.sub(r'^\s+', '', content, flags=re.MULTILINE)
+    content = re.sub(r'\s+', ' ', content)
+    content = content.strip()
+    if not content.startswith('{'):
+        content = '{' + content
+    if not content.endswith('}'):
+        content = content + '}'
+    # The legacy path parsed twice: json.loads, then output_parser.parse
+    json.loads(content)
+    return json.loads(content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000, help="Passes over the corpus per implementation")
+    args = parser.parse_args()
+
+    responses = load_responses()
+    cases = [(text, response) for response in responses for text in shapes(response)]
+    corpus = [text for text, _ in cases]
+    total_bytes = sum(len(text) for text in corpus)
+    print(f"{len(responses)} recorded responses, {len(corpus)} variants, {total_bytes / 1024:.1f} KiB")
+
+    # Sanity check: the extractor recovers every recorded response exactly
+    for text, expected in cases:
+        assert extract_json(text) == expected
+
+    for name, fn in (("legacy regex chain", legacy_extract), ("json_extract", extract_json)):
+        def run():
+            for text in corpus:
+                try:
+                    fn(text)
+                except ValueError:
+                    pass
+        seconds = min(timeit.repeat(run, number=max(1, args.repeat // 10), repeat=10)) * 10 / args.repeat
+        per_call = seconds / len(corpus) * 1e6
+        throughput = total_bytes / seconds / 1024 / 1024
+        print(f"{name:>20}: {per_call:8.1f} us/response  {throughput:7.1f} MiB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: when the router launches hedged LLM attempts, and what each call costs.
+
+Runs --calls calls through an LLMRouter over fake backends that answer after
+--latency seconds, hedging after --hedge-delay seconds with up to
+--max-hedges extra attempts per call. Records when each attempt started,
+relative to the call, and reports the median start offset per attempt and
+attempts per call.
+
+Sanity check: attempts are staggered, one hedge per hedge delay, never a
+burst of duplicates at the first deadline. Each hedge has to start at least
+one hedge delay after the attempt before it.
+
+Usage (from the repository root):
+    python backend/benchmarks/bench_llm_hedging.py [--max-hedges 3] [--latency 1.0] [--hedge-delay 0.2]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+from backend.app.core.fake_llm import FakeChatModel  # noqa: E402
+from backend.app.core.llm_router import Backend, LLMRouter  # noqa: E402
+
+# Slack for event loop scheduling when comparing start offsets
+TOLERANCE = 0.02
+
+
+class RecordingFakeChatModel(FakeChatModel):
+    """FakeChatModel that records the monotonic time each attempt starts."""
+    def __init__(self, starts, **kwargs):
+        super().__init__(**kwargs)
+        self.starts = starts
+
+    async def ainvoke(self, messages, **kwargs):
+        self.starts.append(time.monotonic())
+        return await super().ainvoke(messages, **kwargs)
+
+
+async def one_call(router, starts):
+    """Start offsets, in seconds from the call, of each of its attempts."""
+    starts.clear()
+    started = time.monotonic()
+    await router.ainvoke([HumanMessage(content="serious_vs_treatable")], max_tokens=100)
+    return [start - started for start in starts]
+
+
+async def run(args):
+    starts = []
+    backends = [
+        Backend(f"fake-{i}", RecordingFakeChatModel(starts, latency=args.latency), timeout=10 * args.latency)
+        for i in range(args.backends)
+    ]
+    router = LLMRouter(
+        backends,
+        hedge_min_delay=args.hedge_delay,
+        hedge_default_delay=args.hedge_delay,
+        # Keep the fixed default delay for every call
+        hedge_min_samples=args.calls + 1,
+        max_hedges=args.max_hedges,
+    )
+    return [await one_call(router, starts) for _ in range(args.calls)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=5)
+    parser.add_argument("--backends", type=int, default=1, help="fake backends (hedges go to the next one)")
+    parser.add_argument("--max-hedges", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds per fake LLM call")
+    parser.add_argument("--hedge-delay", type=float, default=0.2, help="seconds before each hedge")
+    args = parser.parse_args()
+
+    offsets = asyncio.run(run(args))
+    for call in offsets:
+        for previous, start in zip(call, call[1:]):
+            assert start - previous >= args.hedge_delay - TOLERANCE, f"hedges not staggered: {call}"
+
+    attempts = max(len(call) for call in offsets)
+    print(f"{args.calls} calls, fake latency {args.latency}s, hedge delay {args.hedge_delay}s, "
+          f"max hedges {args.max_hedges}")
+    print(f"attempts per call: {statistics.mean(len(call) for call in offsets):.1f}")
+    for i in range(attempts):
+        started = [call[i] for call in offsets if len(call) > i]
+        label = "first" if i == 0 else f"hedge {i}"
+        print(f"{label:>8}: starts at {statistics.median(started) * 1000:7.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
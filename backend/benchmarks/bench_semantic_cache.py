@@ -0,0 +1,172 @@
+"""
+Benchmark: semantic cache hit rate and lookup latency for intake analyses.
+
+Replays the intakes recorded in data/raw/user_responses.jsonl through
+core/semantic_cache.py in arrival order (look up, then store on a miss) and
+reports the hit rate per similarity threshold, next to the exact-match hit
+rate the prompt-level cache would get on the same stream. "wrong" counts hits
+that returned the analysis of a different intake, "wrong dx" those of them
+whose serious vs treatable or main diagnosis differs from the intake's own:
+pick SEMANTIC_CACHE_THRESHOLD where that is zero.
+
+The recorded corpus is small, so --variants adds reworded copies of each
+intake: the same structured answers with the free text edited the way
+patients restate a complaint (dropped words, reordering, typos, filler).
+Lookup latency is measured separately against an index padded to --size
+entries.
+
+Usage (from the repository root):
+    python backend/benchmarks/bench_semantic_cache.py [--variants 5] [--size 10000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from backend.app.core.semantic_cache import IGNORED_FIELDS, SemanticCache, TEXT_FIELDS, faiss  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "raw", "user_responses.jsonl")
+# Free-text fields of the older record format, in addition to the current ones
+LEGACY_TEXT_FIELDS = ("red_flag_details",)
+FILLERS = ("really", "quite", "a bit", "kind of", "lately", "for a while now")
+THRESHOLDS = (0.99, 0.98, 0.97, 0.95, 0.9, 0.85, 0.8, 0.7)
+
+
+def load_corpus():
+    """(intake, analysis) pairs from the recorded responses."""
+    records = []
+    with open(CORPUS_PATH) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            analysis = record.get("analysis_result")
+            if isinstance(analysis, str):
+                analysis = json.loads(analysis)
+            if record.get("intake_data") and analysis:
+                records.append((record["intake_data"], analysis))
+    return records
+
+
+def reword(text, rng):
+    """Restate free text: drop, swap, misspell or pad a few words."""
+    words = text.split()
+    if len(words) > 3 and rng.random() < 0.5:
+        del words[rng.randrange(len(words))]
+    if len(words) > 2 and rng.random() < 0.3:
+        i = rng.randrange(len(words) - 1)
+        words[i], words[i + 1] = words[i + 1], words[i]
+    if words and rng.random() < 0.4:
+        i = rng.randrange(len(words))
+        word = words[i]
+        if len(word) > 3:
+            j = rng.randrange(1, len(word) - 1)
+            words[i] = word[:j] + word[j + 1] + word[j] + word[j + 2:]
+    if rng.random() < 0.4:
+        words.insert(rng.randrange(len(words) + 1), rng.choice(FILLERS))
+    return " ".join(words)
+
+
+def stream(records, variants, seed):
+    """Original intakes followed by reworded variants, shuffled like real arrivals."""
+    rng = random.Random(seed)
+    text_fields = TEXT_FIELDS + LEGACY_TEXT_FIELDS
+    # The corpus has repeated submissions; intakes identical but for the
+    # session_id (which the cache ignores) share a source
+    first_seen = {}
+    sources = [
+        first_seen.setdefault(json.dumps({k: v for k, v in intake.items() if k not in IGNORED_FIELDS}, sort_keys=True), i)
+        for i, (intake, _) in enumerate(records)
+    ]
+    out = [(intake, analysis, sources[i]) for i, (intake, analysis) in enumerate(records)]
+    for i, (intake, analysis) in enumerate(records):
+        for _ in range(variants):
+            variant = dict(intake)
+            for field in text_fields:
+                if isinstance(variant.get(field), str) and variant[field]:
+                    variant[field] = reword(variant[field], rng)
+            out.append((variant, analysis, sources[i]))
+    rng.shuffle(out)
+    return out
+
+
+def clinical_answer(analysis):
+    """The parts of an analysis a wrong hit must not change: serious vs treatable and the main diagnosis."""
+    main = analysis.get("main_diagnosis") or {}
+    return (
+        (analysis.get("serious_vs_treatable") or {}).get("diagnosis"),
+        main.get("diagnosis"),
+        main.get("icd10_code"),
+    )
+
+
+def replay(intakes, threshold):
+    """
+    Hit rate, how many hits returned another source intake's analysis, and
+    how many of those changed its serious vs treatable or main diagnosis.
+    """
+    cache = SemanticCache(threshold=threshold, text_fields=TEXT_FIELDS + LEGACY_TEXT_FIELDS)
+    wrong = wrong_diagnosis = 0
+    for intake, analysis, source in intakes:
+        cached = cache.lookup(intake)
+        if cached is None:
+            cache.add(intake, {"source": source, "analysis": analysis})
+        elif cached[0]["source"] != source:
+            wrong += 1
+            wrong_diagnosis += clinical_answer(cached[0]["analysis"]) != clinical_answer(analysis)
+    return cache.stats(), wrong, wrong_diagnosis
+
+
+def exact_hits(intakes):
+    seen, hits = set(), 0
+    for intake, _, _ in intakes:
+        key = json.dumps(intake, sort_keys=True)
+        hits += key in seen
+        seen.add(key)
+    return hits
+
+
+def lookup_latency(records, size, seed, lookups=1000):
+    rng = random.Random(seed)
+    cache = SemanticCache(max_entries=size + 1, text_fields=TEXT_FIELDS + LEGACY_TEXT_FIELDS)
+    started = time.perf_counter()
+    for n in range(size):
+        intake, analysis = records[n % len(records)]
+        padded = dict(intake, primary_complaint=f"{intake.get('primary_complaint', '')} #{n}")
+        cache.add(padded, analysis)
+    build = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(lookups):
+        intake, _ = rng.choice(records)
+        cache.lookup(dict(intake, primary_complaint=reword(intake.get("primary_complaint", ""), rng)))
+    return build / size, (time.perf_counter() - started) / lookups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--variants", type=int, default=5, help="reworded copies per recorded intake")
+    parser.add_argument("--size", type=int, default=10000, help="index size for the latency run")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    records = load_corpus()
+    intakes = stream(records, args.variants, args.seed)
+    print(f"{len(records)} recorded intakes, {len(intakes)} lookups, index backend: "
+          f"{'faiss' if faiss is not None else 'numpy'}")
+    print(f"exact-match hit rate: {exact_hits(intakes) / len(intakes):.1%}")
+    print(f"{'threshold':>10} {'hit rate':>9} {'wrong':>6} {'wrong dx':>9} {'near miss':>10} {'avg ms':>7}")
+    for threshold in THRESHOLDS:
+        stats, wrong, wrong_diagnosis = replay(intakes, threshold)
+        print(f"{threshold:>10} {stats['hit_ratio']:>9.1%} {wrong:>6} {wrong_diagnosis:>9} "
+              f"{stats['near_misses']:>10} {stats['avg_lookup_ms']:>7.3f}")
+
+    add_s, lookup_s = lookup_latency(records, args.size, args.seed)
+    print(f"\n{args.size} entries: add {add_s * 1e6:.0f} us, lookup {lookup_s * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Benchmark: throughput of the gunicorn/uvicorn server at each worker and concurrency setting.
+
+For every combination of --workers, --llm-concurrency (LLM calls per worker)
+and --servers (event loop/HTTP parser), starts the server as production does
+(gunicorn -c python:backend.app.core.server) with the fake LLM backend
+answering after --llm-latency seconds, then keeps --clients concurrent
+keep-alive clients posting distinct intakes to /api/intake_analysis/ for
+--duration seconds. Reports per setting: requests per second, p50/p95/p99
+latency, and non-200 responses.
+
+The LLM cache is off so every request reaches the (fake) LLM. Without
+DATABASE_URL a throwaway SQLite database is used (needs aiosqlite); profile
+against Postgres for numbers that include real DB commits.
+
+Usage (from the repository root):
+    python backend/benchmarks/bench_server_profile.py [--workers 1,2,4] [--llm-concurrency 8,32]
+        [--servers asyncio/h11,uvloop/httptools] [--clients 64] [--duration 15] [--llm-latency 0.5]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+INTAKE = {
+    "primary_complaint": "lower back hurts",
+    "pain_location": ["lower_back"],
+    "pain_nature": ["dull"],
+    "pain_severity": 5,
+    "pain_frequency": "constant",
+    "pain_timing": ["morning"],
+    "pain_duration": "1_4_weeks",
+    "pain_onset": "gradually",
+    "pain_progression": "same",
+    "serious_symptom": [],
+    "pain_movement": "bending forward",
+    "pain_trigger": ["sitting"],
+    "pain_reliever": ["rest"],
+    "pain_comment": None,
+    "detail_pain_activity": "medium",
+    "detail_pain_timing": "am",
+    "detail_pain_accident": "no",
+    "detail_pain_position": "no",
+    "detail_pain_lowerbody": "no",
+    "detail_pain_fever": "no",
+    "detail_pain_serious": "no",
+}
+
+
+def csv(cast):
+    return lambda value: [cast(item) for item in value.split(",") if item]
+
+
+def server_env(args, workdir, workers, llm_concurrency, loop, http):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+    env.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(workdir, 'profile.sqlite')}")
+    env.setdefault("OPENAI_API_KEY", "sk-profile-bench")
+    env.pop("LLM_TOTAL_CONCURRENCY", None)
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    env.update({
+        "HOST": "127.0.0.1",
+        "PORT": str(args.port),
+        "WEB_CONCURRENCY": str(workers),
+        "LLM_MAX_CONCURRENCY": str(llm_concurrency),
+        "SERVER_LOOP": loop,
+        "SERVER_HTTP": http,
+        "LLM_BACKENDS": "fake",
+        "LLM_FAKE_LATENCY": str(args.llm_latency),
+        "LLM_CACHE_ENABLED": "false",
+        "LOG_LEVEL": "WARNING",
+    })
+    return env
+
+
+async def wait_ready(client, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with {process.returncode}")
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+async def drive(client, clients, duration):
+    """(latencies of 200 responses, count of other responses) over duration seconds."""
+    latencies, failures = [], 0
+    counter = itertools.count()
+    deadline = time.perf_counter() + duration
+
+    async def one_client():
+        nonlocal failures
+        while time.perf_counter() < deadline:
+            # Distinct complaints, so no two requests share a prompt
+            body = dict(INTAKE, primary_complaint=f"{INTAKE['primary_complaint']} #{next(counter)}")
+            started = time.perf_counter()
+            try:
+                response = await client.post("/api/intake_analysis/", json=body)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                failures += 1
+
+    await asyncio.gather(*(one_client() for _ in range(clients)))
+    return latencies, failures
+
+
+async def profile(args, env):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "python:backend.app.core.server", "backend.app.main:app"],
+        env=env, cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=120) as client:
+            await wait_ready(client, process)
+            await drive(client, args.clients, args.warmup)
+            return await drive(client, args.clients, args.duration)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=csv(int), default=[1, 2, 4])
+    parser.add_argument("--llm-concurrency", type=csv(int), default=[8, 32], help="LLM calls per worker")
+    parser.add_argument("--servers", type=csv(str), default=["asyncio/h11", "uvloop/httptools"], help="loop/http pairs")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15, help="seconds measured per setting")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of unmeasured load first")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake LLM call")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", action="store_true", help="print one JSON object per setting")
+    args = parser.parse_args()
+
+    if not args.json:
+        print(f"{args.clients} clients, {args.duration:.0f}s per setting, fake LLM latency {args.llm_latency}s")
+        print(f"{'workers':>7} {'llm/worker':>10} {'loop/http':>17} {'req/s':>8} {'p50 ms':>8} "
+              f"{'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for workers, llm_concurrency, server in itertools.product(args.workers, args.llm_concurrency, args.servers):
+        loop, http = server.split("/")
+        with tempfile.TemporaryDirectory() as workdir:
+            env = server_env(args, workdir, workers, llm_concurrency, loop, http)
+            latencies, failures = asyncio.run(profile(args, env))
+        latencies.sort()
+        row = {
+            "workers": workers,
+            "llm_concurrency": llm_concurrency,
+            "server": server,
+            "rps": len(latencies) / args.duration,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "mean_ms": statistics.fmean(latencies) * 1000 if latencies else float("nan"),
+            "errors": failures,
+        }
+        if args.json:
+            print(json.dumps({key: round(value, 2) if isinstance(value, float) else value for key, value in row.items()}))
+        else:
+            print(f"{workers:>7} {llm_concurrency:>10} {server:>17} {row['rps']:>8.1f} {row['p50_ms']:>8.0f} "
+                  f"{row['p95_ms']:>8.0f} {row['p99_ms']:>8.0f} {failures:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: worker cold start, i.e. importing backend.app.main and running its startup hooks.
+
+Each run is a fresh interpreter, like a newly booted gunicorn worker. Reported
+(median over --runs): time to import the app, time for the startup hooks
+(DB init, LLM client and tokenizer warm-up, Redis pool), and peak RSS after
+each. With --top N, the N slowest imports by cumulative time are listed from
+python -X importtime.
+
+Without DATABASE_URL a throwaway SQLite database is used (needs aiosqlite);
+without OPENAI_API_KEY a dummy key is set. Building the OpenAI client makes
+no network calls.
+
+Usage (from the repository root):
+    python backend/benchmarks/bench_startup.py [--runs 5] [--top 15] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+CHILD = """
+import asyncio, json, resource, sys, time
+started = time.perf_counter()
+import backend.app.main as main
+imported = time.perf_counter()
+import_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+async def lifecycle():
+    await main.app.router.startup()
+    warmed = time.perf_counter()
+    await main.app.router.shutdown()
+    return warmed
+warmed = asyncio.run(lifecycle())
+with open(sys.argv[1], "w") as f:
+    json.dump({
+        "import_s": imported - started,
+        "startup_s": warmed - imported,
+        "import_rss_mb": import_rss / 1024,
+        "startup_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }, f)
+"""
+
+
+def child_env(workdir):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+    env.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(workdir, 'startup.sqlite')}")
+    env.setdefault("OPENAI_API_KEY", "sk-startup-bench")
+    return env
+
+
+def run_once(env, workdir):
+    # The app's queued JSON logs go to stdout from another thread, so the
+    # measurements come back through a file instead
+    path = os.path.join(workdir, "measurements.json")
+    subprocess.run(
+        [sys.executable, "-c", CHILD, path], env=env, cwd=REPO_ROOT, check=True, capture_output=True, text=True,
+    )
+    with open(path) as f:
+        return json.load(f)
+
+
+def slowest_imports(env, top):
+    """(cumulative seconds, module) of the slowest imports of backend.app.main."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.app.main"],
+        env=env, cwd=REPO_ROOT, check=True, capture_output=True, text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1e6, module.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0, help="list the N slowest imports")
+    parser.add_argument("--json", action="store_true", help="print the medians as one JSON object")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = child_env(workdir)
+        runs = [run_once(env, workdir) for _ in range(args.runs)]
+        medians = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        if args.json:
+            print(json.dumps({key: round(value, 4) for key, value in medians.items()}))
+        else:
+            print(f"median of {args.runs} runs")
+            print(f"import:  {medians['import_s'] * 1000:7.0f} ms  peak RSS {medians['import_rss_mb']:5.0f} MB")
+            print(f"startup: {medians['startup_s'] * 1000:7.0f} ms  peak RSS {medians['startup_rss_mb']:5.0f} MB")
+        if args.top:
+            print(f"\n{'cumulative ms':>13}  module")
+            for seconds, module in slowest_imports(env, args.top):
+                print(f"{seconds * 1000:13.0f}  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Fake OpenAI-compatible chat completions server for load tests, replaying recorded responses.
+
+Serves POST /v1/chat/completions the way the app calls it: plain text,
+forced tool calls (structured output) and streaming. Answers are replayed
+from the JSONL audit records:
+
+- intake analyses from data/raw/user_responses.jsonl and
+  final_analysis_responses.jsonl, those that still validate against
+  AnalysisResult (older records predate some of its fields)
+- treatment plans from data/raw/treatment_plans.jsonl
+
+with the fake backend's canned responses filling in for an empty file.
+
+Every call waits a latency drawn from --latency, one of "constant:S",
+"uniform:A,B", "lognormal:MEDIAN,SIGMA" or "exponential:MEAN" (seconds),
+then fails with the given probabilities: --error-rate answers 500,
+--rate-limit-rate 429, and --hang-rate does not answer for --hang-seconds
+(so client timeouts, hedging and failover kick in). GET /stats returns the
+counts so far.
+
+Usage (from the repository root):
+    python backend/benchmarks/fake_openai_server.py [--port 9100] [--latency lognormal:1.5,0.4]
+        [--error-rate 0.01] [--rate-limit-rate 0] [--hang-rate 0]
+and run the API with OPENAI_API_BASE=http://127.0.0.1:9100/v1.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse, StreamingResponse  # noqa: E402
+from pydantic import ValidationError  # noqa: E402
+
+from backend.app.core.fake_llm import RESPONSES  # noqa: E402
+from backend.app.models.intake import AnalysisResult  # noqa: E402
+from backend.app.models.treatment_plan import TreatmentPlan  # noqa: E402
+
+RAW_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "raw"))
+ANALYSIS_FILES = ("user_responses.jsonl", "final_analysis_responses.jsonl")
+TREATMENT_PLAN_FILES = ("treatment_plans.jsonl",)
+
+# Text prompts carry their format instructions; this key only appears in the intake analysis one
+ANALYSIS_MARKER = "serious_vs_treatable"
+STREAM_CHUNK_CHARS = 24
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """A sampler of seconds for a --latency distribution spec."""
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value]
+    if kind == "constant" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(*values)
+    if kind == "lognormal" and len(values) == 2:
+        median, sigma = values
+        return lambda rng: rng.lognormvariate(math.log(median), sigma)
+    if kind == "exponential" and len(values) == 1:
+        return lambda rng: rng.expovariate(1 / values[0])
+    raise argparse.ArgumentTypeError(f"not a latency distribution: {spec!r}")
+
+
+def load_recorded(files, field: str, model) -> List[Dict[str, Any]]:
+    """Recorded responses in field of the JSONL files that validate against model."""
+    responses = []
+    for name in files:
+        path = os.path.join(RAW_DIR, name)
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                value = record.get(field)
+                if isinstance(value, str):
+                    value = json.loads(value)
+                if not isinstance(value, dict):
+                    continue
+                value.pop("session_id", None)
+                try:
+                    model.model_validate(value)
+                except ValidationError:
+                    continue
+                responses.append(value)
+    return responses
+
+
+class FakeOpenAI:
+    """Picks replayed responses and injects latency and failures."""
+    def __init__(self, args):
+        self.latency = args.latency
+        self.error_rate = args.error_rate
+        self.rate_limit_rate = args.rate_limit_rate
+        self.hang_rate = args.hang_rate
+        self.hang_seconds = args.hang_seconds
+        self.random = random.Random(args.seed)
+        self.responses = {
+            "AnalysisResult": load_recorded(ANALYSIS_FILES, "analysis_result", AnalysisResult)
+            or [RESPONSES["AnalysisResult"]],
+            "TreatmentPlan": load_recorded(TREATMENT_PLAN_FILES, "treatment_plan", TreatmentPlan)
+            or [RESPONSES["TreatmentPlan"]],
+        }
+        self.counts = Counter()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "replayed": {name: len(options) for name, options in self.responses.items()},
+            **self.counts,
+        }
+
+    def pick(self, body: Dict[str, Any]) -> tuple:
+        """(response model name, tool name or None) for a chat completions request."""
+        for tool in body.get("tools") or ():
+            name = tool["function"]["name"]
+            return (name if name in self.responses else "TreatmentPlan"), name
+        text = "\n".join(str(message.get("content") or "") for message in body.get("messages", ()))
+        return ("AnalysisResult" if ANALYSIS_MARKER in text else "TreatmentPlan"), None
+
+    async def failure(self):
+        """A JSONResponse for an injected failure, or None; waits out the latency either way."""
+        await asyncio.sleep(self.latency(self.random))
+        roll = self.random.random()
+        if roll < self.hang_rate:
+            self.counts["hung"] += 1
+            await asyncio.sleep(self.hang_seconds)
+            return error_response(504, "timeout", "Injected hang")
+        roll -= self.hang_rate
+        if roll < self.rate_limit_rate:
+            self.counts["rate_limited"] += 1
+            return error_response(429, "rate_limit_exceeded", "Injected rate limit", {"Retry-After": "1"})
+        roll -= self.rate_limit_rate
+        if roll < self.error_rate:
+            self.counts["errors"] += 1
+            return error_response(500, "server_error", "Injected server error")
+        return None
+
+
+def error_response(status: int, code: str, message: str, headers=None) -> JSONResponse:
+    return JSONResponse(
+        {"error": {"message": message, "type": code, "param": None, "code": code}},
+        status_code=status, headers=headers,
+    )
+
+
+def approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def build_app(fake: FakeOpenAI) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/stats")
+    async def stats():
+        return fake.stats()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        fake.counts["requests"] += 1
+        failed = await fake.failure()
+        if failed is not None:
+            return failed
+
+        name, tool_name = fake.pick(body)
+        fake.counts[name] += 1
+        content = json.dumps(fake.random.choice(fake.responses[name]))
+        prompt = "\n".join(str(message.get("content") or "") for message in body.get("messages", ()))
+        usage = {
+            "prompt_tokens": approx_tokens(prompt),
+            "completion_tokens": approx_tokens(content),
+            "total_tokens": approx_tokens(prompt) + approx_tokens(content),
+        }
+        if tool_name is not None:
+            message = {"role": "assistant", "content": None, "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": tool_name, "arguments": content},
+            }]}
+            finish_reason = "tool_calls"
+        else:
+            message = {"role": "assistant", "content": content}
+            finish_reason = "stop"
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = body.get("model", "fake")
+        if body.get("stream"):
+            return StreamingResponse(
+                stream_chunks(completion_id, model, message, finish_reason), media_type="text/event-stream",
+            )
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": usage,
+        }
+
+    return app
+
+
+async def stream_chunks(completion_id: str, model: str, message: Dict[str, Any], finish_reason: str):
+    def chunk(delta, finish=None):
+        return "data: " + json.dumps({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+        }) + "\n\n"
+
+    if message.get("tool_calls"):
+        call = dict(message["tool_calls"][0], index=0)
+        yield chunk({"role": "assistant", "content": None, "tool_calls": [call]})
+    else:
+        content = message["content"]
+        yield chunk({"role": "assistant", "content": ""})
+        for start in range(0, len(content), STREAM_CHUNK_CHARS):
+            yield chunk({"content": content[start:start + STREAM_CHUNK_CHARS]})
+            await asyncio.sleep(0)
+    yield chunk({}, finish_reason)
+    yield "data: [DONE]\n\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=parse_latency, default="lognormal:1.5,0.4",
+                        help="seconds per call, e.g. constant:0.5, uniform:0.5,2, lognormal:1.5,0.4, exponential:1")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of calls answered 429")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="share of calls not answered for --hang-seconds")
+    parser.add_argument("--hang-seconds", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(args)
+    print(f"replaying {fake.stats()['replayed']} on http://{args.host}:{args.port}/v1", flush=True)
+    uvicorn.run(build_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Load test: patient flows against the API at a target rate, with the LLM replaced by a local fake.
+
+Each scenario is one patient's flow; flows start at --rps (Poisson arrivals,
+open loop, so a slow server does not slow the arrivals down) for --duration
+seconds:
+
+- intake: POST /api/intake_analysis/
+- full_flow: intake, then POST /api/treatment_plan for its session, then
+  POST /api/intake_analysis/feedback
+- stream: POST /api/intake_analysis/stream, read to the final event
+
+Without --base-url, starts fake_openai_server.py (options below are passed
+on to it) and the API as production runs it (gunicorn with
+backend.app.core.server), pointed at the fake through OPENAI_API_BASE, and
+stops both afterwards; its database (unless DATABASE_URL is set) and JSONL
+audit files go to a temporary directory. Otherwise targets the API already
+running there.
+
+Reported: latency p50/p95/p99 per step and per flow, throughput against the
+target, and the fallback rate (default treatment plans, text-output retries,
+hedges and failovers per flow) from the API's /metrics.
+
+Usage (from the repository root):
+    python backend/benchmarks/load_test.py [--scenario full_flow] [--rps 10] [--duration 60]
+        [--latency lognormal:1.5,0.4] [--error-rate 0.02] [--hang-rate 0] [--base-url URL]
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+from bench_intake_validation import synthetic_intake
+from fake_openai_server import parse_latency
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(BENCH_DIR, "..", ".."))
+
+FEEDBACK = ("Very helpful, thanks", "The exercises made it worse", "Diagnosis seems right")
+
+# Answers that trigger the red-flag triage rules; negated for all but --red-flag-share of intakes
+RED_FLAG_NEGATIVES = {
+    "serious_symptom": ["none"],
+    "detail_pain_serious": "no",
+    "detail_pain_fever": "no",
+    "detail_pain_lowerbody": "no",
+}
+
+
+class Flow:
+    """Timings of one flow's steps; a failed step ends the flow."""
+    def __init__(self, client: httpx.AsyncClient, rng: random.Random, red_flag_share: float):
+        self.client = client
+        self.rng = rng
+        self.red_flag_share = red_flag_share
+        self.steps: List[tuple] = []
+        self.failed = False
+
+    async def post(self, step: str, path: str, body: dict) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.post(path, json=body)
+            ok = response.is_success
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.steps.append((step, time.perf_counter() - started, ok))
+        self.failed = self.failed or not ok
+        return response if ok else None
+
+    def intake(self) -> dict:
+        """A valid synthetic intake; only red_flag_share of them have red flags."""
+        body = synthetic_intake(self.rng, invalid=False)
+        if self.rng.random() >= self.red_flag_share:
+            body.update(RED_FLAG_NEGATIVES)
+        return body
+
+
+async def intake(flow: Flow) -> Optional[dict]:
+    response = await flow.post("intake", "/api/intake_analysis/", flow.intake())
+    return None if response is None else response.json()
+
+
+async def full_flow(flow: Flow) -> None:
+    analysis = await intake(flow)
+    if analysis is None:
+        return
+    session_id = analysis["session_id"]
+    if await flow.post("treatment_plan", "/api/treatment_plan", {"session_id": session_id}) is None:
+        return
+    await flow.post("feedback", "/api/intake_analysis/feedback", {
+        "session_id": session_id,
+        "feedback": flow.rng.choice(FEEDBACK),
+        "analysis_result": analysis,
+    })
+
+
+async def stream(flow: Flow) -> None:
+    started = time.perf_counter()
+    ok = False
+    try:
+        async with flow.client.stream(
+            "POST", "/api/intake_analysis/stream", json=flow.intake(),
+        ) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                    if event in ("result", "error"):
+                        ok = event == "result"
+    except httpx.HTTPError:
+        pass
+    flow.steps.append(("stream", time.perf_counter() - started, ok))
+    flow.failed = not ok
+
+
+SCENARIOS = {"intake": intake, "full_flow": full_flow, "stream": stream}
+
+
+async def scrape(client: httpx.AsyncClient) -> Dict[tuple, float]:
+    """Counter samples from /metrics, by (sample name, labels)."""
+    text = (await client.get("/metrics")).text
+    samples = {}
+    for family in text_string_to_metric_families(text):
+        for sample in family.samples:
+            if sample.name in ("llm_fallbacks_total", "llm_call_duration_seconds_count"):
+                samples[(sample.name, tuple(sorted(sample.labels.items())))] = sample.value
+    return samples
+
+
+def deltas(before: Dict[tuple, float], after: Dict[tuple, float], name: str, label: str) -> Counter:
+    counts = Counter()
+    for key, value in after.items():
+        if key[0] == name:
+            counts[dict(key[1])[label]] += value - before.get(key, 0)
+    return +counts
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    scenario = SCENARIOS[args.scenario]
+    limits = httpx.Limits(max_connections=args.max_inflight, max_keepalive_connections=args.max_inflight)
+    flows: List[Flow] = []
+    dropped = 0
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        before = await scrape(client)
+        tasks = set()
+        started = time.perf_counter()
+        next_arrival = started
+        while next_arrival < started + args.duration:
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+            next_arrival += rng.expovariate(args.rps)
+            if len(tasks) >= args.max_inflight:
+                dropped += 1
+                continue
+            flow = Flow(client, random.Random(rng.random()), args.red_flag_share)
+            flows.append(flow)
+            task = asyncio.create_task(scenario(flow))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+        elapsed = time.perf_counter() - started
+        after = await scrape(client)
+    return {
+        "flows": flows,
+        "dropped": dropped,
+        "elapsed": elapsed,
+        "fallbacks": deltas(before, after, "llm_fallbacks_total", "kind"),
+        "llm_calls": deltas(before, after, "llm_call_duration_seconds_count", "outcome"),
+    }
+
+
+def percentiles(values: List[float]) -> str:
+    values = sorted(values)
+    if not values:
+        return f"{'-':>8} {'-':>8} {'-':>8}"
+    pick = lambda fraction: values[min(len(values) - 1, int(fraction * len(values)))] * 1000
+    return f"{pick(0.50):8.0f} {pick(0.95):8.0f} {pick(0.99):8.0f}"
+
+
+def report(args, result):
+    flows, elapsed = result["flows"], result["elapsed"]
+    completed = [flow for flow in flows if not flow.failed]
+    by_step = defaultdict(list)
+    step_errors = Counter()
+    for flow in flows:
+        for step, seconds, ok in flow.steps:
+            if ok:
+                by_step[step].append(seconds)
+            else:
+                step_errors[step] += 1
+    requests = sum(len(flow.steps) for flow in flows)
+
+    print(f"scenario {args.scenario}: target {args.rps:g} flows/s for {args.duration:g}s")
+    print(f"{'step':>15} {'ok':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for step in sorted(set(by_step) | set(step_errors)):
+        print(f"{step:>15} {len(by_step[step]):>6} {step_errors[step]:>6} {percentiles(by_step[step])}")
+    flow_seconds = [sum(seconds for _, seconds, _ in flow.steps) for flow in completed]
+    print(f"{'flow':>15} {len(completed):>6} {len(flows) - len(completed):>6} {percentiles(flow_seconds)}")
+    print(f"throughput: {len(completed) / elapsed:.2f} flows/s completed ({len(flows) / args.duration:.2f} started, "
+          f"{result['dropped']} dropped at --max-inflight), {requests / elapsed:.2f} requests/s")
+    fallbacks = result["fallbacks"]
+    total = sum(fallbacks.values())
+    rate = total / len(flows) if flows else 0.0
+    kinds = ", ".join(f"{kind} {count:g}" for kind, count in sorted(fallbacks.items())) or "none"
+    print(f"fallbacks: {rate:.1%} per flow ({kinds})")
+    outcomes = ", ".join(f"{outcome} {count:g}" for outcome, count in sorted(result["llm_calls"].items())) or "none"
+    print(f"LLM calls: {outcomes}")
+
+
+def start_stack(args, workdir):
+    """Start the fake OpenAI server and the API; returns their processes."""
+    fake_port, api_port = args.port + 1, args.port
+    fake = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "fake_openai_server.py"), "--port", str(fake_port),
+         "--latency", args.latency_spec, "--error-rate", str(args.error_rate),
+         "--rate-limit-rate", str(args.rate_limit_rate), "--hang-rate", str(args.hang_rate),
+         "--hang-seconds", str(args.hang_seconds)],
+        cwd=REPO_ROOT, stdout=subprocess.DEVNULL,
+    )
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+    env.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(workdir, 'load.sqlite')}")
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    env.update({
+        # Keep the runs' JSONL audit records and semantic cache out of the repository
+        "DATA_DIR": os.path.join(workdir, "raw"),
+        "HOST": "127.0.0.1",
+        "PORT": str(api_port),
+        "OPENAI_API_BASE": f"http://127.0.0.1:{fake_port}/v1",
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY") or "sk-load-test",
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+    })
+    api = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "python:backend.app.core.server", "backend.app.main:app"],
+        env=env, cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return [api, fake]
+
+
+def wait_ready(url, processes, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if any(process.poll() is not None for process in processes):
+            raise RuntimeError("the API or the fake OpenAI server exited during startup")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="full_flow")
+    parser.add_argument("--rps", type=float, default=10, help="target flows started per second")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of arrivals")
+    parser.add_argument("--max-inflight", type=int, default=500, help="flows in flight before arrivals are dropped")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds per HTTP request")
+    parser.add_argument("--red-flag-share", type=float, default=0.05,
+                        help="share of intakes keeping their red flags (clear-cut ones answered by triage, without the LLM)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--base-url", help="an API already running; otherwise one is started")
+    parser.add_argument("--port", type=int, default=8780, help="API port when started (the fake uses the next)")
+    fake = parser.add_argument_group("fake OpenAI server (when the API is started here)")
+    fake.add_argument("--latency", dest="latency_spec", default="lognormal:1.5,0.4")
+    fake.add_argument("--error-rate", type=float, default=0.0)
+    fake.add_argument("--rate-limit-rate", type=float, default=0.0)
+    fake.add_argument("--hang-rate", type=float, default=0.0)
+    fake.add_argument("--hang-seconds", type=float, default=120)
+    args = parser.parse_args()
+    parse_latency(args.latency_spec)
+
+    if args.base_url:
+        report(args, asyncio.run(run(args)))
+        return
+    with tempfile.TemporaryDirectory() as workdir:
+        processes = start_stack(args, workdir)
+        try:
+            args.base_url = f"http://127.0.0.1:{args.port}"
+            wait_ready(f"http://127.0.0.1:{args.port + 1}/stats", processes)
+            wait_ready(args.base_url + "/", processes)
+            report(args, asyncio.run(run(args)))
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Benchmark: session / audit-log lookups on the migrated schema vs the original.
+
+Seeds a local Postgres with millions of rows and times the lookups the app
+and audit queries make, against two copies of the same data:
+
+- "migrated": the tables at alembic head (JSONB, llm_logs partitioned by
+  month, (session_id, created_at) / step / diagnosis GIN indexes)
+- "baseline": a bench_baseline schema with the layout of the initial
+  migration 28dd6593e210 (plain JSON, no secondary indexes, unpartitioned)
+
+Usage (from the repository root, against a throwaway database):
+    createdb remap_bench
+    # point backend/alembic.ini's sqlalchemy.url at it, then:
+    (cd backend && alembic upgrade head)
+    python backend/benchmarks/seed_postgres.py \\
+        --dsn postgresql://postgres@localhost/remap_bench --sessions 1000000
+
+Seeding truncates both copies first; --skip-seed reruns only the queries.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import statistics
+import time
+import uuid
+
+import asyncpg
+
+BASELINE_SCHEMA = "bench_baseline"
+
+BASELINE_DDL = f"""
+CREATE SCHEMA IF NOT EXISTS {BASELINE_SCHEMA};
+CREATE TABLE IF NOT EXISTS {BASELINE_SCHEMA}.sessions (
+    session_id varchar PRIMARY KEY,
+    analysis json NOT NULL,
+    created_at timestamptz DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS {BASELINE_SCHEMA}.llm_logs (
+    log_id serial PRIMARY KEY,
+    session_id varchar NOT NULL REFERENCES {BASELINE_SCHEMA}.sessions (session_id),
+    step varchar NOT NULL,
+    payload json NOT NULL,
+    created_at timestamptz DEFAULT now()
+);
+"""
+
+DIAGNOSES = [
+    ("Lumbar strain", "S39.012A"),
+    ("Low back pain", "M54.5"),
+    ("Cervicalgia", "M54.2"),
+    ("Rotator cuff tendinitis", "M75.1"),
+    ("Patellofemoral pain syndrome", "M22.2"),
+    ("Plantar fasciitis", "M72.2"),
+    ("Lateral epicondylitis", "M77.1"),
+    ("Sciatica", "M54.3"),
+    ("Cauda equina syndrome", "G83.4"),
+    ("Osteoarthritis of knee", "M17.9"),
+]
+STEPS = ("intake_analysis", "treatment_plan")
+
+# (name, migrated SQL, baseline SQL); "{s}" is replaced by the schema
+QUERIES = [
+    (
+        "session by id",
+        "SELECT analysis FROM {s}.sessions WHERE session_id = $1",
+        "SELECT analysis FROM {s}.sessions WHERE session_id = $1",
+    ),
+    (
+        "logs for a session",
+        "SELECT step, payload FROM {s}.llm_logs WHERE session_id = $1 ORDER BY created_at",
+        "SELECT step, payload FROM {s}.llm_logs WHERE session_id = $1 ORDER BY created_at",
+    ),
+    (
+        "step count in a month",
+        "SELECT count(*) FROM {s}.llm_logs WHERE step = $1 AND created_at >= $2 AND created_at < $3",
+        "SELECT count(*) FROM {s}.llm_logs WHERE step = $1 AND created_at >= $2 AND created_at < $3",
+    ),
+    (
+        "sessions by ICD-10 code",
+        "SELECT session_id FROM {s}.sessions WHERE analysis -> 'main_diagnosis' @> $1::jsonb LIMIT 100",
+        "SELECT session_id FROM {s}.sessions WHERE analysis -> 'main_diagnosis' ->> 'icd10_code' = $1 LIMIT 100",
+    ),
+]
+
+
+def month_starts(months):
+    """First day of each of the last `months` months, oldest first."""
+    today = datetime.date.today().replace(day=1)
+    starts = []
+    for i in range(months - 1, -1, -1):
+        year, month = divmod(today.year * 12 + today.month - 1 - i, 12)
+        starts.append(datetime.datetime(year, month + 1, 1, tzinfo=datetime.timezone.utc))
+    return starts
+
+
+def generate(n_sessions, start, end, rng):
+    """Yield (session_row, [log_rows]) with created_at spread over [start, end)."""
+    span = (end - start).total_seconds()
+    for _ in range(n_sessions):
+        session_id = str(uuid.uuid4())
+        diagnosis, icd10 = rng.choice(DIAGNOSES)
+        created_at = start + datetime.timedelta(seconds=rng.random() * span)
+        analysis = json.dumps({
+            "serious_vs_treatable": {"diagnosis": "treatable", "probability": 0.9},
+            "main_diagnosis": {
+                "diagnosis": diagnosis,
+                "icd10_code": icd10,
+                "probability": round(rng.random(), 2),
+            },
+        })
+        logs = [
+            (session_id, step, json.dumps({"input": {"session_id": session_id}, "output": {"step": step}}),
+             created_at + datetime.timedelta(seconds=30 * i))
+            for i, step in enumerate(STEPS)
+        ]
+        yield (session_id, analysis, created_at), logs
+
+
+async def seed(conn, schemas, n_sessions, months, batch_size, seed_value):
+    """Truncate and bulk-load the same generated rows into every schema with COPY."""
+    starts = month_starts(months)
+    end = datetime.datetime.now(datetime.timezone.utc)
+    for schema in schemas:
+        await conn.execute(f"TRUNCATE {schema}.llm_logs, {schema}.sessions")
+    for start in starts:
+        await conn.execute("SELECT llm_logs_create_partition($1::date)", start.date())
+
+    rng = random.Random(seed_value)
+    sessions, logs = [], []
+    loaded = 0
+    began = time.perf_counter()
+
+    async def flush():
+        for schema in schemas:
+            await conn.copy_records_to_table(
+                "sessions", schema_name=schema, records=sessions,
+                columns=["session_id", "analysis", "created_at"])
+            await conn.copy_records_to_table(
+                "llm_logs", schema_name=schema, records=logs,
+                columns=["session_id", "step", "payload", "created_at"])
+
+    for session_row, log_rows in generate(n_sessions, starts[0], end, rng):
+        sessions.append(session_row)
+        logs.extend(log_rows)
+        if len(sessions) >= batch_size:
+            await flush()
+            loaded += len(sessions)
+            sessions, logs = [], []
+            print(f"  {loaded:,} sessions loaded ({time.perf_counter() - began:.0f}s)", flush=True)
+    if sessions:
+        await flush()
+
+    for schema in schemas:
+        await conn.execute(f"ANALYZE {schema}.sessions")
+        await conn.execute(f"ANALYZE {schema}.llm_logs")
+
+
+async def sample_params(conn, months, samples, rng):
+    """Real session ids from the data plus random months, steps and codes."""
+    rows = await conn.fetch(
+        "SELECT session_id FROM public.sessions TABLESAMPLE SYSTEM (1) LIMIT $1", samples)
+    session_ids = [row["session_id"] for row in rows]
+    starts = month_starts(months)
+    params = []
+    for i in range(samples):
+        month = rng.randrange(len(starts) - 1) if len(starts) > 1 else 0
+        month_end = starts[month + 1] if month + 1 < len(starts) else datetime.datetime.now(datetime.timezone.utc)
+        diagnosis, icd10 = rng.choice(DIAGNOSES)
+        params.append({
+            "session by id": (session_ids[i % len(session_ids)],),
+            "logs for a session": (session_ids[i % len(session_ids)],),
+            "step count in a month": (rng.choice(STEPS), starts[month], month_end),
+            "sessions by ICD-10 code": (icd10,),
+        })
+    return params
+
+
+async def time_queries(conn, schema, baseline, params):
+    """Median and p95 latency in ms for every query against one schema."""
+    results = {}
+    for name, migrated_sql, baseline_sql in QUERIES:
+        sql = (baseline_sql if baseline else migrated_sql).format(s=schema)
+        stmt = await conn.prepare(sql)
+        timings = []
+        for p in params:
+            args = p[name]
+            if name == "sessions by ICD-10 code" and not baseline:
+                args = (json.dumps({"icd10_code": args[0]}),)
+            began = time.perf_counter()
+            await stmt.fetch(*args)
+            timings.append((time.perf_counter() - began) * 1000)
+        timings.sort()
+        results[name] = (statistics.median(timings), timings[int(len(timings) * 0.95) - 1])
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URL", "postgresql://postgres@localhost/remap_bench"))
+    parser.add_argument("--sessions", type=int, default=1_000_000, help="Sessions to seed (2 log rows each)")
+    parser.add_argument("--months", type=int, default=12, help="Months of history to spread rows over")
+    parser.add_argument("--batch", type=int, default=50_000, help="Sessions per COPY batch")
+    parser.add_argument("--samples", type=int, default=200, help="Executions per query")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse previously seeded data")
+    args = parser.parse_args()
+
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        await conn.execute(BASELINE_DDL)
+        if not args.skip_seed:
+            print(f"Seeding {args.sessions:,} sessions / {args.sessions * len(STEPS):,} log rows into each schema")
+            await seed(conn, ["public", BASELINE_SCHEMA], args.sessions, args.months, args.batch, args.seed)
+
+        params = await sample_params(conn, args.months, args.samples, random.Random(args.seed))
+        migrated = await time_queries(conn, "public", False, params)
+        baseline = await time_queries(conn, BASELINE_SCHEMA, True, params)
+    finally:
+        await conn.close()
+
+    print(f"\n{'query':<26}{'baseline p50':>14}{'p95':>10}{'migrated p50':>14}{'p95':>10}{'speedup':>10}")
+    for name, _, _ in QUERIES:
+        b50, b95 = baseline[name]
+        m50, m95 = migrated[name]
+        print(f"{name:<26}{b50:>12.2f}ms{b95:>8.2f}ms{m50:>12.2f}ms{m95:>8.2f}ms{b50 / m50:>9.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,40 +1,366 @@
+"""
+Compile the raw JSONL logs into sharded, compressed training data.
+
+Every raw file is read as a stream from the byte offset the previous run
+stopped at, so a run only processes lines appended since then. Records are
+joined by session_id into one training example per session:
+
+    intake_data, analysis_result   <- user_responses.jsonl
+    final_analyses                 <- final_analysis_responses.jsonl
+    treatment_plans                <- treatment_plans.jsonl
+    feedback                       <- feedback.jsonl
+    guideline                      <- guidelines.jsonl (no session; one example each)
+
+Memory stays bounded by the batch size: the join state, the per-file
+offsets and the hashes of lines already seen live in a SQLite database
+(data/processed/compile_state.sqlite), updated one batch per transaction
+together with the offsets, so an interrupted run resumes cleanly. Exact
+duplicate lines are dropped, and a session is only written out again when
+its joined content changed.
+
+Each run writes the sessions it touched to gzipped JSONL shards in
+data/processed/shards/ and lists them in data/processed/manifest.json. A
+session updated by a later run (e.g. feedback arriving after the intake)
+appears again in that run's shard; readers keep the last occurrence of each
+session_id. --full discards the state and shards and rebuilds from scratch,
+giving exactly one row per session.
+
+Usage:
+    python backend/scripts/compile_data.py [--full] [--batch-size 5000] [--shard-records 50000]
+"""
+import argparse
+import datetime
+import gzip
+import hashlib
 import json
 import os
+import shutil
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib json module
+    orjson = None
 
 # Define paths relative to the script's location.
-# Adjust these paths based on your actual directory structure.
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 DATA_RAW_DIR = os.path.join(PROJECT_ROOT, "data", "raw")
 DATA_PROCESSED_DIR = os.path.join(PROJECT_ROOT, "data", "processed")
-os.makedirs(DATA_PROCESSED_DIR, exist_ok=True)
-
-GUIDELINES_FILE = os.path.join(DATA_RAW_DIR, "guidelines.jsonl")
-USER_RESPONSES_FILE = os.path.join(DATA_RAW_DIR, "user_responses.jsonl")
-OUTPUT_FILE = os.path.join(DATA_PROCESSED_DIR, "training_data.jsonl")
-
-def load_jsonl(file_path):
-    """Load records from a JSONL file."""
-    records = []
-    if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            for line in f:
-                if line.strip():
-                    records.append(json.loads(line))
-    return records
+
+# Raw file -> how its records join into a session
+SOURCES = {
+    "user_responses.jsonl": "intake",
+    "final_analysis_responses.jsonl": "final_analysis",
+    "treatment_plans.jsonl": "treatment_plan",
+    "feedback.jsonl": "feedback",
+    "guidelines.jsonl": "guideline",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    record TEXT NOT NULL,
+    emitted_hash TEXT,
+    pending_hash TEXT,
+    dirty INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_sessions_dirty ON sessions (dirty) WHERE dirty = 1;
+CREATE TABLE IF NOT EXISTS seen_lines (hash BLOB PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS offsets (path TEXT PRIMARY KEY, inode INTEGER, offset INTEGER);
+"""
+
+
+def loads(data) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def dumps(value: Any) -> str:
+    return orjson.dumps(value).decode("utf-8") if orjson is not None else json.dumps(value)
+
+
+def _loads_maybe(value: Any) -> Any:
+    """Some writers stored nested models as JSON strings."""
+    if isinstance(value, str):
+        try:
+            return loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def read_lines(path: str, offset: int) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yield (end offset, line) for each complete line after offset. A trailing
+    line without a newline is still being written and is left for next run.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            offset += len(line)
+            if line.strip():
+                yield offset, line
+
+
+def to_update(kind: str, record: Dict[str, Any], line_hash: bytes) -> Tuple[str, Dict[str, Any]]:
+    """Map a raw record to (session key, partial session record)."""
+    session_id = record.get("session_id")
+    timestamp = record.get("timestamp")
+    if kind == "guideline" or not session_id:
+        # Nothing to join on: the record is an example of its own
+        return f"{kind}:{line_hash.hex()}", {"source": kind, kind: record}
+    if kind == "intake":
+        return session_id, {
+            "intake_data": record.get("intake_data"),
+            "analysis_result": _loads_maybe(record.get("analysis_result")),
+            "timestamp": timestamp,
+        }
+    if kind == "final_analysis":
+        entry = {"form_data": record.get("form_data"), "analysis_result": _loads_maybe(record.get("analysis_result"))}
+        return session_id, {"final_analyses": [dict(entry, timestamp=timestamp)]}
+    if kind == "treatment_plan":
+        entry = {"treatment_plan": _loads_maybe(record.get("treatment_plan")), "timestamp": timestamp}
+        return session_id, {"treatment_plans": [entry]}
+    entry = {"feedback": record.get("feedback"), "timestamp": timestamp}
+    return session_id, {"feedback": [entry]}
+
+
+def merge(session: Dict[str, Any], update: Dict[str, Any]) -> None:
+    """Merge a partial record into a session: lists append, fields overwrite."""
+    for key, value in update.items():
+        if isinstance(value, list):
+            session.setdefault(key, []).extend(value)
+        elif value is not None:
+            session[key] = value
+
+
+class Compiler:
+    """
+    Incremental join of the raw files into per-session records, backed by SQLite.
+    """
+    def __init__(self, raw_dir: str, processed_dir: str, batch_size: int = 5000, shard_records: int = 50000):
+        self.raw_dir = raw_dir
+        self.processed_dir = processed_dir
+        self.shard_dir = os.path.join(processed_dir, "shards")
+        self.manifest_path = os.path.join(processed_dir, "manifest.json")
+        self.batch_size = batch_size
+        self.shard_records = shard_records
+        os.makedirs(self.shard_dir, exist_ok=True)
+
+        self.db = sqlite3.connect(os.path.join(processed_dir, "compile_state.sqlite"))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+        # Counters
+        self.lines_read = 0
+        self.duplicate_lines = 0
+        self.bad_lines = 0
+
+    def _offset(self, path: str) -> int:
+        """Where to resume reading path; 0 if it was replaced or truncated."""
+        row = self.db.execute("SELECT inode, offset FROM offsets WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return 0
+        inode, offset = row
+        stat = os.stat(path)
+        if stat.st_ino != inode or stat.st_size < offset:
+            return 0
+        return offset
+
+    def _new_lines(self, batch: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+        """Drop lines already seen in earlier batches or earlier in this one."""
+        hashes = [line_hash for line_hash, _ in batch]
+        seen = set()
+        for start in range(0, len(hashes), 900):
+            chunk = hashes[start:start + 900]
+            placeholders = ",".join("?" * len(chunk))
+            seen.update(row[0] for row in self.db.execute(
+                f"SELECT hash FROM seen_lines WHERE hash IN ({placeholders})", chunk
+            ))
+        fresh = []
+        for line_hash, line in batch:
+            if line_hash in seen:
+                self.duplicate_lines += 1
+                continue
+            seen.add(line_hash)
+            fresh.append((line_hash, line))
+        return fresh
+
+    def _apply(self, kind: str, path: str, inode: int, offset: int, batch: List[Tuple[bytes, bytes]]) -> None:
+        """Join one batch into the session table and advance the offset, in one transaction."""
+        fresh = self._new_lines(batch)
+        updates: Dict[str, Dict[str, Any]] = {}
+        for line_hash, line in fresh:
+            try:
+                record = loads(line)
+            except ValueError:
+                self.bad_lines += 1
+                continue
+            key, update = to_update(kind, record, line_hash)
+            merge(updates.setdefault(key, {}), update)
+
+        keys = list(updates)
+        existing: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(keys), 900):
+            chunk = keys[start:start + 900]
+            placeholders = ",".join("?" * len(chunk))
+            for session_id, record in self.db.execute(
+                f"SELECT session_id, record FROM sessions WHERE session_id IN ({placeholders})", chunk
+            ):
+                existing[session_id] = loads(record)
+
+        rows = []
+        for key, update in updates.items():
+            session = existing.get(key, {"session_id": key})
+            merge(session, update)
+            rows.append((key, dumps(session)))
+
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO sessions (session_id, record, dirty) VALUES (?, ?, 1) "
+                "ON CONFLICT (session_id) DO UPDATE SET record = excluded.record, dirty = 1",
+                rows,
+            )
+            self.db.executemany("INSERT OR IGNORE INTO seen_lines (hash) VALUES (?)", [(h,) for h, _ in fresh])
+            self.db.execute(
+                "INSERT INTO offsets (path, inode, offset) VALUES (?, ?, ?) "
+                "ON CONFLICT (path) DO UPDATE SET inode = excluded.inode, offset = excluded.offset",
+                (path, inode, offset),
+            )
+
+    def ingest(self) -> None:
+        """Join every raw file's new lines into the session table."""
+        for filename, kind in SOURCES.items():
+            path = os.path.join(self.raw_dir, filename)
+            if not os.path.exists(path):
+                continue
+            inode = os.stat(path).st_ino
+            offset = self._offset(path)
+            batch: List[Tuple[bytes, bytes]] = []
+            for offset, line in read_lines(path, offset):
+                self.lines_read += 1
+                batch.append((hashlib.sha1(line.strip()).digest(), line))
+                if len(batch) >= self.batch_size:
+                    self._apply(kind, path, inode, offset, batch)
+                    batch = []
+            self._apply(kind, path, inode, offset, batch)
+
+    def emit(self) -> Dict[str, Any]:
+        """
+        Write changed sessions to this run's shards and record them in the
+        manifest; sessions are marked clean only once their shard is complete.
+        """
+        run_id = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        shards: List[Dict[str, Any]] = []
+        shard: Optional[gzip.GzipFile] = None
+        shard_info: Dict[str, Any] = {}
+        pending: List[Tuple[str, str]] = []
+        unchanged = 0
+
+        reader = self.db.cursor()
+        for session_id, record, emitted_hash in reader.execute(
+            "SELECT session_id, record, emitted_hash FROM sessions WHERE dirty = 1"
+        ):
+            digest = hashlib.sha1(record.encode("utf-8")).hexdigest()
+            pending.append((digest, session_id))
+            if len(pending) >= self.batch_size:
+                self._set_pending(pending)
+                pending = []
+            if digest == emitted_hash:
+                unchanged += 1
+                continue
+            if shard is None or shard_info["records"] >= self.shard_records:
+                if shard is not None:
+                    shard.close()
+                name = f"training-{run_id}-{len(shards):04d}.jsonl.gz"
+                shard_info = {"file": name, "records": 0, "created_at": run_id}
+                shards.append(shard_info)
+                shard = gzip.open(os.path.join(self.shard_dir, name), "wb", compresslevel=6)
+            shard.write(record.encode("utf-8") + b"\n")
+            shard_info["records"] += 1
+        if shard is not None:
+            shard.close()
+        self._set_pending(pending)
+
+        manifest = self.manifest()
+        manifest["shards"].extend(shards)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+        with self.db:
+            self.db.execute("UPDATE sessions SET emitted_hash = pending_hash, dirty = 0 WHERE dirty = 1")
+        return {
+            "shards": len(shards),
+            "records": sum(info["records"] for info in shards),
+            "unchanged": unchanged,
+        }
+
+    def _set_pending(self, pending: List[Tuple[str, str]]) -> None:
+        """Remember the hash being written for each session until its shard is complete."""
+        with self.db:
+            self.db.executemany("UPDATE sessions SET pending_hash = ? WHERE session_id = ?", pending)
+
+    def manifest(self) -> Dict[str, Any]:
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        return {"shards": []}
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def reset(processed_dir: str) -> None:
+    """Discard the compile state, shards and manifest for a full rebuild."""
+    for name in ("compile_state.sqlite", "compile_state.sqlite-wal", "compile_state.sqlite-shm", "manifest.json"):
+        path = os.path.join(processed_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.rmtree(os.path.join(processed_dir, "shards"), ignore_errors=True)
+
+
+def compile_data(raw_dir: str = DATA_RAW_DIR, processed_dir: str = DATA_PROCESSED_DIR, full: bool = False,
+                 batch_size: int = 5000, shard_records: int = 50000) -> Dict[str, Any]:
+    os.makedirs(processed_dir, exist_ok=True)
+    if full:
+        reset(processed_dir)
+    compiler = Compiler(raw_dir, processed_dir, batch_size=batch_size, shard_records=shard_records)
+    try:
+        compiler.ingest()
+        result = compiler.emit()
+    finally:
+        compiler.close()
+    result.update(
+        lines_read=compiler.lines_read,
+        duplicate_lines=compiler.duplicate_lines,
+        bad_lines=compiler.bad_lines,
+    )
+    return result
+
 
 def main():
-    guidelines = load_jsonl(GUIDELINES_FILE)
-    user_responses = load_jsonl(USER_RESPONSES_FILE)
-    
-    # Optionally, you can add additional processing here (e.g., filtering, normalization)
-    merged_data = guidelines + user_responses
-    
-    # Write the merged data to a new JSONL file
-    with open(OUTPUT_FILE, "w") as f:
-        for record in merged_data:
-            f.write(json.dumps(record) + "\n")
-    
-    print(f"Merged {len(merged_data)} records into {OUTPUT_FILE}")
+    parser = argparse.ArgumentParser(description="Compile raw JSONL logs into sharded training data.")
+    parser.add_argument("--full", action="store_true", help="discard previous state and rebuild from scratch")
+    parser.add_argument("--raw-dir", default=DATA_RAW_DIR)
+    parser.add_argument("--processed-dir", default=DATA_PROCESSED_DIR)
+    parser.add_argument("--batch-size", type=int, default=5000, help="lines joined per transaction")
+    parser.add_argument("--shard-records", type=int, default=50000, help="sessions per output shard")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    result = compile_data(args.raw_dir, args.processed_dir, args.full, args.batch_size, args.shard_records)
+    print(
+        f"Read {result['lines_read']} new lines ({result['duplicate_lines']} duplicate, "
+        f"{result['bad_lines']} unparseable); wrote {result['records']} sessions to "
+        f"{result['shards']} shards in {args.processed_dir} ({result['unchanged']} unchanged) "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
 
 if __name__ == "__main__":
     main()
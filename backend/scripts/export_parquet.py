@@ -0,0 +1,357 @@
+"""
+Export the session and feedback corpus to partitioned Parquet for analytics.
+
+Two datasets are written under data/exports/ (hive-partitioned by month of
+creation, one file per month per run):
+
+    sessions/month=YYYY-MM/part-<run>.parquet
+        one row per intake analysis: every IntakeFormData field, the
+        AnalysisResult flattened into scalar and list columns, how it was
+        produced (LLM, triage, semantic cache) and the LLM usage
+    feedback/month=YYYY-MM/part-<run>.parquet
+        one row per feedback entry, with the analysis it was given on
+
+Column types come from the models: enum and multiple-choice fields are
+dictionary-encoded strings (lists of them for multi-select questions),
+free text stays a plain string, numbers get narrow integer / float types.
+Field names of the older raw records (location_of_pain, severity, ...) are
+mapped onto the current ones.
+
+Sessions are streamed from the llm_logs table through a server-side cursor
+(--source db, the default) or from data/raw/user_responses.jsonl
+(--source jsonl); feedback comes from data/raw/feedback.jsonl. Rows are
+converted and written one batch at a time, so memory stays bounded by
+--batch-size.
+
+Usage (from the repository root):
+    DATABASE_URL=postgresql://... python backend/scripts/export_parquet.py [--source db|jsonl] [--out DIR]
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+import time
+import typing
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from backend.app.models.intake import IntakeFormData  # noqa: E402
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_RAW_DIR = os.path.join(PROJECT_ROOT, "data", "raw")
+EXPORT_DIR = os.path.join(PROJECT_ROOT, "data", "exports")
+
+# Intake questions answered in free text; other str fields are categorical
+FREE_TEXT_FIELDS = frozenset({"primary_complaint", "pain_movement", "pain_comment"})
+
+# Older raw records -> current IntakeFormData field names
+LEGACY_FIELD_NAMES = {
+    "location_of_pain": "pain_location",
+    "describe_pain": "pain_nature",
+    "severity": "pain_severity",
+    "frequency": "pain_frequency",
+    "timing": "pain_timing",
+    "duration_of_symptoms": "pain_duration",
+    "onset_of_pain": "pain_onset",
+    "symptom_progression": "pain_progression",
+    "red_flag_symptoms": "serious_symptom",
+    "symptom_triggers": "pain_trigger",
+    "symptom_relievers": "pain_reliever",
+}
+
+CATEGORY = pa.dictionary(pa.int16(), pa.string())
+
+
+def _intake_type(name: str, annotation: Any) -> pa.DataType:
+    """Arrow type for an IntakeFormData field, from its annotation."""
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    if typing.get_origin(annotation) is typing.Union and len(args) == 1:
+        annotation = args[0]
+    if typing.get_origin(annotation) in (list, frozenset):
+        return pa.list_(CATEGORY)
+    if isinstance(annotation, type) and issubclass(annotation, Enum):
+        return CATEGORY
+    if annotation is int:
+        return pa.int8()
+    if name in FREE_TEXT_FIELDS:
+        return pa.string()
+    return CATEGORY
+
+
+INTAKE_FIELDS = [
+    pa.field(name, _intake_type(name, field.annotation))
+    for name, field in IntakeFormData.model_fields.items()
+]
+
+ANALYSIS_FIELDS = [
+    pa.field("serious_vs_treatable", CATEGORY),
+    pa.field("serious_vs_treatable_probability", pa.float32()),
+    pa.field("differentiation", pa.list_(pa.struct([
+        pa.field("diagnosis", CATEGORY), pa.field("probability", pa.float32()),
+    ]))),
+    pa.field("main_diagnosis", CATEGORY),
+    pa.field("main_diagnosis_icd10", CATEGORY),
+    pa.field("main_diagnosis_probability", pa.float32()),
+    pa.field("other_diagnoses_icd10", pa.list_(CATEGORY)),
+    pa.field("treatment_types", pa.list_(CATEGORY)),
+]
+
+SESSIONS_SCHEMA = pa.schema(
+    [
+        pa.field("session_id", pa.string()),
+        pa.field("created_at", pa.timestamp("us", tz="UTC")),
+    ]
+    + INTAKE_FIELDS
+    + ANALYSIS_FIELDS
+    + [
+        pa.field("analysis_source", CATEGORY),
+        pa.field("triage_flags", pa.list_(CATEGORY)),
+        pa.field("prompt_tokens", pa.int32()),
+        pa.field("completion_tokens", pa.int32()),
+        pa.field("llm_latency_ms", pa.float32()),
+        pa.field("llm_cache_shared", pa.bool_()),
+    ]
+)
+
+FEEDBACK_SCHEMA = pa.schema(
+    [
+        pa.field("session_id", pa.string()),
+        pa.field("created_at", pa.timestamp("us", tz="UTC")),
+        pa.field("feedback", pa.string()),
+    ]
+    + ANALYSIS_FIELDS
+)
+
+
+def _loads_maybe(value: Any) -> Any:
+    """Some writers stored nested models as JSON strings."""
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+    return value
+
+
+def _timestamp(value: Any) -> Optional[datetime.datetime]:
+    if isinstance(value, datetime.datetime):
+        moment = value
+    elif isinstance(value, str):
+        moment = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    else:
+        return None
+    return moment if moment.tzinfo else moment.replace(tzinfo=datetime.timezone.utc)
+
+
+def _category(value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    return str(getattr(value, "value", value))
+
+
+def intake_columns(intake: Dict[str, Any]) -> Dict[str, Any]:
+    """IntakeFormData fields of a raw intake dict, typed for INTAKE_FIELDS."""
+    intake = {LEGACY_FIELD_NAMES.get(key, key): value for key, value in (intake or {}).items()}
+    row = {}
+    for field in INTAKE_FIELDS:
+        value = intake.get(field.name)
+        if pa.types.is_list(field.type):
+            values = value if isinstance(value, list) else ([value] if value else [])
+            row[field.name] = [_category(item) for item in values]
+        elif pa.types.is_integer(field.type):
+            row[field.name] = int(value) if isinstance(value, (int, float)) else None
+        elif pa.types.is_dictionary(field.type):
+            row[field.name] = _category(value)
+        else:
+            row[field.name] = value
+    return row
+
+
+def analysis_columns(analysis: Any) -> Dict[str, Any]:
+    """AnalysisResult flattened into ANALYSIS_FIELDS columns."""
+    analysis = _loads_maybe(analysis) or {}
+    serious = analysis.get("serious_vs_treatable") or {}
+    main = analysis.get("main_diagnosis") or {}
+    return {
+        "serious_vs_treatable": _category(serious.get("diagnosis")),
+        "serious_vs_treatable_probability": serious.get("probability"),
+        "differentiation": [
+            {"diagnosis": _category(item.get("diagnosis")), "probability": item.get("probability")}
+            for item in analysis.get("differentiation_probabilities") or []
+        ],
+        "main_diagnosis": _category(main.get("diagnosis")),
+        "main_diagnosis_icd10": _category(main.get("icd10_code")),
+        "main_diagnosis_probability": main.get("probability"),
+        "other_diagnoses_icd10": [
+            _category(item.get("icd10_code")) for item in analysis.get("other_probabilistic_diagnosis") or []
+        ],
+        "treatment_types": [
+            _category(item.get("type")) for item in analysis.get("treatment_recommendations") or []
+        ],
+    }
+
+
+def session_row(session_id: str, created_at: Any, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """One sessions row from an intake_analysis LLMLog payload (or a raw record shaped like one)."""
+    usage = payload.get("usage") or []
+    triage = payload.get("triage") or {}
+    row = {"session_id": session_id, "created_at": _timestamp(created_at)}
+    row.update(intake_columns(payload.get("input")))
+    row.update(analysis_columns(payload.get("output")))
+    row.update(
+        analysis_source=payload.get("source") or "llm",
+        triage_flags=triage.get("flags") or [],
+        prompt_tokens=sum(record.get("prompt_tokens", 0) for record in usage) if usage else None,
+        completion_tokens=sum(record.get("completion_tokens", 0) for record in usage) if usage else None,
+        llm_latency_ms=sum(record.get("latency_ms", 0) for record in usage) if usage else None,
+        llm_cache_shared=all(record.get("shared") for record in usage) if usage else None,
+    )
+    return row
+
+
+def feedback_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    row = {
+        "session_id": record.get("session_id"),
+        "created_at": _timestamp(record.get("timestamp")),
+        "feedback": record.get("feedback") if isinstance(record.get("feedback"), str) else json.dumps(record.get("feedback")),
+    }
+    row.update(analysis_columns(record.get("analysis_result")))
+    return row
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def jsonl_sessions() -> Iterator[Dict[str, Any]]:
+    for record in read_jsonl(os.path.join(DATA_RAW_DIR, "user_responses.jsonl")):
+        payload = {"input": record.get("intake_data"), "output": record.get("analysis_result")}
+        yield session_row(record.get("session_id"), record.get("timestamp"), payload)
+
+
+async def db_sessions(batch_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Batches of sessions rows, streamed from llm_logs through a server-side cursor."""
+    from sqlalchemy import select
+    from backend.app.core.database import AsyncSessionLocal, close_db, get_engine
+    from backend.app.models.database import LLMLog
+
+    statement = (
+        select(LLMLog.session_id, LLMLog.created_at, LLMLog.payload)
+        .where(LLMLog.step == "intake_analysis")
+        .order_by(LLMLog.created_at)
+        .execution_options(yield_per=batch_size)
+    )
+    get_engine()
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(statement)
+            async for rows in result.partitions():
+                yield [session_row(session_id, created_at, payload) for session_id, created_at, payload in rows]
+    finally:
+        await close_db()
+
+
+class PartitionedWriter:
+    """
+    Writes row batches into hive-style month=YYYY-MM Parquet files, one per
+    month per run. Input sorted by time keeps a single file open at a time.
+    """
+    def __init__(self, base_dir: str, schema: pa.Schema, run_id: str, max_open: int = 4):
+        self.base_dir = base_dir
+        self.schema = schema
+        self.run_id = run_id
+        self.max_open = max_open
+        self._writers: Dict[str, pq.ParquetWriter] = {}
+        self.rows = 0
+        self.files: List[str] = []
+
+    def _writer(self, month: str) -> pq.ParquetWriter:
+        writer = self._writers.get(month)
+        if writer is None:
+            if len(self._writers) >= self.max_open:
+                # Unsorted input: close the oldest and start another file for its month if needed
+                oldest = next(iter(self._writers))
+                self._writers.pop(oldest).close()
+            directory = os.path.join(self.base_dir, f"month={month}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"part-{self.run_id}-{len(self.files):04d}.parquet")
+            writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+            self._writers[month] = writer
+            self.files.append(path)
+        return writer
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        by_month: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            month = row["created_at"].strftime("%Y-%m") if row["created_at"] else "unknown"
+            by_month.setdefault(month, []).append(row)
+        for month, month_rows in by_month.items():
+            batch = pa.RecordBatch.from_pylist(month_rows, schema=self.schema)
+            self._writer(month).write_batch(batch)
+            self.rows += len(month_rows)
+
+    def close(self) -> None:
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+
+def _batches(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def export(source: str, out_dir: str, batch_size: int) -> Dict[str, PartitionedWriter]:
+    run_id = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    sessions = PartitionedWriter(os.path.join(out_dir, "sessions"), SESSIONS_SCHEMA, run_id)
+    feedback = PartitionedWriter(os.path.join(out_dir, "feedback"), FEEDBACK_SCHEMA, run_id)
+    try:
+        if source == "db":
+            async for rows in db_sessions(batch_size):
+                sessions.write(rows)
+        else:
+            for rows in _batches(jsonl_sessions(), batch_size):
+                sessions.write(rows)
+        feedback_rows = (feedback_row(record) for record in read_jsonl(os.path.join(DATA_RAW_DIR, "feedback.jsonl")))
+        for rows in _batches(feedback_rows, batch_size):
+            feedback.write(rows)
+    finally:
+        sessions.close()
+        feedback.close()
+    return {"sessions": sessions, "feedback": feedback}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the session and feedback corpus to partitioned Parquet.")
+    parser.add_argument("--source", choices=("db", "jsonl"), default="db",
+                        help="read sessions from llm_logs (DATABASE_URL) or from user_responses.jsonl")
+    parser.add_argument("--out", default=EXPORT_DIR)
+    parser.add_argument("--batch-size", type=int, default=10000, help="rows fetched and written per batch")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    writers = asyncio.run(export(args.source, args.out, args.batch_size))
+    for name, writer in writers.items():
+        print(f"{name}: {writer.rows} rows in {len(writer.files)} files")
+    print(f"Exported to {args.out} in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
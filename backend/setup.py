@@ -5,28 +5,29 @@ setup(
     version="0.1.0",
     packages=find_packages(),
     install_requires=[
-        "fastapi[all]==0.109.2",
+        "fastapi==0.109.2",
         "uvicorn==0.27.1",
         "gunicorn==21.2.0",
+        "uvloop==0.19.0; sys_platform != 'win32'",
+        "httptools==0.6.1",
         "pydantic==2.11.4",
         "pydantic-settings==2.1.0",
         "python-dotenv==1.0.1",
-        "python-dateutil==2.9.0.post0",
-        "python-multipart==0.0.9",
         "openai==1.79.0",
-        "requests==2.32.3",
-        "langchain==0.2.17",
-        "langchain-openai==0.1.25",
+        "langchain-core==0.2.43",
         "langchain-community==0.2.19",
-        "passlib[bcrypt]==1.7.4",
-        "python-jose[cryptography]==3.4.0",
-        "databases[postgresql]==0.9.0",
-        "asyncpg==0.30.0",
+        "tiktoken==0.7.0",
         "SQLAlchemy==2.0.41",
+        "asyncpg==0.30.0",
         "alembic==1.13.1",
         "redis==5.0.1",
-        "uuid==1.30",
-        "typing-extensions==4.13.2",
-        "aiohttp==3.11.18",
+        "numpy==1.26.4",
+        "structlog==24.1.0",
+        "prometheus-client==0.17.1",
+        "orjson==3.10.18",
     ],
+    extras_require={
+        "export": ["pyarrow==13.0.0"],
+        "semantic": ["faiss-cpu==1.7.4", "sentence-transformers==2.2.2"],
+    },
 ) 
\ No newline at end of file